@@ -39,6 +39,9 @@ def create_app(config_class=None):
     app = Flask(__name__, instance_relative_config=True)
     register_context_processors(app)
 
+    from .utils.json_provider import FastJSONProvider
+    app.json = FastJSONProvider(app)
+
    
 
     try:
@@ -54,6 +57,12 @@ def create_app(config_class=None):
     app.config.from_object(config_class)
     app.config.from_pyfile("config.py", silent=True)
 
+    # Client IP and scheme from the trusted proxies (PROXY_TRUSTED_HOPS)
+    hops = app.config.get("PROXY_TRUSTED_HOPS", 0)
+    if hops > 0:
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops)
+
     babel = Babel()
     babel.init_app(app, locale_selector=get_locale)
 
@@ -63,10 +72,31 @@ def create_app(config_class=None):
     login_mgr.init_app(app)
     mail.init_app(app)  # Initialize Flask-Mail
 
-    # User loader for Flask-Login
-    @login_mgr.user_loader
-    def load_user(user_id):
-        return User.query.get(int(user_id))
+    from .utils.api_key_cache import api_key_cache
+    api_key_cache.init_app(app)
+
+    from .utils.usage import usage_recorder
+    usage_recorder.init_app(app)
+
+    from .utils.ratelimit import rate_limiter
+    rate_limiter.init_app(app)
+
+    from .utils.throttle import throttle
+    throttle.init_app(app)
+
+    from .utils.security import consumed_tokens
+    consumed_tokens.init_app(app)
+
+    from .utils.entitlements import entitlements
+    entitlements.init_app(app)
+
+    from .utils.hashing import password_hasher
+    password_hasher.init_app(app)
+
+    # User loader for Flask-Login: page views are served from a snapshot
+    # of the user in the session
+    from .utils.principal import principals
+    principals.init_app(app, login_mgr)
 
     # Blueprints
     from .blueprints.main import bp as main_bp
@@ -85,6 +115,11 @@ def create_app(config_class=None):
     from .blueprints.admin import bp as admin_bp
     app.register_blueprint(admin_bp, url_prefix="/admin")
 
+    # CLI commands (flask create-admin, flask changes ...)
+    from .cli import cli
+    for command in cli.commands.values():
+        app.cli.add_command(command)
+
     # Health check
     @app.get("/healthz")
     def healthz():
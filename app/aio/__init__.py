@@ -0,0 +1,141 @@
+"""
+Async (ASGI) deployment of the app
+
+    uvicorn asgi:application --workers 4
+
+The read endpoints of /api/v1 registered in app.aio.routes run on the
+event loop and query the database through SQLAlchemy's asyncio engine
+(aiosqlite, asyncpg or aiomysql, after the dialect of
+SQLALCHEMY_DATABASE_URI). Every other request, the HTML blueprints and
+API writes included, goes to the Flask app, which asgiref runs in a
+thread pool. Both share the process's API key cache, rate limiter and
+usage recorder. The recorder always flushes from its background thread
+here: an API_KEY_USAGE_FLUSH_INTERVAL of 0 would write on the event loop,
+so it is raised to 1 second.
+
+Needs the async extras: asgiref, the async driver of the database and
+an ASGI server such as uvicorn.
+"""
+
+from asgiref.wsgi import WsgiToAsgi
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from werkzeug.datastructures import MIMEAccept, MultiDict
+from werkzeug.http import parse_accept_header, parse_etags
+from urllib.parse import parse_qsl
+from .. import create_app
+from ..extensions import db
+
+# Async drivers by database backend
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg',
+    'mysql': 'mysql+aiomysql',
+}
+
+
+class Fallback(Exception):
+    """Raised by an async endpoint to leave the request to the Flask app"""
+
+
+def async_database_url(url):
+    """The URL of the same database for the asyncio engine"""
+    url = make_url(url)
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        raise ValueError('The async API needs a database file or server, not an in-memory database')
+    try:
+        return url.set(drivername=ASYNC_DRIVERS[url.get_backend_name()])
+    except KeyError:
+        raise ValueError(f'No async driver for {url.get_backend_name()} databases') from None
+
+
+class Request:
+    """The parts of an HTTP request the async endpoints read"""
+
+    def __init__(self, scope):
+        self.method = scope['method']
+        self.path = scope['path']
+        self.headers = {name.decode('latin-1'): value.decode('latin-1') for name, value in scope['headers']}
+        self.args = MultiDict(parse_qsl(scope['query_string'].decode('latin-1'), keep_blank_values=True))
+
+    @property
+    def if_none_match(self):
+        return parse_etags(self.headers.get('if-none-match'))
+
+    @property
+    def accept_mimetypes(self):
+        return parse_accept_header(self.headers.get('accept'), MIMEAccept)
+
+
+class Response:
+    def __init__(self, body=b'', status=200, headers=None, mimetype='application/json'):
+        self.body = body
+        self.status = status
+        self.headers = {'Content-Type': mimetype} if mimetype else {}
+        self.headers.update(headers or {})
+
+    async def send(self, send, head=False):
+        headers = [(name.lower().encode('latin-1'), str(value).encode('latin-1')) for name, value in self.headers.items()]
+        headers.append((b'content-length', str(len(self.body)).encode()))
+        await send({'type': 'http.response.start', 'status': self.status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': b'' if head else self.body})
+
+
+class AsyncAPI:
+    """
+    ASGI application serving the async endpoints itself and everything
+    else through the Flask app
+    """
+
+    def __init__(self, app):
+        from .routes import ROUTES
+        from ..utils.usage import usage_recorder
+        if usage_recorder.interval <= 0:
+            # Inline flushes would block the event loop
+            usage_recorder.interval = 1
+        self.app = app
+        self.routes = ROUTES
+        self.wsgi = WsgiToAsgi(app)
+        with app.app_context():
+            # The sync engine's URL, with relative SQLite paths resolved
+            url = db.engine.url
+        self.engine = create_async_engine(async_database_url(url))
+        self.session = async_sessionmaker(self.engine, expire_on_commit=False)
+
+    def json(self, data, status=200, headers=None):
+        """A JSON response, encoded like jsonify"""
+        return Response(self.app.json.dumps(data).encode() + b'\n', status, headers)
+
+    def error(self, error, message, status):
+        return self.json({'error': error, 'message': message}, status)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self._lifespan(receive, send)
+
+        endpoint = self.routes.get(scope['path']) if scope['type'] == 'http' else None
+        if endpoint is not None and scope['method'] in ('GET', 'HEAD'):
+            request = Request(scope)
+            try:
+                with self.app.app_context():
+                    response = await endpoint(self, request)
+            except Fallback:
+                pass
+            else:
+                return await response.send(send, head=request.method == 'HEAD')
+
+        await self.wsgi(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.engine.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+def create_asgi_app(config_class=None):
+    return AsyncAPI(create_app(config_class))
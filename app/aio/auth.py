@@ -0,0 +1,67 @@
+import hmac
+from ..models import APIKey
+from ..utils.api_auth import _load_options
+from ..utils.api_key_cache import api_key_cache
+from ..utils.ratelimit import rate_limiter, rate_limit_headers
+from . import Fallback
+
+
+async def authenticate(api, session, request, include=(), user_columns=None):
+    """
+    The API key pipeline of utils.api_auth on an async session
+
+    Returns (api_key, limit, None) on success and (None, limit, error
+    response) otherwise. Legacy keys, which are verified against a
+    password hash and migrated on first use, are left to the Flask app.
+    """
+    auth_header = request.headers.get('authorization', '')
+    if not auth_header:
+        return None, None, api.error(
+            'Missing API key',
+            'Include your API key in the Authorization header: Bearer sk_live_...',
+            401
+        )
+
+    parts = auth_header.split()
+    if len(parts) != 2 or parts[0].lower() != 'bearer':
+        return None, None, api.error('Invalid authorization format', 'Use: Authorization: Bearer sk_live_...', 401)
+
+    api_key_value = parts[1]
+    if not api_key_value.startswith('sk_live_'):
+        return None, None, api.error('Invalid API key format', 'API keys must start with sk_live_', 401)
+
+    options = _load_options(include, user_columns)
+    digest = APIKey.digest_key(api_key_value)
+    state = api_key_cache.get(digest)
+    api_key = None
+    if state is None:
+        key_id = APIKey.parse_key_id(api_key_value)
+        if key_id is None:
+            raise Fallback()
+        api_key = await session.get(APIKey, key_id, options=options)
+        if api_key is None or api_key.key_digest is None \
+                or not hmac.compare_digest(api_key.key_digest, digest):
+            return None, None, api.error('Invalid API key', 'The provided API key is invalid', 401)
+        state = api_key_cache.put(digest, api_key)
+
+    if not state.key_active:
+        return None, None, api.error('API key disabled', 'This API key has been disabled', 401)
+    if state.is_expired:
+        return None, None, api.error('API key expired', 'This API key has expired', 401)
+    if not state.user_active:
+        return None, None, api.error('Account disabled', 'Your account has been disabled', 403)
+
+    if api_key is None:
+        api_key = await session.get(APIKey, state.key_id, options=options)
+        if api_key is None:
+            api_key_cache.invalidate_key(state.key_id)
+            return None, None, api.error('Invalid API key', 'The provided API key is invalid', 401)
+
+    limit = rate_limiter.check(api_key.id, api_key.user_id, api_key.user.plan_id)
+    if limit and not limit.allowed:
+        error = api.error('Rate limit exceeded', f'Too many requests. Retry in {limit.retry_after} seconds.', 429)
+        error.headers.update(rate_limit_headers(limit))
+        return None, limit, error
+
+    api_key.mark_used(f"{request.method} {request.path}")
+    return api_key, limit, None
@@ -0,0 +1,182 @@
+"""
+Async versions of the /api/v1 read endpoints
+
+They reuse the serializers, statements and ETags of the Flask endpoints
+in blueprints.api.routes, so the responses are the same. Requests they
+do not handle (NDJSON exports, legacy API keys) raise Fallback and are
+served by the Flask app.
+"""
+
+from sqlalchemy import select
+from sqlalchemy.orm import load_only
+from ..blueprints.api.routes import _profile, _user_rows
+from ..blueprints.api.serializers import api_key_fields, current_user_fields, user_list_fields
+from ..models import APIKey, BillingProfile, Plan, User
+from ..utils.conditional import make_etag
+from ..utils.cursor import decode_cursor, encode_cursor
+from ..utils.ratelimit import rate_limit_headers
+from . import Fallback, Response
+from .auth import authenticate
+
+ROUTES = {}
+
+
+def route(path):
+    def register(endpoint):
+        ROUTES[path] = endpoint
+        return endpoint
+    return register
+
+
+def conditional(api, request, etag, build, limit=None):
+    """utils.conditional.conditional for the async endpoints"""
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304, mimetype=None)
+    else:
+        response = api.json(build())
+    response.headers['ETag'] = f'"{etag}"'
+    if limit:
+        response.headers.update(rate_limit_headers(limit))
+    return response
+
+
+@route("/api/v1/ping")
+async def ping(api, request):
+    return api.json({"pong": True})
+
+
+@route("/api/v1/me")
+async def get_current_user(api, request):
+    try:
+        fields = current_user_fields.select(request.args)
+    except ValueError as e:
+        return api.error("Invalid parameter", str(e), 400)
+
+    async with api.session() as session:
+        api_key, limit, error = await authenticate(api, session, request, fields.include, fields.columns)
+    if error:
+        return error
+    user = api_key.user
+
+    etag = make_etag(
+        'me', tuple(fields.serializer.fields), fields.include, user.version,
+        user.plan.version if user.plan else None,
+        (user.billing.version if user.billing else None) if 'billing' in fields.include else None
+    )
+    return conditional(api, request, etag, lambda: fields(user), limit)
+
+
+@route("/api/v1/profile")
+async def get_profile(api, request):
+    async with api.session() as session:
+        api_key, limit, error = await authenticate(api, session, request, ('plan', 'billing'))
+    if error:
+        return error
+    user = api_key.user
+
+    etag = make_etag(
+        'profile', user.version,
+        user.plan.version if user.plan else None,
+        user.billing.version if user.billing else None
+    )
+    return conditional(api, request, etag, lambda: _profile(user), limit)
+
+
+@route("/api/v1/api-keys")
+async def list_api_keys(api, request):
+    async with api.session() as session:
+        api_key, limit, error = await authenticate(api, session, request)
+        if error:
+            return error
+        try:
+            fields = api_key_fields.select(request.args)
+        except ValueError as e:
+            return api.error("Invalid parameter", str(e), 400)
+
+        columns = {*fields.columns, 'version', 'last_used_at'}
+        keys = (await session.scalars(
+            select(APIKey)
+            .where(APIKey.user_id == api_key.user_id)
+            .options(load_only(*(getattr(APIKey, name) for name in columns)))
+        )).all()
+
+    etag = make_etag(
+        'api-keys', tuple(fields.serializer.fields),
+        [(key.id, key.version, key.last_used_minute) for key in keys]
+    )
+    return conditional(api, request, etag, lambda: {
+        "api_keys": fields.many(keys),
+        "count": len(keys)
+    }, limit)
+
+
+@route("/api/v1/users")
+async def list_users(api, request):
+    if request.args.get('format') == 'ndjson' or request.accept_mimetypes.best == 'application/x-ndjson':
+        raise Fallback()
+
+    config = api.app.config
+    async with api.session() as session:
+        api_key, limit, error = await authenticate(api, session, request)
+        if error:
+            return error
+        if api_key.user.role != 'admin':
+            return api.error("Forbidden", "Admin access required", 403)
+
+        try:
+            before_id = decode_cursor('users', request.args.get('cursor'))
+        except ValueError:
+            return api.error("Invalid cursor", "Use the next_cursor value of a previous response", 400)
+        try:
+            fields = user_list_fields.select(request.args)
+        except ValueError as e:
+            return api.error("Invalid parameter", str(e), 400)
+
+        stmt = _user_rows(fields).order_by(User.id.desc())
+        if before_id is not None:
+            stmt = stmt.where(User.id < before_id)
+        page_size = request.args.get('limit', config['API_USERS_PAGE_SIZE'], type=int)
+        page_size = max(1, min(page_size, config['API_USERS_MAX_PAGE_SIZE']))
+
+        rows = (await session.execute(stmt.limit(page_size + 1))).all()
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        users = await _render_users(session, rows, fields)
+
+    response = api.json({
+        "users": users,
+        "count": len(rows),
+        "next_cursor": encode_cursor('users', rows[-1].id) if has_more else None
+    })
+    if limit:
+        response.headers.update(rate_limit_headers(limit))
+    return response
+
+
+async def _render_users(session, rows, fields):
+    """blueprints.api.routes._render_users on the async session"""
+    users = fields.serializer.many(rows)
+
+    if 'plan' in fields.expand:
+        serializer = fields.expand['plan']
+        plan_ids = {row.plan_id for row in rows if row.plan_id is not None}
+        plans = {
+            plan.id: serializer(plan)
+            for plan in (await session.scalars(select(Plan).where(Plan.id.in_(plan_ids))))
+        } if plan_ids else {}
+        for data, row in zip(users, rows):
+            data['plan'] = plans.get(row.plan_id)
+
+    if 'billing' in fields.expand:
+        serializer = fields.expand['billing']
+        columns = (getattr(BillingProfile, attribute) for attribute in serializer.fields.values())
+        billing = {
+            profile.user_id: serializer(profile)
+            for profile in await session.execute(
+                select(BillingProfile.user_id, *columns).where(BillingProfile.user_id.in_([row.id for row in rows]))
+            )
+        }
+        for data, row in zip(users, rows):
+            data['billing'] = billing.get(row.id)
+
+    return users
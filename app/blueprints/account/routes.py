@@ -1,14 +1,19 @@
 from flask import render_template, redirect, url_for, flash, request, current_app
 from flask_login import login_required, current_user, logout_user
 from ...extensions import db
-from ...models import BillingProfile, User, Plan
+from ...models import BillingProfile, User, Plan, WebhookEvent
+from ...models.webhook import PLAN_CHANGED, USER_DELETED, user_event_data
 from .forms import ChangePasswordForm, BillingForm, DeleteAccountForm
 from . import bp
 from flask_babel import _
-from datetime import datetime
+from datetime import datetime, timedelta
 
 # Add these imports at the top
-from ...models import APIKey
+from ...models import APIKey, APIKeyUsage
+from ...utils.api_key_cache import api_key_cache
+from ...utils.entitlements import entitlements, quota_required
+from ...utils.principal import principals
+from ...utils.usage import usage_recorder
 
 # Add these routes to account blueprint
 
@@ -17,41 +22,30 @@ from ...models import APIKey
 def api_keys():
     """View and manage API keys"""
     keys = current_user.api_keys.order_by(APIKey.created_at.desc()).all()
-    return render_template('account/api_keys.html', keys=keys)
+    # Requests per key over the last 24 hours and 7 days
+    usage = APIKeyUsage.totals([key.id for key in keys], timedelta(hours=24), timedelta(days=7))
+    plan = entitlements.for_user(current_user)
+    return render_template('account/api_keys.html', keys=keys, usage=usage, max_api_keys=plan.max_api_keys)
+
+def _api_key_limit_reached():
+    flash(_('You have reached the maximum number of API keys for your plan. Upgrade to create more.'), 'warning')
+    return redirect(url_for('account.api_keys'))
 
 @bp.route('/api-keys/create', methods=['POST'])
 @login_required
+@quota_required('max_api_keys', denied=_api_key_limit_reached)
 def create_api_key():
     """Create a new API key"""
     name = request.form.get('name', '').strip()
     
-    # Check plan limits (optional)
-    # Free plan: 1 key, Pro: 5 keys, Enterprise: unlimited
-    max_keys = {
-        'Free': 1,
-        'Pro': 5,
-        'Enterprise': 999
-    }
-    
-    current_count = current_user.active_api_keys_count
-    plan_limit = max_keys.get(current_user.plan_name, 1)
-    
-    if current_count >= plan_limit:
-        flash(_('You have reached the maximum number of API keys for your plan. Upgrade to create more.'), 'warning')
-        return redirect(url_for('account.api_keys'))
-    
-    # Generate new key
-    raw_key = APIKey.generate_key()
-    
-    # Create API key record
+    # Create API key record and generate its key
     api_key = APIKey(
         user_id=current_user.id,
-        key_hash=APIKey.hash_key(raw_key),
-        key_prefix=raw_key[:12],  # Store first 12 chars for display
-        name=name if name else f"API Key {current_count + 1}"
+        name=name if name else f"API Key {current_user.api_key_count + 1}"
     )
+    raw_key = api_key.issue_key()
+    User.count_api_keys(current_user.id, 1)
     
-    db.session.add(api_key)
     db.session.commit()
     
     # Show the key once (it will be hashed and cannot be retrieved again)
@@ -65,8 +59,12 @@ def delete_api_key(key_id):
     api_key = APIKey.query.filter_by(id=key_id, user_id=current_user.id).first_or_404()
     
     key_name = api_key.name
+    key_id = api_key.id
+    if api_key.is_active:
+        User.count_api_keys(current_user.id, -1)
     db.session.delete(api_key)
     db.session.commit()
+    api_key_cache.invalidate_key(key_id)
     
     flash(_('API key "%(name)s" deleted successfully', name=key_name), 'success')
     return redirect(url_for('account.api_keys'))
@@ -77,8 +75,14 @@ def toggle_api_key(key_id):
     """Enable/disable an API key"""
     api_key = APIKey.query.filter_by(id=key_id, user_id=current_user.id).first_or_404()
     
+    # Enabling a key counts against the plan's limit like creating one
+    if not api_key.is_active and not entitlements.within_quota(current_user, 'max_api_keys'):
+        return _api_key_limit_reached()
+    
     api_key.is_active = not api_key.is_active
+    User.count_api_keys(current_user.id, 1 if api_key.is_active else -1)
     db.session.commit()
+    api_key_cache.invalidate_key(api_key.id)
     
     status = _('enabled') if api_key.is_active else _('disabled')
     flash(_('API key "%(name)s" has been %(status)s', name=api_key.name, status=status), 'success')
@@ -90,16 +94,16 @@ def regenerate_api_key(key_id):
     """Regenerate an API key"""
     api_key = APIKey.query.filter_by(id=key_id, user_id=current_user.id).first_or_404()
     
-    # Generate new key
-    raw_key = APIKey.generate_key()
+    # Generate new key (legacy keys move to the current format here)
+    raw_key = api_key.issue_key()
     
     # Update existing record
-    api_key.key_hash = APIKey.hash_key(raw_key)
-    api_key.key_prefix = raw_key[:12]
     api_key.created_at = datetime.utcnow()
     api_key.last_used_at = None
     
     db.session.commit()
+    api_key_cache.invalidate_key(api_key.id)
+    usage_recorder.discard(api_key.id)
     
     flash(_('API key regenerated successfully. Copy it now - you won\'t see it again!'), 'success')
     return render_template('account/api_key_created.html', api_key=raw_key, key_name=api_key.name)
@@ -141,7 +145,7 @@ def change_password():
 @bp.route("/billing", methods=["GET","POST"])
 @login_required
 def billing():
-    billing = current_user.billing or BillingProfile(user=current_user)
+    billing = current_user.billing or BillingProfile(user_id=current_user.id)
     form = BillingForm(obj=billing)
     if form.validate_on_submit():
         form.populate_obj(billing)
@@ -162,8 +166,11 @@ def delete_account():
         uid = current_user.id
         logout_user()
         user = User.query.get(uid)
+        WebhookEvent.emit(USER_DELETED, uid, user_event_data(user))
         db.session.delete(user)
         db.session.commit()
+        api_key_cache.invalidate_user(uid)
+        principals.invalidate(uid)
         flash(_("Your account has been deleted."), "info")
         return redirect(url_for("main.index"))
     return render_template("account/delete.html", form=form)
@@ -203,8 +210,10 @@ def select_plan(plan_id):
         # TODO: Integrate with Stripe for payment processing
     
     # Update user's plan
-    current_user.plan_id = plan.id
+    previous_plan = current_user.plan_name
+    current_user.plan = plan
     current_user.plan_subscribed_at = datetime.utcnow()
+    WebhookEvent.emit(PLAN_CHANGED, current_user.id, user_event_data(current_user, previous_plan=previous_plan))
     db.session.commit()
     
     flash(_('Successfully switched to %(plan)s plan', plan=plan.name), 'success')
@@ -219,8 +228,9 @@ def cancel_plan():
         return redirect(url_for('account.view_plan'))
     
     old_plan = current_user.plan.name
-    current_user.plan_id = None
+    current_user.plan = None
     current_user.plan_subscribed_at = None
+    WebhookEvent.emit(PLAN_CHANGED, current_user.id, user_event_data(current_user, previous_plan=old_plan))
     db.session.commit()
     
     flash(_('Successfully cancelled %(plan)s plan', plan=old_plan), 'success')
@@ -1,6 +1,6 @@
 from flask_wtf import FlaskForm
 from wtforms import StringField, PasswordField, SubmitField, SelectField, BooleanField, TextAreaField, DecimalField, IntegerField
-from wtforms.validators import DataRequired, Email, Length, Optional, EqualTo, NumberRange
+from wtforms.validators import DataRequired, Email, Length, Optional, EqualTo, NumberRange, ValidationError
 
 class AddUserForm(FlaskForm):
     email = StringField("Email", validators=[DataRequired(), Email(), Length(max=255)])
@@ -63,9 +63,21 @@ class PlanForm(FlaskForm):
     stripe_price_id = StringField("Stripe Price ID", validators=[Optional(), Length(max=255)])
     stripe_product_id = StringField("Stripe Product ID", validators=[Optional(), Length(max=255)])
     
+    # API Limits
+    api_rate_limit = IntegerField("Requests per minute per API key", validators=[Optional(), NumberRange(min=1)])
+    api_user_rate_limit = IntegerField("Requests per minute per user", validators=[Optional(), NumberRange(min=1)])
+    max_api_keys = IntegerField("Active API keys", validators=[Optional(), NumberRange(min=-1)])  # -1 = unlimited (Plan.UNLIMITED)
+    features = StringField("Features", validators=[Optional(), Length(max=255)])
+    
     # Settings
     is_active = BooleanField("Active", default=True)
     is_featured = BooleanField("Featured", default=False)
     sort_order = IntegerField("Sort Order", validators=[Optional()], default=0)
     
     submit = SubmitField("Save Plan")
+
+    def validate_features(self, field):
+        from ...utils.entitlements import FEATURES
+        unknown = {name.strip() for name in field.data.split(',')} - set(FEATURES) - {''}
+        if unknown:
+            raise ValidationError(f"Unknown features: {', '.join(sorted(unknown))} (available: {', '.join(FEATURES)})")
@@ -1,8 +1,12 @@
 from flask import render_template, redirect, url_for, flash, request
 from flask_login import login_required, current_user
 from ...extensions import db
-from ...models import User, BillingProfile, Plan
+from ...models import User, BillingProfile, Plan, WebhookEvent
+from ...models.webhook import USER_CREATED, USER_DELETED, user_event_data
 from ...security import roles_required
+from ...utils.api_key_cache import api_key_cache
+from ...utils.entitlements import entitlements
+from ...utils.principal import principals
 from .forms import UserForm, AddUserForm
 from . import bp
 from flask_babel import _
@@ -68,6 +72,8 @@ def add_user():
             user.confirm()
         
         db.session.add(user)
+        db.session.flush()
+        WebhookEvent.emit(USER_CREATED, user.id, user_event_data(user))
         db.session.commit()
         
         flash(_('User created successfully'), 'success')
@@ -110,7 +116,10 @@ def edit_user(user_id):
         elif not form.is_confirmed.data and user.is_confirmed:
             user.confirmed_at = None
         
+        user.security_version += 1
         db.session.commit()
+        api_key_cache.invalidate_user(user.id)
+        principals.invalidate(user.id, user.security_version)
         flash(_('User updated successfully'), 'success')
         return redirect(url_for('admin.index'))
     
@@ -129,8 +138,11 @@ def delete_user(user_id):
         return redirect(url_for('admin.index'))
     
     email = user.email
+    WebhookEvent.emit(USER_DELETED, user.id, user_event_data(user))
     db.session.delete(user)
     db.session.commit()
+    api_key_cache.invalidate_user(user_id)
+    principals.invalidate(user_id)
     
     flash(_('User %(email)s deleted successfully', email=email), 'success')
     return redirect(url_for('admin.index'))
@@ -148,7 +160,10 @@ def toggle_user_status(user_id):
         return redirect(url_for('admin.index'))
     
     user.is_active = not user.is_active
+    user.security_version += 1
     db.session.commit()
+    api_key_cache.invalidate_user(user.id)
+    principals.invalidate(user.id, user.security_version)
     
     status = _('enabled') if user.is_active else _('disabled')
     flash(_('User %(email)s has been %(status)s', email=user.email, status=status), 'success')
@@ -244,6 +259,10 @@ def add_plan():
             billing_period=form.billing_period.data,
             stripe_price_id=form.stripe_price_id.data,
             stripe_product_id=form.stripe_product_id.data,
+            api_rate_limit=form.api_rate_limit.data,
+            api_user_rate_limit=form.api_user_rate_limit.data,
+            max_api_keys=form.max_api_keys.data,
+            features=form.features.data or None,
             is_active=form.is_active.data,
             is_featured=form.is_featured.data,
             sort_order=form.sort_order.data
@@ -251,6 +270,7 @@ def add_plan():
         
         db.session.add(plan)
         db.session.commit()
+        entitlements.invalidate()
         
         flash(_('Plan created successfully'), 'success')
         return redirect(url_for('admin.plans'))
@@ -281,11 +301,16 @@ def edit_plan(plan_id):
         plan.billing_period = form.billing_period.data
         plan.stripe_price_id = form.stripe_price_id.data
         plan.stripe_product_id = form.stripe_product_id.data
+        plan.api_rate_limit = form.api_rate_limit.data
+        plan.api_user_rate_limit = form.api_user_rate_limit.data
+        plan.max_api_keys = form.max_api_keys.data
+        plan.features = form.features.data or None
         plan.is_active = form.is_active.data
         plan.is_featured = form.is_featured.data
         plan.sort_order = form.sort_order.data
         
         db.session.commit()
+        entitlements.invalidate()
         flash(_('Plan updated successfully'), 'success')
         return redirect(url_for('admin.plans'))
     
@@ -307,6 +332,7 @@ def delete_plan(plan_id):
     plan_name = plan.name
     db.session.delete(plan)
     db.session.commit()
+    entitlements.invalidate()
     
     flash(_('Plan "%(name)s" deleted successfully', name=plan_name), 'success')
     return redirect(url_for('admin.plans'))
@@ -1,7 +1,30 @@
-from flask import jsonify, request, abort, g
+from datetime import datetime
+from urllib.parse import urlsplit
+from flask import jsonify, request, abort, g, current_app, Response, stream_with_context
+from sqlalchemy import func, insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import load_only
+from werkzeug.exceptions import HTTPException
 from ...extensions import db
-from ...models import User
+from ...models import User, Plan, BillingProfile, APIKey, APIKeyUsage, UserChange, WebhookEndpoint, WebhookEvent
+from ...models.webhook import EVENTS, USER_CREATED, user_event_data
+from ...models.change_feed import PRUNED, USER
 from ...utils.api_auth import require_api_key
+from ...utils.api_key_cache import api_key_cache
+from ...utils.entitlements import entitlements, feature_required
+from ...utils.ratelimit import rate_limiter
+from ...utils.cursor import encode_cursor, decode_cursor
+from ...utils.hashing import password_hasher
+from ...utils.throttle import throttle
+from ...utils.security import consumed_tokens
+from ...utils.conditional import make_etag, conditional
+from ...utils.idempotency import idempotent
+from ...utils import stripe_events
+from ...utils.webhooks import private_address_error
+from .serializers import (
+    user_serializer, plan_serializer, billing_serializer, webhook_serializer,
+    current_user_fields, user_list_fields, api_key_fields
+)
 from . import bp
 
 @bp.get("/v1/ping")
@@ -12,85 +35,74 @@ def ping():
 # ============ PROTECTED API ENDPOINTS ============
 
 @bp.get("/v1/me")
-@require_api_key
+@require_api_key(fields=current_user_fields)
 def get_current_user():
-    """Get current authenticated user info"""
+    """Get current authenticated user info (supports ?fields= and ?include=plan,billing)"""
     user = g.current_user
     
-    return jsonify({
-        "id": user.id,
-        "email": user.email,
-        "role": user.role,
-        "language": user.language,
-        "plan": user.plan_name,
-        "is_active": user.is_active,
-        "is_confirmed": user.is_confirmed,
-        "created_at": user.created_at.isoformat()
-    })
+    etag = make_etag(
+        'me', tuple(g.fields.serializer.fields), g.fields.include, user.version,
+        user.plan.version if user.plan else None,
+        (user.billing.version if user.billing else None) if 'billing' in g.fields.include else None
+    )
+    return conditional(etag, lambda: jsonify(g.fields(user)))
 
 @bp.get("/v1/profile")
-@require_api_key
+@require_api_key(include=('plan', 'billing'))
 def get_profile():
     """Get user profile with full details"""
     user = g.current_user
     
+    etag = make_etag(
+        'profile', user.version,
+        user.plan.version if user.plan else None,
+        user.billing.version if user.billing else None
+    )
+    return conditional(etag, lambda: jsonify(_profile(user)))
+
+def _profile(user):
+    """Profile document of a user (plan and billing loaded)"""
     profile = {
-        "user": {
-            "id": user.id,
-            "email": user.email,
-            "role": user.role,
-            "language": user.language,
-            "is_active": user.is_active,
-            "is_confirmed": user.is_confirmed,
-            "created_at": user.created_at.isoformat()
-        },
+        "user": user_serializer(user),
         "plan": {
             "name": user.plan_name,
-            "subscribed_at": user.plan_subscribed_at.isoformat() if user.plan_subscribed_at else None
+            "subscribed_at": user.plan_subscribed_at
         }
     }
     
     # Add plan details if user has a paid plan
     if user.plan:
-        profile["plan"].update({
-            "price": float(user.plan.price),
-            "currency": user.plan.currency,
-            "billing_period": user.plan.billing_period,
-            "features": user.plan.features_list
-        })
+        profile["plan"].update(plan_serializer(user.plan))
     
     # Add billing if exists
     if user.billing:
-        profile["billing"] = {
-            "full_name": user.billing.full_name,
-            "company": user.billing.company,
-            "country": user.billing.country
-        }
+        profile["billing"] = billing_serializer(user.billing)
     
-    return jsonify(profile)
+    return profile
 
 @bp.get("/v1/api-keys")
 @require_api_key
 def list_api_keys():
-    """List user's API keys (masked)"""
+    """List user's API keys (masked, supports ?fields=)"""
     user = g.current_user
     
-    keys = []
-    for key in user.api_keys.all():
-        keys.append({
-            "id": key.id,
-            "name": key.name,
-            "key_prefix": key.key_prefix,
-            "masked_key": key.masked_key,
-            "is_active": key.is_active,
-            "created_at": key.created_at.isoformat(),
-            "last_used_at": key.last_used_at.isoformat() if key.last_used_at else None
-        })
+    try:
+        fields = api_key_fields.select(request.args)
+    except ValueError as e:
+        return _invalid_parameter(e)
     
-    return jsonify({
-        "api_keys": keys,
+    # Versions and last use (to the minute) are loaded for the ETag
+    columns = {*fields.columns, 'version', 'last_used_at'}
+    keys = user.api_keys.options(load_only(*(getattr(APIKey, name) for name in columns))).all()
+    
+    etag = make_etag(
+        'api-keys', tuple(fields.serializer.fields),
+        [(key.id, key.version, key.last_used_minute) for key in keys]
+    )
+    return conditional(etag, lambda: jsonify({
+        "api_keys": fields.many(keys),
         "count": len(keys)
-    })
+    }))
 
 @bp.get("/v1/stats")
 @require_api_key
@@ -101,22 +113,123 @@ def get_stats():
     stats = {
         "account": {
             "age_days": (datetime.utcnow() - user.created_at).days,
-            "api_keys_count": user.active_api_keys_count
+            "api_keys_count": user.api_key_count
         },
         "api": {
             "key_used": g.api_key.name,
-            "last_used": g.api_key.last_used_at.isoformat() if g.api_key.last_used_at else None
+            "last_used": g.api_key.last_used
         }
     }
     
+    # Request volume of the current key over the last 24 hours
+    per_hour, per_endpoint = APIKeyUsage.hourly(g.api_key.id, hours=24)
+    stats["usage"] = {
+        "window_hours": 24,
+        "total_requests": sum(per_hour.values()),
+        "hourly": [
+            {"hour": datetime.utcfromtimestamp(hour), "requests": count}
+            for hour, count in per_hour.items()
+        ],
+        "by_endpoint": per_endpoint
+    }
+    
     return jsonify(stats)
 
+# ============ WEBHOOKS ============
+
+@bp.get("/v1/webhooks")
+@require_api_key
+@feature_required('webhooks')
+def list_webhooks():
+    """List the user's webhook endpoints"""
+    user = g.current_user
+    endpoints = user.webhooks.order_by(WebhookEndpoint.id).all()
+    return jsonify({
+        "webhooks": webhook_serializer.many(endpoints),
+        "count": len(endpoints)
+    })
+
+@bp.post("/v1/webhooks")
+@require_api_key
+@feature_required('webhooks')
+@idempotent
+def create_webhook():
+    """
+    Subscribe a URL to events
+    Takes {"url", "events"}; events defaults to all event types. The
+    endpoint receives events about the user (about all users for admins).
+    The signing secret is only returned here.
+    """
+    user = g.current_user
+    
+    data = request.get_json(silent=True) or {}
+    url = data.get("url")
+    events = data.get("events") or []
+    
+    parts = urlsplit(url) if isinstance(url, str) else None
+    if not parts or parts.scheme not in ("http", "https") or not parts.netloc or len(url) > 2048:
+        return jsonify({
+            "error": "Invalid URL",
+            "message": "An http(s) URL of at most 2048 characters is required"
+        }), 400
+    
+    if not current_app.config['WEBHOOK_ALLOW_PRIVATE']:
+        error = private_address_error(url)
+        if error is not None:
+            return jsonify({
+                "error": "Invalid URL",
+                "message": f"{error}; webhook URLs must resolve to public addresses"
+            }), 400
+    
+    if not isinstance(events, list) or any(event not in EVENTS for event in events):
+        return jsonify({
+            "error": "Invalid events",
+            "message": f"Events must be a list of: {', '.join(EVENTS)}"
+        }), 400
+    
+    max_endpoints = current_app.config['WEBHOOK_MAX_ENDPOINTS']
+    if user.webhooks.count() >= max_endpoints:
+        return jsonify({
+            "error": "Limit reached",
+            "message": f"At most {max_endpoints} webhook endpoints per user"
+        }), 403
+    
+    endpoint = WebhookEndpoint(
+        user_id=user.id,
+        url=url,
+        secret=WebhookEndpoint.generate_secret(),
+        events=','.join(dict.fromkeys(events))
+    )
+    db.session.add(endpoint)
+    db.session.commit()
+    
+    response = webhook_serializer(endpoint)
+    response["secret"] = endpoint.secret
+    return jsonify(response), 201
+
+@bp.delete("/v1/webhooks/<int:webhook_id>")
+@require_api_key
+@feature_required('webhooks')
+def delete_webhook(webhook_id):
+    """Unsubscribe a webhook endpoint (queued deliveries are still sent)"""
+    user = g.current_user
+    endpoint = user.webhooks.filter_by(id=webhook_id).first()
+    if endpoint is None:
+        return jsonify({
+            "error": "Not found",
+            "message": "Webhook endpoint not found"
+        }), 404
+    
+    db.session.delete(endpoint)
+    db.session.commit()
+    return "", 204
+
 # ============ ADMIN API ENDPOINTS ============
 
 @bp.get("/v1/users")
 @require_api_key
 def list_users():
-    """List all users (admin only)"""
+    """List all users (admin only, supports ?fields= and ?include=plan,billing)"""
     user = g.current_user
     
     # Check if user is admin
@@ -126,25 +239,182 @@ def list_users():
             "message": "Admin access required"
         }), 403
     
-    users = User.query.order_by(User.id.desc()).limit(100).all()
+    # Keyset pagination on User.id (newest first), reading plain columns
+    try:
+        before_id = decode_cursor('users', request.args.get('cursor'))
+    except ValueError:
+        return jsonify({
+            "error": "Invalid cursor",
+            "message": "Use the next_cursor value of a previous response"
+        }), 400
+    
+    try:
+        fields = user_list_fields.select(request.args)
+    except ValueError as e:
+        return _invalid_parameter(e)
+    
+    stmt = _user_rows(fields).order_by(User.id.desc())
+    if before_id is not None:
+        stmt = stmt.where(User.id < before_id)
+    
+    # NDJSON export of every user after the cursor, at constant memory
+    if _wants_ndjson():
+        def generate():
+            result = db.session.execute(stmt.execution_options(yield_per=1000))
+            for rows in result.partitions():
+                for data in _render_users(rows, fields):
+                    yield current_app.json.dumps(data) + "\n"
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    
+    page_size = request.args.get('limit', current_app.config['API_USERS_PAGE_SIZE'], type=int)
+    page_size = max(1, min(page_size, current_app.config['API_USERS_MAX_PAGE_SIZE']))
+    
+    # One extra row tells whether there is a next page
+    rows = db.session.execute(stmt.limit(page_size + 1)).all()
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
     
     return jsonify({
-        "users": [
-            {
-                "id": u.id,
-                "email": u.email,
-                "role": u.role,
-                "plan": u.plan_name,
-                "is_active": u.is_active,
-                "created_at": u.created_at.isoformat()
-            }
-            for u in users
-        ],
-        "count": len(users)
+        "users": _render_users(rows, fields),
+        "count": len(rows),
+        "next_cursor": encode_cursor('users', rows[-1].id) if has_more else None
     })
 
+@bp.get("/v1/users/changes")
+@require_api_key
+def list_user_changes():
+    """
+    Stream changes to users, plan assignments and billing profiles as
+    NDJSON (admin only)
+    Each line has the change, its cursor and the user's current state
+    (null once deleted; supports ?fields= and ?include=). Clients pass the
+    cursor of the last line as ?since= on the next sync. ?since=latest
+    returns no changes and sets the X-Feed-Cursor header to start from.
+    Changes appear a few seconds after their commit (CHANGE_FEED_SETTLE)
+    except on SQLite, so that the feed has no gaps.
+    """
+    user = g.current_user
+    
+    # Check if user is admin
+    if user.role != 'admin':
+        return jsonify({
+            "error": "Forbidden",
+            "message": "Admin access required"
+        }), 403
+    
+    try:
+        fields = user_list_fields.select(request.args)
+    except ValueError as e:
+        return _invalid_parameter(e)
+    
+    # Stream up to the settled end of the feed; the header holds that position
+    latest_id = UserChange.latest_id(current_app.config['CHANGE_FEED_SETTLE'])
+    since = request.args.get('since')
+    if since == 'latest':
+        since_id = latest_id
+    else:
+        try:
+            since_id = decode_cursor('changes', since) or 0
+        except ValueError:
+            return jsonify({
+                "error": "Invalid cursor",
+                "message": "Use the cursor of a previous change or since=latest"
+            }), 400
+    
+    if since_id < UserChange.horizon():
+        return jsonify({
+            "error": "Cursor expired",
+            "message": "Changes after this cursor were pruned; resync with GET /api/v1/users and since=latest"
+        }), 410
+    
+    stmt = (
+        select(UserChange.id, UserChange.user_id, UserChange.kind, UserChange.op, UserChange.changed_at)
+        .where(UserChange.id > since_id, UserChange.id <= latest_id, UserChange.op != PRUNED)
+        .order_by(UserChange.id)
+    )
+    
+    def generate():
+        result = db.session.execute(stmt.execution_options(yield_per=1000))
+        for changes in result.partitions():
+            # Current state of the changed users, one query per partition
+            user_ids = {change.user_id for change in changes}
+            rows = db.session.execute(_user_rows(fields).where(User.id.in_(user_ids))).all()
+            users = dict(zip((row.id for row in rows), _render_users(rows, fields)))
+            for change in changes:
+                yield current_app.json.dumps({
+                    "cursor": encode_cursor('changes', change.id),
+                    "user_id": change.user_id,
+                    "kind": change.kind,
+                    "op": change.op,
+                    "changed_at": change.changed_at,
+                    "user": users.get(change.user_id)
+                }) + "\n"
+    
+    response = Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    response.headers['X-Feed-Cursor'] = encode_cursor('changes', max(latest_id, since_id))
+    return response
+
+def _wants_ndjson():
+    return request.args.get('format') == 'ndjson' or request.accept_mimetypes.best == 'application/x-ndjson'
+
+def _user_rows(fields):
+    """Select of the columns of the picked user fields (and the id)"""
+    columns = [USER_ROW_COLUMNS[name] for name in fields.serializer.fields]
+    if 'id' not in fields.serializer.fields:
+        columns.append(User.id)
+    if 'plan' in fields.expand:
+        columns.append(User.plan_id)
+    stmt = select(*columns).select_from(User)
+    if 'plan' in fields.serializer.fields:
+        stmt = stmt.outerjoin(Plan, User.plan_id == Plan.id)
+    return stmt
+
+# Columns of the users listing, labeled with the field names
+USER_ROW_COLUMNS = {
+    'id': User.id,
+    'email': User.email,
+    'role': User.role,
+    'language': User.language,
+    'plan': func.coalesce(Plan.name, 'Free').label('plan'),
+    'is_active': User.is_active,
+    'is_confirmed': User.confirmed_at.isnot(None).label('is_confirmed'),
+    'created_at': User.created_at
+}
+
+def _render_users(rows, fields):
+    """Serialize user rows, loading each expanded relation with one query"""
+    users = fields.serializer.many(rows)
+    
+    if 'plan' in fields.expand:
+        serializer = fields.expand['plan']
+        plan_ids = {row.plan_id for row in rows if row.plan_id is not None}
+        plans = {plan.id: serializer(plan) for plan in Plan.query.filter(Plan.id.in_(plan_ids))} if plan_ids else {}
+        for data, row in zip(users, rows):
+            data['plan'] = plans.get(row.plan_id)
+    
+    if 'billing' in fields.expand:
+        serializer = fields.expand['billing']
+        columns = (getattr(BillingProfile, attribute) for attribute in serializer.fields.values())
+        billing = {
+            profile.user_id: serializer(profile)
+            for profile in db.session.execute(
+                select(BillingProfile.user_id, *columns).where(BillingProfile.user_id.in_([row.id for row in rows]))
+            )
+        }
+        for data, row in zip(users, rows):
+            data['billing'] = billing.get(row.id)
+    
+    return users
+
+def _invalid_parameter(e):
+    return jsonify({
+        "error": "Invalid parameter",
+        "message": str(e)
+    }), 400
+
 @bp.post("/v1/users")
 @require_api_key
+@idempotent
 def create_user_api():
     """Create a new user via API (admin only)"""
     user = g.current_user
@@ -177,16 +447,274 @@ def create_user_api():
     new_user.confirm()  # Auto-confirm API created users
     
     db.session.add(new_user)
+    db.session.flush()
+    WebhookEvent.emit(USER_CREATED, new_user.id, user_event_data(new_user))
     db.session.commit()
     
     return jsonify({
         "id": new_user.id,
         "email": new_user.email,
-        "created_at": new_user.created_at.isoformat()
+        "created_at": new_user.created_at
     }), 201
 
+# Inserts retried when emails of a batch are registered concurrently
+BATCH_CONFLICT_RETRIES = 3
+
+@bp.post("/v1/users:batch")
+@require_api_key
+@idempotent
+def create_users_batch():
+    """
+    Create many users in one request (admin only)
+    Takes a JSON array of {"email", "password"} objects and reports the
+    outcome of every item by its index; valid items are created even if
+    others fail.
+    """
+    user = g.current_user
+    
+    # Check if user is admin
+    if user.role != 'admin':
+        return jsonify({
+            "error": "Forbidden",
+            "message": "Admin access required"
+        }), 403
+    
+    items = request.get_json(silent=True)
+    max_items = current_app.config['API_USERS_BATCH_MAX']
+    if not isinstance(items, list) or not items:
+        return jsonify({
+            "error": "Invalid body",
+            "message": "Send a JSON array of {\"email\", \"password\"} objects"
+        }), 400
+    if len(items) > max_items:
+        return jsonify({
+            "error": "Batch too large",
+            "message": f"At most {max_items} users per request"
+        }), 413
+    
+    results = [None] * len(items)
+    candidates = {}  # email -> index of its first occurrence
+    for index, item in enumerate(items):
+        email = item.get("email") if isinstance(item, dict) else None
+        password = item.get("password") if isinstance(item, dict) else None
+        if not isinstance(email, str) or not isinstance(password, str) or not email or not password:
+            results[index] = _batch_error(index, "Missing fields", "Email and password are required")
+        elif email in candidates:
+            results[index] = _batch_error(index, "Duplicate email", "Email appears earlier in this batch")
+        else:
+            candidates[email] = index
+    
+    _mark_taken(candidates, results)
+    
+    if candidates:
+        hashes = dict(zip(candidates, password_hasher.hash_many(items[index]["password"] for index in candidates.values())))
+        confirmed_at = datetime.utcnow()
+        for attempt in range(BATCH_CONFLICT_RETRIES + 1):
+            rows = [
+                {"email": email, "password_hash": hashes[email], "confirmed_at": confirmed_at}
+                for email in candidates
+            ]
+            try:
+                created = db.session.execute(
+                    insert(User).returning(User.id, User.email, User.created_at, sort_by_parameter_order=True),
+                    rows
+                ).all() if rows else []
+                # Bulk inserts bypass the flush events that feed the change feed
+                UserChange.record([(row.id, USER, 'insert') for row in created])
+                WebhookEvent.emit_many(USER_CREATED, (
+                    (row.id, {'user': {'id': row.id, 'email': row.email, 'plan': 'Free'}}) for row in created
+                ))
+                db.session.commit()
+                break
+            except IntegrityError:
+                # Another request registered some of the emails in the
+                # meantime: report those and insert the rest
+                db.session.rollback()
+                _mark_taken(candidates, results)
+        else:
+            return jsonify({
+                "error": "Conflict",
+                "message": "Emails of the batch keep being registered concurrently, no users were created. Retry the batch."
+            }), 409
+        for row in created:
+            index = candidates[row.email]
+            results[index] = {
+                "index": index,
+                "status": "created",
+                "id": row.id,
+                "email": row.email,
+                "created_at": row.created_at
+            }
+    
+    created_count = sum(1 for result in results if result["status"] == "created")
+    return jsonify({
+        "created": created_count,
+        "failed": len(results) - created_count,
+        "results": results
+    })
+
+def _batch_error(index, error, message):
+    return {"index": index, "status": "error", "error": error, "message": message}
+
+def _mark_taken(candidates, results):
+    """Report the candidates (email -> index) already registered and drop them"""
+    # One set-based lookup (in chunks to stay below bind parameter limits)
+    emails = list(candidates)
+    for start in range(0, len(emails), 500):
+        taken = db.session.scalars(select(User.email).where(User.email.in_(emails[start:start + 500])))
+        for email in taken:
+            index = candidates.pop(email)
+            results[index] = _batch_error(index, "Email exists", "Email already registered")
+
+# ============ BATCH ============
+
+def _batch_items():
+    data = request.get_json(silent=True)
+    items = data.get("requests") if isinstance(data, dict) else data
+    return items if isinstance(items, list) else None
+
+def _batch_cost():
+    """Every sub-request counts against the rate limits"""
+    items = _batch_items()
+    return max(1, min(len(items), current_app.config['API_BATCH_MAX'])) if items else 1
+
+@bp.post("/v1/batch")
+@require_api_key(cost=_batch_cost)
+@feature_required('batch')
+@idempotent
+def batch():
+    """
+    Run several API requests in one
+    Takes {"requests": [{"method": "GET", "path": "/api/v1/me", "headers": {...},
+    "body": {...}}, ...]} (or the bare list) and answers with the status,
+    headers and body of every sub-request, in order. The key is verified
+    and charged once; sub-requests run in-process on the same database
+    session and identity.
+    """
+    items = _batch_items()
+    max_items = current_app.config['API_BATCH_MAX']
+    if not items:
+        return jsonify({
+            "error": "Invalid body",
+            "message": "Send {\"requests\": [{\"method\", \"path\"}, ...]}"
+        }), 400
+    if len(items) > max_items:
+        return jsonify({
+            "error": "Batch too large",
+            "message": f"At most {max_items} requests per batch"
+        }), 413
+    
+    g.api_batch = True
+    try:
+        responses = [_dispatch(item) for item in items]
+    finally:
+        g.api_batch = False
+    
+    return jsonify({"responses": responses})
+
+def _dispatch(item):
+    """Run one sub-request of a batch through the app's request handling"""
+    if not isinstance(item, dict) or not isinstance(item.get("path"), str):
+        return _batch_response(400, {"error": "Invalid request", "message": "Each request needs a path"})
+    method = str(item.get("method", "GET")).upper()
+    path = item["path"]
+    
+    # Only endpoints of this blueprint, and no nested batches
+    adapter = current_app.url_map.bind('')
+    try:
+        endpoint, _ = adapter.match(path.split('?', 1)[0], method=method)
+    except HTTPException as e:
+        return _batch_response(e.code, {"error": e.name, "message": e.description})
+    if not endpoint.startswith(f"{bp.name}.") or endpoint == f"{bp.name}.batch":
+        return _batch_response(400, {"error": "Invalid request", "message": "Only API endpoints can be batched"})
+    
+    headers = {
+        name: value for name, value in (item.get("headers") or {}).items()
+        if name.lower() != 'authorization'
+    }
+    # The request context shares the batch's app context, so g (identity)
+    # and the database session carry over
+    with current_app.test_request_context(path, method=method, headers=headers, json=item.get("body")):
+        try:
+            response = current_app.full_dispatch_request()
+        except Exception:
+            db.session.rollback()
+            current_app.logger.exception("Batch sub-request %s %s failed", method, path)
+            return _batch_response(500, {"error": "Internal error", "message": "The request failed"})
+        body = response.get_json(silent=True) if response.is_json else response.get_data(as_text=True)
+        return _batch_response(response.status_code, body, {
+            name: value for name, value in response.headers.items()
+            if name in BATCH_RESPONSE_HEADERS
+        })
+
+# Headers of sub-responses passed on to the client
+BATCH_RESPONSE_HEADERS = {'ETag', 'Location', 'X-Feed-Cursor'}
+
+def _batch_response(status, body, headers=None):
+    return {"status": status, "headers": headers or {}, "body": body}
+
+@bp.get("/v1/metrics")
+@require_api_key
+def get_metrics():
+    """Internal counters of this worker process and the webhook backlog (admin only)"""
+    user = g.current_user
+    
+    # Check if user is admin
+    if user.role != 'admin':
+        return jsonify({
+            "error": "Forbidden",
+            "message": "Admin access required"
+        }), 403
+    
+    return jsonify({
+        "api_key_cache": api_key_cache.stats(),
+        "rate_limiter": rate_limiter.stats(),
+        "entitlements": entitlements.stats(),
+        "password_hasher": password_hasher.stats(),
+        "throttle": throttle.stats(),
+        "consumed_tokens": consumed_tokens.stats(),
+        "webhooks": WebhookEvent.backlog()
+    })
+
+# ============ STRIPE ============
+
+@bp.post("/stripe/webhook")
+def stripe_webhook():
+    """
+    Receive a Stripe event: verify its signature, store it and acknowledge
+    Events are applied to users by `flask stripe process`; redeliveries
+    are acknowledged without being stored again.
+    """
+    if not current_app.config['STRIPE_WEBHOOK_SECRET']:
+        return jsonify({
+            "error": "Not configured",
+            "message": "Stripe webhooks are not configured"
+        }), 503
+    
+    try:
+        stored = stripe_events.receive(request.get_data(), request.headers.get('Stripe-Signature', ''))
+    except stripe_events.SignatureError as e:
+        return jsonify({
+            "error": "Invalid signature",
+            "message": str(e)
+        }), 400
+    except ValueError:
+        return jsonify({
+            "error": "Invalid payload",
+            "message": "The body is not a Stripe event"
+        }), 400
+    
+    return jsonify({"received": True, "duplicate": not stored})
+
 # ============ ERROR HANDLERS ============
 
+@bp.errorhandler(403)
+def api_forbidden(error):
+    return jsonify({
+        "error": "Forbidden",
+        "message": error.description
+    }), 403
+
 @bp.errorhandler(404)
 def api_not_found(error):
     return jsonify({
@@ -194,6 +722,14 @@ def api_not_found(error):
         "message": "The requested endpoint does not exist"
     }), 404
 
+@bp.errorhandler(503)
+def api_unavailable(error):
+    headers = {"Retry-After": error.retry_after} if getattr(error, "retry_after", None) else {}
+    return jsonify({
+        "error": "Service unavailable",
+        "message": error.description
+    }), 503, headers
+
 @bp.errorhandler(500)
 def api_server_error(error):
     return jsonify({
@@ -0,0 +1,176 @@
+"""
+Output shapes of the API, declared once per model
+
+Values are returned as they are (datetimes, Decimals); the app's JSON
+provider encodes them.
+"""
+
+from collections import namedtuple
+from functools import lru_cache
+
+
+class Serializer:
+    """
+    Field list of one output shape, compiled into a function that builds
+    the dict with plain attribute reads (no per-field loop or getattr)
+
+    Fields are attribute names, or (output name, attribute) pairs for
+    renamed values, e.g. Serializer('id', ('plan', 'plan_name')).
+    Works on model instances as well as on result rows.
+    """
+
+    def __init__(self, *fields):
+        self.fields = dict(
+            (field, field) if isinstance(field, str) else field
+            for field in fields
+        )
+        for name, attribute in self.fields.items():
+            if not attribute.isidentifier():
+                raise ValueError(f"Invalid attribute for field {name!r}: {attribute!r}")
+        self._serialize = self._compile()
+
+    def _compile(self):
+        items = ", ".join(f"{name!r}: obj.{attribute}" for name, attribute in self.fields.items())
+        source = f"def serialize(obj):\n    return {{{items}}}\n"
+        namespace = {}
+        exec(compile(source, f"<serializer {', '.join(self.fields)}>", "exec"), namespace)
+        return namespace["serialize"]
+
+    def __call__(self, obj):
+        return self._serialize(obj)
+
+    def many(self, objs):
+        serialize = self._serialize
+        return [serialize(obj) for obj in objs]
+
+    def extend(self, *fields):
+        """A serializer with additional fields"""
+        return Serializer(*self.fields.items(), *fields)
+
+    def only(self, *names):
+        """A serializer with a subset of the fields (in declaration order)"""
+        return Serializer(*((name, attribute) for name, attribute in self.fields.items() if name in names))
+
+
+class Selection(namedtuple('Selection', 'serializer columns expand')):
+    """
+    What one response contains: the serializer for the picked fields, the
+    columns they are read from and the serializers of expanded relations
+    """
+    __slots__ = ()
+
+    @property
+    def include(self):
+        return tuple(self.expand)
+
+    def __call__(self, obj):
+        data = self.serializer(obj)
+        for name, serializer in self.expand.items():
+            related = getattr(obj, name)
+            data[name] = serializer(related) if related is not None else None
+        return data
+
+    def many(self, objs):
+        return [self(obj) for obj in objs]
+
+
+class Fieldset:
+    """
+    Fields a client can pick with ?fields=id,email and relations it can
+    expand into nested objects with ?include=plan,billing (an expanded
+    relation replaces a field of the same name)
+
+    columns names the columns a computed field is read from; other fields
+    are read from the column of their attribute. Endpoints load only the
+    columns of the selection.
+    """
+
+    def __init__(self, serializer, default=None, columns=None, expand=None):
+        self.serializer = serializer
+        self.default = tuple(default or serializer.fields)
+        self.columns = columns or {}
+        self.expand = expand or {}
+        self._select = lru_cache(maxsize=256)(self._build)
+
+    def select(self, args):
+        """Selection for the request's query string; raises ValueError for unknown names"""
+        return self._select(_names(args.get('fields')) or self.default, _names(args.get('include')))
+
+    def _build(self, fields, include):
+        unknown = [name for name in fields if name not in self.serializer.fields]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+        unknown = [name for name in include if name not in self.expand]
+        if unknown:
+            raise ValueError(f"Cannot include: {', '.join(unknown)}")
+        serializer = self.serializer.only(*(name for name in fields if name not in include))
+        columns = dict.fromkeys(
+            column
+            for name, attribute in serializer.fields.items()
+            for column in self.columns.get(name, (attribute,))
+        )
+        return Selection(serializer, tuple(columns), {name: self.expand[name] for name in include})
+
+
+def _names(value):
+    return tuple(dict.fromkeys(name.strip() for name in (value or '').split(',') if name.strip()))
+
+
+user_serializer = Serializer(
+    'id', 'email', 'role', 'language', 'is_active', 'is_confirmed', 'created_at'
+)
+
+# GET /v1/me
+current_user_serializer = user_serializer.extend(('plan', 'plan_name'))
+
+# Rows of the users listing (columns are labeled with the field names)
+user_row_serializer = Serializer(
+    'id', 'email', 'role', 'language', 'plan', 'is_active', 'is_confirmed', 'created_at'
+)
+
+plan_serializer = Serializer(
+    'price', 'currency', 'billing_period', ('features', 'features_list')
+)
+
+# A plan expanded with ?include=plan
+plan_detail_serializer = Serializer('name').extend(*plan_serializer.fields.items())
+
+billing_serializer = Serializer(
+    'full_name', 'company', 'country'
+)
+
+api_key_serializer = Serializer(
+    'id', 'name', 'key_prefix', 'masked_key', 'is_active', 'created_at', ('last_used_at', 'last_used_minute')
+)
+
+webhook_serializer = Serializer(
+    'id', 'url', ('events', 'events_list'), 'is_active', 'created_at'
+)
+
+
+# ============ FIELDSETS (?fields= / ?include=) ============
+
+# Columns of the computed user and API key fields
+USER_COLUMNS = {
+    'plan': ('plan_id',),
+    'is_confirmed': ('confirmed_at',),
+}
+
+API_KEY_COLUMNS = {
+    'masked_key': ('key_prefix',),
+    'last_used_at': ('id', 'last_used_at'),
+}
+
+current_user_fields = Fieldset(
+    current_user_serializer,
+    columns=USER_COLUMNS,
+    expand={'plan': plan_detail_serializer, 'billing': billing_serializer}
+)
+
+user_list_fields = Fieldset(
+    user_row_serializer,
+    default=('id', 'email', 'role', 'plan', 'is_active', 'created_at'),
+    expand={'plan': plan_detail_serializer, 'billing': billing_serializer}
+)
+
+api_key_fields = Fieldset(api_key_serializer, columns=API_KEY_COLUMNS)
@@ -1,12 +1,24 @@
 from flask import render_template, redirect, url_for, flash, request, current_app
 from flask_login import login_user, logout_user, login_required, current_user
 from ...extensions import db
-from ...models import User
-from ...utils.security import generate_token, verify_token
+from ...models import User, WebhookEvent
+from ...models.webhook import USER_CREATED, user_event_data
+from ...utils.security import generate_token, verify_token, consumed_tokens
+from ...utils.throttle import throttle
 from ...utils.email import send_confirmation_email, send_password_reset_email, send_welcome_email
 from .forms import RegisterForm, LoginForm, ForgotForm, ResetForm
 from . import bp
 
+# Seconds confirmation and password reset links stay valid
+CONFIRM_TOKEN_MAX_AGE = 60*60*24
+RESET_TOKEN_MAX_AGE = 60*60*2
+
+def _throttled(retry_after, template, **context):
+    """Turn away a throttled attempt before any hashing or mail work"""
+    minutes = -(-retry_after // 60)
+    flash(f"Too many attempts. Please try again in {minutes} minute{'s' if minutes > 1 else ''}.", "danger")
+    return render_template(template, **context), 429, {"Retry-After": str(retry_after)}
+
 def _dev_show_link(link: str):
     """Show link in development mode"""
     if current_app.debug or current_app.config.get("ENV") == "development":
@@ -24,9 +36,11 @@ def register():
         if User.query.filter_by(email=email).first():
             flash("Email already registered.", "warning")
             return redirect(url_for(".login"))
-        user = User(email=email)
+        user = User(email=email, awaiting_confirmation=True)
         user.set_password(form.password.data)
         db.session.add(user)
+        db.session.flush()
+        WebhookEvent.emit(USER_CREATED, user.id, user_event_data(user))
         db.session.commit()
 
         token = generate_token({"uid": user.id, "purpose": "confirm"})
@@ -46,8 +60,8 @@ def register():
 
 @bp.route("/confirm/<token>")
 def confirm_email(token):
-    ok, data = verify_token(token, max_age=60*60*24)
-    if not ok or data.get("purpose") != "confirm":
+    ok, data = verify_token(token, max_age=CONFIRM_TOKEN_MAX_AGE)
+    if not ok or data.get("purpose") != "confirm" or consumed_tokens.is_consumed(token):
         flash("Invalid or expired confirmation link.", "danger")
         return redirect(url_for(".login"))
     user = User.query.get(data.get("uid"))
@@ -55,8 +69,12 @@ def confirm_email(token):
         flash("User not found.", "danger")
         return redirect(url_for(".login"))
     if not user.is_confirmed:
+        if not consumed_tokens.consume(token, "confirm", CONFIRM_TOKEN_MAX_AGE):
+            flash("Invalid or expired confirmation link.", "danger")
+            return redirect(url_for(".login"))
         user.confirm()
         db.session.commit()
+        consumed_tokens.remember(token, CONFIRM_TOKEN_MAX_AGE)
         
         # Send welcome email
         send_welcome_email(user)
@@ -70,8 +88,14 @@ def login():
         return redirect(url_for("main.profile"))
     form = LoginForm()
     if form.validate_on_submit():
-        user = User.query.filter_by(email=form.email.data.lower().strip()).first()
+        email = form.email.data.lower().strip()
+        # Sign-ins count against the email only when they fail (below)
+        retry_after = throttle.attempt("login", request.remote_addr, email, count=("ip",))
+        if retry_after:
+            return _throttled(retry_after, "auth/login.html", form=form)
+        user = User.query.filter_by(email=email).first()
         if not user or not user.check_password(form.password.data):
+            throttle.hit("login", email=email)
             flash("Invalid email or password.", "danger")
             return render_template("auth/login.html", form=form)
         
@@ -84,6 +108,11 @@ def login():
             flash("Please confirm your email first.", "warning")
             return redirect(url_for(".resend_confirmation", email=user.email))
         
+        # Move hashes made with older parameters to PASSWORD_HASH_METHOD
+        if user.password_needs_rehash:
+            user.set_password(form.password.data)
+            db.session.commit()
+        
         login_user(user, remember=True)
         flash("Welcome back!", "success")
         next_url = request.args.get("next") or url_for("main.profile")
@@ -92,8 +121,11 @@ def login():
 
 @bp.get("/resend-confirmation")
 def resend_confirmation():
-    email = request.args.get("email", type=str, default="")
-    user = User.query.filter_by(email=email.lower().strip()).first() if email else None
+    email = request.args.get("email", type=str, default="").lower().strip()
+    retry_after = throttle.attempt("resend", request.remote_addr, email)
+    if retry_after:
+        return _throttled(retry_after, "auth/login.html", form=LoginForm())
+    user = User.query.filter_by(email=email).first() if email else None
     if user and not user.is_confirmed:
         token = generate_token({"uid": user.id, "purpose": "confirm"})
         link = url_for(".confirm_email", token=token, _external=True)
@@ -118,6 +150,9 @@ def forgot():
     form = ForgotForm()
     if form.validate_on_submit():
         email = form.email.data.lower().strip()
+        retry_after = throttle.attempt("forgot", request.remote_addr, email)
+        if retry_after:
+            return _throttled(retry_after, "auth/forgot.html", form=form)
         user = User.query.filter_by(email=email).first()
         if user:
             token = generate_token({"uid": user.id, "purpose": "reset"})
@@ -138,8 +173,8 @@ def forgot():
 
 @bp.route("/reset/<token>", methods=["GET","POST"])
 def reset_with_token(token):
-    ok, data = verify_token(token, max_age=60*60*2)
-    if not ok or data.get("purpose") != "reset":
+    ok, data = verify_token(token, max_age=RESET_TOKEN_MAX_AGE)
+    if not ok or data.get("purpose") != "reset" or consumed_tokens.is_consumed(token):
         flash("Invalid or expired reset link.", "danger")
         return redirect(url_for(".forgot"))
     user = User.query.get(data.get("uid"))
@@ -148,8 +183,12 @@ def reset_with_token(token):
         return redirect(url_for(".forgot"))
     form = ResetForm()
     if form.validate_on_submit():
+        if not consumed_tokens.consume(token, "reset", RESET_TOKEN_MAX_AGE):
+            flash("Invalid or expired reset link.", "danger")
+            return redirect(url_for(".forgot"))
         user.set_password(form.password.data)
         db.session.commit()
+        consumed_tokens.remember(token, RESET_TOKEN_MAX_AGE)
         flash("Password updated. Please sign in.", "success")
         return redirect(url_for(".login"))
     return render_template("auth/reset.html", form=form)
@@ -1,6 +1,5 @@
 import click
 from flask import current_app
-from werkzeug.security import generate_password_hash
 from . import db
 from .models import User
 
@@ -17,9 +16,244 @@ def create_admin(email, password):
     if u:
         click.echo("User exists; updating role to admin and password...")
         u.role = "admin"
-        u.password_hash = generate_password_hash(password)
+        u.set_password(password)
     else:
-        u = User(email=email, role="admin", password_hash=generate_password_hash(password))
+        u = User(email=email, role="admin")
+        u.set_password(password)
         db.session.add(u)
     db.session.commit()
     click.echo("Admin ready: %s" % email)
+
+@cli.group("users")
+def users():
+    """Maintain user accounts."""
+
+@users.command("purge-unconfirmed")
+@click.option("--days", type=int, default=None,
+              help="Delete users unconfirmed this many days after registering (default: UNCONFIRMED_USER_MAX_AGE).")
+@click.option("--batch-size", type=int, default=None,
+              help="Users per transaction (default: UNCONFIRMED_PURGE_BATCH_SIZE).")
+@click.option("--pause", type=float, default=0.0, help="Seconds to wait between transactions.")
+@click.option("--dry-run", is_flag=True, help="Only report how many users would be deleted.")
+def purge_unconfirmed_users(days, batch_size, pause, dry_run):
+    """Delete users who signed up but never confirmed their email."""
+    import time
+    from datetime import datetime, timedelta
+    from sqlalchemy import func
+    days = days if days is not None else current_app.config["UNCONFIRMED_USER_MAX_AGE"]
+    batch_size = batch_size or current_app.config["UNCONFIRMED_PURGE_BATCH_SIZE"]
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    stale = User.unconfirmed_before(cutoff)
+    pending, oldest = db.session.query(func.count(User.id), func.min(User.created_at)).filter(stale).one()
+    if dry_run or not pending:
+        click.echo("%d users registered before %s never confirmed their email%s"
+                   % (pending, cutoff.strftime("%Y-%m-%d %H:%M"), " (oldest: %s)" % oldest if pending else ""))
+        return
+    start = time.perf_counter()
+
+    def progress(deleted):
+        elapsed = time.perf_counter() - start
+        click.echo("Deleted %d/%d unconfirmed users (%.0f users/s)" % (deleted, pending, deleted / elapsed))
+        if pause:
+            time.sleep(pause)
+
+    deleted = User.purge_unconfirmed(cutoff, batch_size, progress)
+    click.echo("Deleted %d unconfirmed users registered before %s in %.2fs"
+               % (deleted, cutoff.strftime("%Y-%m-%d %H:%M"), time.perf_counter() - start))
+
+@cli.group("changes")
+def changes():
+    """Maintain the user change feed."""
+
+@changes.command("compact")
+@click.option("--older-than", type=int, default=None,
+              help="Only compact entries older than this many hours (default: CHANGE_FEED_COMPACT_AFTER).")
+def compact_changes(older_than):
+    """Drop feed entries superseded by a later change of the same user."""
+    from datetime import timedelta
+    from .models import UserChange
+    hours = older_than if older_than is not None else current_app.config["CHANGE_FEED_COMPACT_AFTER"]
+    deleted = UserChange.compact(timedelta(hours=hours))
+    click.echo("Compacted change feed: %d entries removed" % deleted)
+
+@changes.command("prune")
+@click.option("--days", type=int, default=None,
+              help="Keep this many days of history (default: CHANGE_FEED_RETENTION_DAYS).")
+def prune_changes(days):
+    """Drop feed history older than the retention period."""
+    from .models import UserChange
+    days = days if days is not None else current_app.config["CHANGE_FEED_RETENTION_DAYS"]
+    deleted = UserChange.prune(days)
+    click.echo("Pruned change feed: %d entries older than %d days removed" % (deleted, days))
+
+@cli.group("idempotency")
+def idempotency():
+    """Maintain saved Idempotency-Key responses."""
+
+@idempotency.command("prune")
+def prune_idempotency():
+    """Delete saved responses older than IDEMPOTENCY_TTL hours."""
+    from .utils.idempotency import prune_idempotency_keys
+    deleted = prune_idempotency_keys()
+    click.echo("Pruned idempotency keys: %d responses removed" % deleted)
+
+@cli.group("api-keys")
+def api_keys():
+    """Maintain API keys."""
+
+@api_keys.command("sweep")
+@click.option("--batch-size", type=int, default=None,
+              help="Keys per UPDATE/DELETE (default: API_KEY_SWEEP_BATCH_SIZE).")
+@click.option("--purge-days", type=int, default=None,
+              help="Delete keys expired this many days ago (default: API_KEY_PURGE_DAYS).")
+def sweep_api_keys(batch_size, purge_days):
+    """Disable expired API keys and delete long expired ones."""
+    import time
+    from .models import APIKey
+    batch_size = batch_size or current_app.config["API_KEY_SWEEP_BATCH_SIZE"]
+    purge_days = purge_days if purge_days is not None else current_app.config["API_KEY_PURGE_DAYS"]
+    start = time.perf_counter()
+    disabled = APIKey.deactivate_expired(batch_size)
+    click.echo("Disabled %d expired API keys in %.2fs" % (disabled, time.perf_counter() - start))
+    start = time.perf_counter()
+    deleted = APIKey.purge_expired(purge_days, batch_size)
+    click.echo("Deleted %d API keys expired more than %d days ago in %.2fs" % (deleted, purge_days, time.perf_counter() - start))
+
+@cli.group("passwords")
+def passwords():
+    """Tune password hashing."""
+
+@passwords.command("calibrate")
+@click.option("--target-ms", type=int, default=250, help="Time one hash may take on this host.")
+@click.option("--algorithm", type=click.Choice(["scrypt", "pbkdf2"]), default="scrypt")
+@click.option("--max-memory", type=int, default=128, help="Memory one scrypt hash may use, in MiB.")
+def calibrate_passwords(target_ms, algorithm, max_memory):
+    """Pick PASSWORD_HASH_METHOD for a target hashing time."""
+    from .utils.hashing import calibrate, password_hasher
+    method, seconds = calibrate(target_ms / 1000, algorithm, max_memory * 2**20)
+    click.echo("PASSWORD_HASH_METHOD=%s  (%.0f ms per hash, %.0f hashes/s per process)"
+               % (method, seconds * 1000, password_hasher.size / seconds))
+    if method != password_hasher.method:
+        outdated = User.query.filter(User.password_hash.notlike(method + "$%")).count()
+        click.echo("Currently %s; once changed, %d users are rehashed when they next sign in"
+                   % (password_hasher.method, outdated))
+
+@cli.group("throttle")
+def throttle():
+    """Inspect sign-in and mail throttles."""
+
+@throttle.command("status")
+@click.argument("subject")
+def throttle_status(subject):
+    """Show the throttle counts of an IP address or email."""
+    from .utils.throttle import throttle
+    scope = "email" if "@" in subject else "ip"
+    subject = subject.lower().strip() if scope == "email" else subject
+    for name, rule_scope in throttle.rules:
+        if rule_scope == scope:
+            count, limit = throttle.state(name, scope, subject)
+            click.echo("%-8s %5.1f / %d" % (name, count, limit))
+
+@throttle.command("reset")
+@click.argument("subject")
+def throttle_reset(subject):
+    """Clear the throttle counts of an IP address or email."""
+    from .utils.throttle import throttle
+    scope = "email" if "@" in subject else "ip"
+    subject = subject.lower().strip() if scope == "email" else subject
+    for name, rule_scope in throttle.rules:
+        if rule_scope == scope:
+            throttle.reset(name, scope, subject)
+    click.echo("Throttles cleared for %s" % subject)
+
+@cli.group("webhooks")
+def webhooks():
+    """Deliver outbound webhooks."""
+
+@webhooks.command("deliver")
+@click.option("--once", is_flag=True, help="Stop when no deliveries are due.")
+@click.option("--workers", type=int, default=None, help="Delivery threads (default: WEBHOOK_WORKERS).")
+@click.option("--batch-size", type=int, default=None, help="Events per request (default: WEBHOOK_BATCH_SIZE).")
+@click.option("--poll-interval", type=float, default=1.0, help="Seconds between checks when idle.")
+def deliver_webhooks(once, workers, batch_size, poll_interval):
+    """Run the delivery worker, reporting throughput and lag."""
+    from .utils.webhooks import WebhookDispatcher
+
+    def report(stats):
+        click.echo("Delivered %(delivered)d events in %(requests)d requests "
+                   "(%(failed)d to retry, %(given_up)d given up): %(throughput).0f events/s, "
+                   "lag mean %(lag_mean).2fs max %(lag_max).2fs" % stats)
+
+    dispatcher = WebhookDispatcher.from_config(current_app.config, workers=workers, batch_size=batch_size)
+    try:
+        dispatcher.run(once=once, poll_interval=poll_interval, report=report)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        dispatcher.close()
+
+@webhooks.command("receiver")
+@click.option("--host", default="127.0.0.1")
+@click.option("--port", type=int, default=8765)
+@click.option("--secret", default=None, help="Reject deliveries not signed with this secret.")
+@click.option("--fail-rate", type=float, default=0.0, help="Share of requests answered with 503.")
+@click.option("--delay", type=float, default=0.0, help="Seconds to wait before answering.")
+def webhook_receiver(host, port, secret, fail_rate, delay):
+    """Run a local stand-in endpoint that accepts and counts deliveries.
+
+    Endpoints on this host need WEBHOOK_ALLOW_PRIVATE=true.
+    """
+    import threading
+    import time
+    from .utils.webhooks import WebhookReceiver
+    server = WebhookReceiver((host, port), secret=secret, fail_rate=fail_rate, delay=delay)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    click.echo("Receiving webhooks on http://%s:%d/ (Ctrl+C to stop)" % (host, port))
+    last = 0
+    try:
+        while True:
+            time.sleep(5)
+            stats = dict(server.stats)
+            if stats["events"] != last:
+                click.echo("%(events)d events in %(requests)d requests over %(connections)d connections "
+                           "(%(rejected)d rejected)" % stats)
+                last = stats["events"]
+    except KeyboardInterrupt:
+        server.shutdown()
+
+@webhooks.command("prune")
+@click.option("--days", type=int, default=None,
+              help="Keep this many days of delivered events (default: WEBHOOK_RETENTION_DAYS).")
+def prune_webhooks(days):
+    """Delete delivered and given up events older than the retention period."""
+    from .models import WebhookEvent
+    days = days if days is not None else current_app.config["WEBHOOK_RETENTION_DAYS"]
+    deleted = WebhookEvent.prune(days)
+    click.echo("Pruned webhook outbox: %d events older than %d days removed" % (deleted, days))
+
+@cli.group("stripe")
+def stripe():
+    """Apply received Stripe events."""
+
+@stripe.command("process")
+@click.option("--once", is_flag=True, help="Stop when no events are pending.")
+@click.option("--batch-size", type=int, default=None, help="Events per batch (default: STRIPE_EVENTS_BATCH_SIZE).")
+@click.option("--poll-interval", type=float, default=1.0, help="Seconds between checks when idle.")
+def process_stripe_events(once, batch_size, poll_interval):
+    """Apply pending Stripe events to users' subscriptions and plans."""
+    import time
+    from .utils.stripe_events import process_events
+    batch_size = batch_size or current_app.config["STRIPE_EVENTS_BATCH_SIZE"]
+    try:
+        while True:
+            start = time.perf_counter()
+            processed = process_events(batch_size)
+            if processed:
+                elapsed = time.perf_counter() - start
+                click.echo("Processed %d Stripe events in %.2fs (%.0f events/s)" % (processed, elapsed, processed / elapsed))
+            elif once:
+                break
+            else:
+                time.sleep(poll_interval)
+    except KeyboardInterrupt:
+        pass
@@ -14,6 +14,119 @@ class BaseConfig:
     WTF_CSRF_TIME_LIMIT = None
     PREFERRED_URL_SCHEME = "https"
     SECURITY_TOKEN_SALT = os.getenv("SECURITY_TOKEN_SALT", "change-me")
+    # Used confirmation/reset tokens are kept until they expire; expired
+    # ones are purged at most this often (seconds)
+    TOKEN_PURGE_INTERVAL = int(os.getenv("TOKEN_PURGE_INTERVAL", 3600))
+
+    # Secret for API key digests (falls back to SECRET_KEY)
+    API_KEY_DIGEST_SECRET = os.getenv("API_KEY_DIGEST_SECRET", "")
+
+    # Verified API key cache (per worker process)
+    API_KEY_CACHE_SIZE = int(os.getenv("API_KEY_CACHE_SIZE", 1024))
+    API_KEY_CACHE_TTL = int(os.getenv("API_KEY_CACHE_TTL", 60))  # seconds
+
+    # Expired API keys are disabled in batches of API_KEY_SWEEP_BATCH_SIZE
+    # and deleted API_KEY_PURGE_DAYS after their expiry (flask api-keys sweep)
+    API_KEY_SWEEP_BATCH_SIZE = int(os.getenv("API_KEY_SWEEP_BATCH_SIZE", 1000))
+    API_KEY_PURGE_DAYS = int(os.getenv("API_KEY_PURGE_DAYS", 90))
+
+    # How often buffered API key usage (last_used_at) is written, in seconds
+    API_KEY_USAGE_FLUSH_INTERVAL = int(os.getenv("API_KEY_USAGE_FLUSH_INTERVAL", 30))
+    # Usage counters are kept per minute, then per hour, then per day
+    API_USAGE_MINUTE_RETENTION = int(os.getenv("API_USAGE_MINUTE_RETENTION", 48))  # hours
+    API_USAGE_HOUR_RETENTION = int(os.getenv("API_USAGE_HOUR_RETENTION", 90))  # days
+
+    # State shared by the workers on one host (rate limits); a file path or ":memory:"
+    SHARED_STATE_PATH = os.getenv("SHARED_STATE_PATH", "")  # default: instance/shared_state.bin
+    SHARED_STATE_SLOTS = int(os.getenv("SHARED_STATE_SLOTS", 65536))
+
+    # API rate limits in requests per minute, unless the user's plan sets them
+    RATELIMIT_ENABLED = os.getenv("RATELIMIT_ENABLED", "True").lower() == "true"
+    RATELIMIT_DEFAULT_KEY = int(os.getenv("RATELIMIT_DEFAULT_KEY", 60))
+    RATELIMIT_DEFAULT_USER = int(os.getenv("RATELIMIT_DEFAULT_USER", 120))
+
+    # Entitlements of users without a plan; plans leaving them empty get
+    # the features too (comma-separated, see utils.entitlements.FEATURES)
+    API_KEYS_DEFAULT_MAX = int(os.getenv("API_KEYS_DEFAULT_MAX", 1))
+    PLAN_DEFAULT_FEATURES = os.getenv("PLAN_DEFAULT_FEATURES", "webhooks,batch")
+
+    # Sliding-window throttles of sign-in, password reset and confirmation
+    # mails, as "requests/seconds" per client IP and per email address
+    # (sign-ins count against the email only when they fail)
+    THROTTLE_ENABLED = os.getenv("THROTTLE_ENABLED", "True").lower() == "true"
+    THROTTLE_LOGIN_IP = os.getenv("THROTTLE_LOGIN_IP", "30/300")
+    THROTTLE_LOGIN_EMAIL = os.getenv("THROTTLE_LOGIN_EMAIL", "10/900")
+    THROTTLE_FORGOT_IP = os.getenv("THROTTLE_FORGOT_IP", "10/3600")
+    THROTTLE_FORGOT_EMAIL = os.getenv("THROTTLE_FORGOT_EMAIL", "3/3600")
+    THROTTLE_RESEND_IP = os.getenv("THROTTLE_RESEND_IP", "10/3600")
+    THROTTLE_RESEND_EMAIL = os.getenv("THROTTLE_RESEND_EMAIL", "3/3600")
+
+    # Client IPs are the peer address of the connection, which is the proxy
+    # when the app runs behind one. Set to the number of proxies in front of
+    # the app to take the client IP (and scheme) from their X-Forwarded-For
+    # (and X-Forwarded-Proto) headers. Leave at 0 when clients can reach the
+    # app directly: they could otherwise spoof the header to dodge the
+    # per-IP throttles.
+    PROXY_TRUSTED_HOPS = int(os.getenv("PROXY_TRUSTED_HOPS", 0))
+
+    # Users who never confirmed their email are deleted this many days
+    # after registering, in transactions of UNCONFIRMED_PURGE_BATCH_SIZE
+    # users (flask users purge-unconfirmed)
+    UNCONFIRMED_USER_MAX_AGE = int(os.getenv("UNCONFIRMED_USER_MAX_AGE", 30))
+    UNCONFIRMED_PURGE_BATCH_SIZE = int(os.getenv("UNCONFIRMED_PURGE_BATCH_SIZE", 500))
+
+    # Page size of GET /api/v1/users (clients may ask for up to the maximum)
+    API_USERS_PAGE_SIZE = int(os.getenv("API_USERS_PAGE_SIZE", 100))
+    API_USERS_MAX_PAGE_SIZE = int(os.getenv("API_USERS_MAX_PAGE_SIZE", 1000))
+    # Maximum number of users per POST /api/v1/users:batch request
+    API_USERS_BATCH_MAX = int(os.getenv("API_USERS_BATCH_MAX", 5000))
+
+    # User change feed: superseded entries are compacted after some hours,
+    # history older than the retention period is pruned
+    CHANGE_FEED_COMPACT_AFTER = int(os.getenv("CHANGE_FEED_COMPACT_AFTER", 24))
+    CHANGE_FEED_RETENTION_DAYS = int(os.getenv("CHANGE_FEED_RETENTION_DAYS", 30))
+    # Entries younger than this many seconds are held back from readers, so
+    # that transactions committing out of id order leave no gaps (not
+    # needed on SQLite; must exceed the longest transaction writing users)
+    CHANGE_FEED_SETTLE = float(os.getenv("CHANGE_FEED_SETTLE", 5))
+
+    # Idempotency-Key handling: responses are replayed for IDEMPOTENCY_TTL
+    # hours, retries wait up to IDEMPOTENCY_WAIT seconds for a running
+    # request, and a request running longer than IDEMPOTENCY_LOCK_TIMEOUT
+    # seconds is considered abandoned
+    IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL", 24))
+    IDEMPOTENCY_WAIT = float(os.getenv("IDEMPOTENCY_WAIT", 10))
+    IDEMPOTENCY_LOCK_TIMEOUT = int(os.getenv("IDEMPOTENCY_LOCK_TIMEOUT", 60))
+
+    # Maximum number of sub-requests per POST /api/v1/batch
+    API_BATCH_MAX = int(os.getenv("API_BATCH_MAX", 20))
+
+    # Password hashing: parameters of new hashes (older ones are rehashed at
+    # sign-in; pick them with `flask passwords calibrate`), threads hashing
+    # (0 = one per CPU) and hashes allowed to wait for a thread before
+    # requests are answered with 503
+    PASSWORD_HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+    PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", 0))
+    PASSWORD_HASH_QUEUE = int(os.getenv("PASSWORD_HASH_QUEUE", 16))
+
+    # Outbound webhooks: endpoints per user, delivery worker threads, events
+    # per request, request timeout (seconds), attempts before giving up,
+    # delay before the first retry (seconds, doubled per attempt) and days
+    # delivered events are kept
+    WEBHOOK_MAX_ENDPOINTS = int(os.getenv("WEBHOOK_MAX_ENDPOINTS", 10))
+    WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", 8))
+    WEBHOOK_BATCH_SIZE = int(os.getenv("WEBHOOK_BATCH_SIZE", 100))
+    WEBHOOK_TIMEOUT = float(os.getenv("WEBHOOK_TIMEOUT", 10))
+    WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", 10))
+    WEBHOOK_BACKOFF = float(os.getenv("WEBHOOK_BACKOFF", 30))
+    WEBHOOK_RETENTION_DAYS = int(os.getenv("WEBHOOK_RETENTION_DAYS", 7))
+    # Allow endpoints on loopback/private/link-local addresses (local testing
+    # with `flask webhooks receiver` only: lets key holders reach internal hosts)
+    WEBHOOK_ALLOW_PRIVATE = os.getenv("WEBHOOK_ALLOW_PRIVATE", "False").lower() == "true"
+
+    # Logged in page views read the user from a snapshot in the session,
+    # which is reloaded from the database after this many seconds at most
+    SESSION_PRINCIPAL_MAX_AGE = int(os.getenv("SESSION_PRINCIPAL_MAX_AGE", 300))
 
     SESSION_COOKIE_SECURE = False
     REMEMBER_COOKIE_SECURE = False
@@ -27,6 +140,9 @@ class BaseConfig:
     STRIPE_PUBLIC_KEY = os.getenv("STRIPE_PUBLIC_KEY", "")
     STRIPE_SECRET_KEY = os.getenv("STRIPE_SECRET_KEY", "")
     STRIPE_WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET", "")
+    # Accepted age of a webhook signature in seconds, events applied per batch
+    STRIPE_WEBHOOK_TOLERANCE = int(os.getenv("STRIPE_WEBHOOK_TOLERANCE", 300))
+    STRIPE_EVENTS_BATCH_SIZE = int(os.getenv("STRIPE_EVENTS_BATCH_SIZE", 500))
     
     # Email Configuration
     MAIL_SERVER = os.getenv("MAIL_SERVER", "smtp.gmail.com")
@@ -58,3 +174,5 @@ class TestingConfig(BaseConfig):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = "sqlite:///:memory:"
     MAIL_SUPPRESS_SEND = True
+    API_KEY_USAGE_FLUSH_INTERVAL = 0
+    SHARED_STATE_PATH = ":memory:"
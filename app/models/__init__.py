@@ -2,3 +2,9 @@ from .user import User
 from .billing import BillingProfile
 from .plan import Plan
 from .api_key import APIKey
+from .api_usage import APIKeyUsage
+from .change_feed import UserChange
+from .idempotency import IdempotencyKey
+from .webhook import WebhookEndpoint, WebhookEvent
+from .stripe_event import StripeEvent
+from .consumed_token import ConsumedToken
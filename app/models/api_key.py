@@ -1,18 +1,31 @@
-from datetime import datetime
+from datetime import datetime, timedelta
+import hashlib
+import hmac
 import secrets
+import string
+from flask import current_app
+from sqlalchemy import and_, delete, literal_column, or_, select, update
 from ..extensions import db
 
+KEY_PREFIX = 'sk_live_'
+SECRET_LENGTH = 64  # hex characters in the secret part of a v2 key
+
 class APIKey(db.Model):
     __tablename__ = 'api_key'
     
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False, index=True)
+    
+    # Legacy storage: password hash of the key. Cleared once the key has
+    # been migrated to key_digest on its first successful verification.
+    key_hash = db.Column(db.String(255), nullable=True, unique=True, index=True)
     
-    # The actual API key (hashed for security)
-    key_hash = db.Column(db.String(255), nullable=False, unique=True, index=True)
+    # HMAC-SHA256 of the key under a server-side secret (indexed lookup)
+    key_digest = db.Column(db.String(64), nullable=True, unique=True, index=True)
     
-    # First 8 characters to show user (for identification)
-    key_prefix = db.Column(db.String(8), nullable=False)
+    # Leading characters shown to the user (for identification); also the
+    # lookup index for legacy keys, whose prefix is their first 12 chars
+    key_prefix = db.Column(db.String(32), nullable=False, index=True)
     
     # Optional name/description
     name = db.Column(db.String(100), nullable=True)
@@ -21,38 +34,184 @@ class APIKey(db.Model):
     last_used_at = db.Column(db.DateTime, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     
-    # Expiration (optional)
-    expires_at = db.Column(db.DateTime, nullable=True)
+    # Expiration (optional); indexed for the expiry sweep
+    expires_at = db.Column(db.DateTime, nullable=True, index=True)
     
     # Active status
     is_active = db.Column(db.Boolean, default=True, nullable=False)
+
+    # Row version, incremented by every UPDATE; API ETags are derived from it
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1', onupdate=literal_column('version + 1'))
     
     # Relationship
     user = db.relationship('User', back_populates='api_keys')
     
     @staticmethod
-    def generate_key():
-        """Generate a secure random API key"""
-        # Format: sk_live_32_random_characters
-        random_part = secrets.token_urlsafe(32)
-        return f"sk_live_{random_part}"
+    def generate_key(key_id):
+        """Generate a secure random API key for the row with the given id"""
+        # Format (v2): sk_live_<key id>_<64 hex characters>
+        # Legacy keys were sk_live_<43 urlsafe characters> with no key id
+        return f"{KEY_PREFIX}{key_id}_{secrets.token_hex(SECRET_LENGTH // 2)}"
+    
+    @staticmethod
+    def parse_key_id(key):
+        """Return the key id embedded in a v2 key, or None for legacy keys"""
+        key_id, _, secret = key[len(KEY_PREFIX):].partition('_')
+        if (key_id.isdigit() and len(secret) == SECRET_LENGTH
+                and all(c in string.hexdigits for c in secret)):
+            return int(key_id)
+        return None
     
     @staticmethod
     def hash_key(key):
         """Hash an API key for storage"""
-        from werkzeug.security import generate_password_hash
-        return generate_password_hash(key)
+        from ..utils.hashing import password_hasher
+        return password_hasher.hash(key)
     
     @staticmethod
     def verify_key(key_hash, key):
         """Verify an API key against its hash"""
-        from werkzeug.security import check_password_hash
-        return check_password_hash(key_hash, key)
+        from ..utils.hashing import password_hasher
+        return password_hasher.verify(key_hash, key)
+    
+    @staticmethod
+    def digest_key(key):
+        """Keyed digest of an API key, used for indexed lookup"""
+        # Changing this secret invalidates every digest-stored key
+        secret = current_app.config.get('API_KEY_DIGEST_SECRET') or current_app.config['SECRET_KEY']
+        return hmac.new(secret.encode(), key.encode(), hashlib.sha256).hexdigest()
+    
+    def set_key(self, key):
+        """Store a key using the digest scheme"""
+        self.key_digest = self.digest_key(key)
+        self.key_hash = None
+        if self.parse_key_id(key) is None:
+            self.key_prefix = key[:12]
+        else:
+            # Key id plus the first 4 characters of the secret
+            self.key_prefix = key[:len(key) - SECRET_LENGTH + 4]
+    
+    def issue_key(self):
+        """Generate a new key for this row, store it and return it"""
+        if self.id is None:
+            # The key embeds the row id, so the row has to exist first
+            self.key_prefix = KEY_PREFIX
+            db.session.add(self)
+            db.session.flush()
+        raw_key = self.generate_key(self.id)
+        self.set_key(raw_key)
+        return raw_key
     
-    def mark_used(self):
-        """Update last used timestamp"""
-        self.last_used_at = datetime.utcnow()
-        db.session.commit()
+    @classmethod
+    def find_by_key(cls, key, digest=None, options=()):
+        """
+        Resolve a raw API key to its row, or None if it does not exist
+        options are loader options applied to the lookup (e.g. joinedload)
+        """
+        digest = digest or cls.digest_key(key)
+        
+        # v2 keys name their row: a single primary key read
+        key_id = cls.parse_key_id(key)
+        if key_id is not None:
+            api_key = db.session.get(cls, key_id, options=options)
+            if api_key is not None and api_key.key_digest is not None \
+                    and hmac.compare_digest(api_key.key_digest, digest):
+                return api_key
+            return None
+        
+        # Legacy keys until they are regenerated: digest index first,
+        # then the prefix index for rows that were never migrated. Disabled
+        # and expired keys are filtered out in the query, so they never get
+        # to the slow verification below.
+        usable = cls.usable()
+        api_key = cls.query.options(*options).filter_by(key_digest=digest).filter(usable).first()
+        if api_key is not None and hmac.compare_digest(api_key.key_digest, digest):
+            return api_key
+        
+        # Legacy rows only have a password hash: verify them the slow way
+        # and move them to the digest scheme so this happens only once
+        legacy_keys = cls.query.options(*options).filter_by(key_prefix=key[:12], key_digest=None).filter(usable).all()
+        for legacy_key in legacy_keys:
+            if cls.verify_key(legacy_key.key_hash, key):
+                legacy_key.set_key(key)
+                db.session.commit()
+                return legacy_key
+        
+        return None
+    
+    @classmethod
+    def usable(cls, now=None):
+        """SQL condition for keys that are active and not expired"""
+        now = now or datetime.utcnow()
+        return and_(cls.is_active.is_(True), or_(cls.expires_at.is_(None), cls.expires_at > now))
+    
+    @classmethod
+    def deactivate_expired(cls, batch_size=1000):
+        """
+        Disable active keys past their expiry, batch_size keys per UPDATE
+        and transaction, and recount the active keys of their owners.
+        Returns the number of disabled keys.
+        """
+        from .user import User
+        now = datetime.utcnow()
+        total = 0
+        while True:
+            rows = db.session.execute(
+                select(cls.id, cls.user_id)
+                .where(cls.is_active.is_(True), cls.expires_at <= now)
+                .order_by(cls.expires_at)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                return total
+            db.session.execute(
+                update(cls).where(cls.id.in_([row.id for row in rows])).values(is_active=False),
+                execution_options={'synchronize_session': False}
+            )
+            User.recount_api_keys({row.user_id for row in rows})
+            db.session.commit()
+            total += len(rows)
+    
+    @classmethod
+    def purge_expired(cls, days, batch_size=1000):
+        """
+        Delete keys that expired more than the given number of days ago,
+        with their usage counters, batch_size keys per transaction.
+        Returns the number of deleted keys.
+        """
+        from .api_usage import APIKeyUsage
+        from .user import User
+        cutoff = datetime.utcnow() - timedelta(days=days)
+        total = 0
+        while True:
+            rows = db.session.execute(
+                select(cls.id, cls.user_id).where(cls.expires_at < cutoff).order_by(cls.expires_at).limit(batch_size)
+            ).all()
+            if not rows:
+                return total
+            ids = [row.id for row in rows]
+            db.session.execute(delete(APIKeyUsage).where(APIKeyUsage.api_key_id.in_(ids)))
+            db.session.execute(delete(cls).where(cls.id.in_(ids)), execution_options={'synchronize_session': False})
+            User.recount_api_keys({row.user_id for row in rows})
+            db.session.commit()
+            total += len(rows)
+    
+    def mark_used(self, endpoint=None):
+        """Record usage; last_used_at and counters are written in batches by the usage recorder"""
+        from ..utils.usage import usage_recorder
+        usage_recorder.record(self.id, endpoint)
+    
+    @property
+    def last_used(self):
+        """Last used timestamp, including usage not yet written to the database"""
+        from ..utils.usage import usage_recorder
+        return usage_recorder.last_used_at(self)
+    
+    @property
+    def last_used_minute(self):
+        """last_used to the minute, which stays the same for a key polled every few seconds"""
+        last_used = self.last_used
+        return last_used.replace(second=0, microsecond=0) if last_used else None
     
     @property
     def is_expired(self):
@@ -0,0 +1,66 @@
+import time
+from sqlalchemy import case, func
+from ..extensions import db
+
+# Bucket sizes in seconds
+MINUTE = 60
+HOUR = 3600
+DAY = 86400
+
+class APIKeyUsage(db.Model):
+    """Request counters per API key and endpoint, bucketed by time"""
+    __tablename__ = 'api_key_usage'
+    
+    api_key_id = db.Column(db.Integer, db.ForeignKey('api_key.id', ondelete='CASCADE'), primary_key=True)
+    endpoint = db.Column(db.String(64), primary_key=True)  # e.g. "GET /api/v1/me"
+    
+    # Bucket size in seconds (MINUTE, HOUR or DAY) and its start as a Unix timestamp
+    resolution = db.Column(db.Integer, primary_key=True)
+    bucket_start = db.Column(db.Integer, primary_key=True)
+    
+    count = db.Column(db.Integer, nullable=False, default=0)
+    
+    @staticmethod
+    def bucket(timestamp, resolution=MINUTE):
+        """Start of the bucket containing a Unix timestamp"""
+        return int(timestamp) - int(timestamp) % resolution
+    
+    @classmethod
+    def totals(cls, key_ids, *windows):
+        """
+        Request totals per key for each window (timedeltas ending now)
+        Returns {key_id: [count per window]}
+        """
+        if not key_ids:
+            return {}
+        now = time.time()
+        columns = [
+            func.sum(case((cls.bucket_start >= now - window.total_seconds(), cls.count), else_=0))
+            for window in windows
+        ]
+        oldest = now - max(window.total_seconds() for window in windows)
+        rows = db.session.query(cls.api_key_id, *columns).filter(
+            cls.api_key_id.in_(key_ids),
+            cls.bucket_start >= oldest
+        ).group_by(cls.api_key_id).all()
+        return {row[0]: [int(total or 0) for total in row[1:]] for row in rows}
+    
+    @classmethod
+    def hourly(cls, key_id, hours=24):
+        """Requests per hour and per endpoint for one key over the last hours"""
+        since = cls.bucket(time.time(), HOUR) - (hours - 1) * HOUR
+        rows = db.session.query(cls.endpoint, cls.bucket_start, cls.count).filter(
+            cls.api_key_id == key_id,
+            cls.resolution.in_((MINUTE, HOUR)),
+            cls.bucket_start >= since
+        ).all()
+        
+        per_hour = dict.fromkeys(range(since, since + hours * HOUR, HOUR), 0)
+        per_endpoint = {}
+        for endpoint, bucket_start, count in rows:
+            per_hour[cls.bucket(bucket_start, HOUR)] += count
+            per_endpoint[endpoint] = per_endpoint.get(endpoint, 0) + count
+        return per_hour, per_endpoint
+    
+    def __repr__(self):
+        return f'<APIKeyUsage {self.api_key_id} {self.endpoint} {self.resolution}@{self.bucket_start}>'
@@ -1,3 +1,4 @@
+from sqlalchemy import literal_column
 from ..extensions import db
 
 class BillingProfile(db.Model):
@@ -14,4 +15,7 @@ class BillingProfile(db.Model):
     country = db.Column(db.String(2), nullable=True)  # ISO 2-letter code
     tax_id = db.Column(db.String(64), nullable=True)  # VAT/Tax number
 
+    # Row version, incremented by every UPDATE; API ETags are derived from it
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1', onupdate=literal_column('version + 1'))
+
     user = db.relationship("User", back_populates="billing")
@@ -0,0 +1,145 @@
+from datetime import datetime, timedelta
+from sqlalchemy import delete, event, func, insert, inspect, select, update
+from flask_sqlalchemy.session import Session
+from ..extensions import db
+from .user import User
+from .billing import BillingProfile
+
+# Kinds of changes
+USER = 'user'          # the user row itself
+PLAN = 'plan'          # plan assignment (user.plan_id)
+BILLING = 'billing'    # the user's billing profile
+
+# Marks where pruned history ends (see UserChange.prune)
+PRUNED = 'pruned'
+
+# User columns whose changes are plan assignments
+PLAN_COLUMNS = {'plan_id', 'plan_subscribed_at'}
+
+class UserChange(db.Model):
+    """
+    Change feed of users, their plan assignments and billing profiles
+
+    One entry per inserted, updated or deleted row, written in the same
+    transaction as the change. The id is the feed position: clients
+    read entries after the last id they saw. user_id is kept when the
+    user is deleted.
+    """
+    __tablename__ = 'user_change'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=True, index=True)
+    kind = db.Column(db.String(16), nullable=False)  # USER, PLAN or BILLING
+    op = db.Column(db.String(8), nullable=False)  # insert, update, delete (or PRUNED)
+    changed_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+    @classmethod
+    def record(cls, changes):
+        """
+        Add entries for changes made outside the ORM unit of work (bulk
+        inserts/updates), as (user_id, kind, op) tuples
+        """
+        if changes:
+            now = datetime.utcnow()
+            db.session.execute(insert(cls), [
+                {'user_id': user_id, 'kind': kind, 'op': op, 'changed_at': now}
+                for user_id, kind, op in changes
+            ])
+
+    @classmethod
+    def latest_id(cls, settle=0):
+        """
+        Position up to which the feed can be read without gaps
+
+        Ids are allocated at insert but become visible at commit, so on
+        databases with concurrent writers (PostgreSQL, MySQL) a lower id
+        can appear after a higher one was read. With settle, the position
+        stops before the oldest entry younger than settle seconds, which is
+        gap-free as long as no transaction takes longer than that to commit.
+        SQLite serializes writers, so its ids always commit in order.
+        """
+        if settle and db.session.get_bind().dialect.name != 'sqlite':
+            cutoff = datetime.utcnow() - timedelta(seconds=settle)
+            unsettled = db.session.scalar(select(func.min(cls.id)).where(cls.changed_at >= cutoff))
+            if unsettled is not None:
+                return unsettled - 1
+        return db.session.scalar(select(func.max(cls.id))) or 0
+
+    @classmethod
+    def horizon(cls):
+        """Id of the pruned marker, before which history is gone (0 if never pruned)"""
+        oldest = db.session.execute(select(cls.id, cls.op).order_by(cls.id).limit(1)).first()
+        return oldest.id if oldest is not None and oldest.op == PRUNED else 0
+
+    @classmethod
+    def compact(cls, older_than):
+        """
+        Delete entries older than the timedelta that a later entry for the
+        same user and kind supersedes. Readers from any position still see
+        the latest change of every user, deletes included.
+        Returns the number of deleted entries.
+        """
+        cutoff = datetime.utcnow() - older_than
+        # The derived table lets MySQL read the table it deletes from
+        latest = select(func.max(cls.id).label('id')).group_by(cls.user_id, cls.kind).subquery()
+        result = db.session.execute(
+            delete(cls).where(cls.changed_at < cutoff, cls.op != PRUNED, cls.id.not_in(select(latest.c.id)))
+        )
+        db.session.commit()
+        return result.rowcount
+
+    @classmethod
+    def prune(cls, days):
+        """
+        Delete all entries older than the given number of days. The newest
+        of them becomes a PRUNED marker, so readers behind it learn that
+        they missed changes and must resync.
+        Returns the number of deleted entries.
+        """
+        cutoff = datetime.utcnow() - timedelta(days=days)
+        horizon = db.session.scalar(select(func.max(cls.id)).where(cls.changed_at < cutoff))
+        if horizon is None:
+            return 0
+        result = db.session.execute(delete(cls).where(cls.id < horizon))
+        db.session.execute(
+            update(cls).where(cls.id == horizon).values(user_id=None, kind=PRUNED, op=PRUNED)
+        )
+        db.session.commit()
+        return result.rowcount
+
+    def __repr__(self):
+        return f'<UserChange {self.id} {self.kind} {self.op} user={self.user_id}>'
+
+
+@event.listens_for(Session, 'after_flush')
+def _record_changes(session, flush_context):
+    """Write feed entries for the users and billing profiles of a flush"""
+    changes = []
+    for op, objects in (('insert', session.new), ('update', session.dirty), ('delete', session.deleted)):
+        for obj in objects:
+            if isinstance(obj, User):
+                if op == 'update':
+                    changed = _changed_columns(obj)
+                    if changed & PLAN_COLUMNS or inspect(obj).attrs.plan.history.has_changes():
+                        changes.append((obj.id, PLAN, op))
+                    if not changed - PLAN_COLUMNS:
+                        continue
+                changes.append((obj.id, USER, op))
+            elif isinstance(obj, BillingProfile):
+                if op == 'update' and not _changed_columns(obj):
+                    continue
+                changes.append((obj.user_id, BILLING, op))
+    if changes:
+        now = datetime.utcnow()
+        session.connection().execute(insert(UserChange), [
+            {'user_id': user_id, 'kind': kind, 'op': op, 'changed_at': now}
+            for user_id, kind, op in dict.fromkeys(changes)
+        ])
+
+
+def _changed_columns(obj):
+    state = inspect(obj)
+    changed = {attr.key for attr in state.mapper.column_attrs if state.attrs[attr.key].history.has_changes()}
+    # The version follows every change, it is not one itself
+    changed.discard('version')
+    return changed
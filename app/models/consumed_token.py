@@ -0,0 +1,25 @@
+from ..extensions import db
+
+class ConsumedToken(db.Model):
+    """
+    Confirmation or password reset token that has been used, so that it
+    is not accepted again before it expires (see utils.security)
+    """
+    __tablename__ = 'consumed_token'
+
+    # SHA-256 of the token; the token itself is a credential until it expires
+    digest = db.Column(db.String(64), primary_key=True)
+    purpose = db.Column(db.String(16), nullable=False)
+
+    # When the token would expire anyway; the row can be purged from then on
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    @classmethod
+    def purge(cls, now):
+        """Delete the rows of tokens that have expired; returns how many"""
+        deleted = cls.query.filter(cls.expires_at < now).delete(synchronize_session=False)
+        db.session.commit()
+        return deleted
+
+    def __repr__(self):
+        return f'<ConsumedToken {self.purpose} {self.digest[:12]}>'
@@ -0,0 +1,27 @@
+from datetime import datetime
+from ..extensions import db
+
+class IdempotencyKey(db.Model):
+    """
+    First response of a mutating API request sent with an Idempotency-Key
+    header, replayed to retries with the same key (see utils.idempotency)
+    """
+    __tablename__ = 'idempotency_key'
+    
+    # Keys are chosen by clients, so they are scoped to the user
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
+    key = db.Column(db.String(255), primary_key=True)
+    
+    # Hash of method, path and body: a key must not be reused for another request
+    fingerprint = db.Column(db.String(64), nullable=False)
+    
+    # Saved response; status_code is empty while the first request is running
+    status_code = db.Column(db.Integer, nullable=True)
+    mimetype = db.Column(db.String(100), nullable=True)
+    body = db.Column(db.LargeBinary, nullable=True)
+    headers = db.Column(db.Text, nullable=True)  # JSON list of [name, value] pairs
+    
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+    
+    def __repr__(self):
+        return f'<IdempotencyKey {self.user_id}:{self.key} {self.status_code or "in flight"}>'
@@ -1,7 +1,11 @@
 from datetime import datetime
+from sqlalchemy import literal_column
 from ..extensions import db
 
 class Plan(db.Model):
+    # max_api_keys of plans without a limit
+    UNLIMITED = -1
+
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False, unique=True)
     description = db.Column(db.Text, nullable=True)
@@ -22,6 +26,14 @@ class Plan(db.Model):
     stripe_price_id = db.Column(db.String(255), nullable=True)  # Stripe Price ID
     stripe_product_id = db.Column(db.String(255), nullable=True)  # Stripe Product ID
     
+    # API rate limits in requests per minute (empty = app default)
+    api_rate_limit = db.Column(db.Integer, nullable=True)  # per API key
+    api_user_rate_limit = db.Column(db.Integer, nullable=True)  # per user, across keys
+    
+    # Entitlements (utils.entitlements compiles them per plan id)
+    max_api_keys = db.Column(db.Integer, nullable=True)  # active API keys, empty = API_KEYS_DEFAULT_MAX, UNLIMITED = no limit
+    features = db.Column(db.String(255), nullable=True)  # comma-separated, empty = PLAN_DEFAULT_FEATURES
+    
     # Plan Settings
     is_active = db.Column(db.Boolean, default=True, nullable=False)
     is_featured = db.Column(db.Boolean, default=False, nullable=False)
@@ -31,6 +43,9 @@ class Plan(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Row version, incremented by every UPDATE; API ETags are derived from it
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1', onupdate=literal_column('version + 1'))
+    
     # Relationships
     users = db.relationship('User', back_populates='plan', lazy='dynamic')
     
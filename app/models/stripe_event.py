@@ -0,0 +1,32 @@
+from datetime import datetime
+from ..extensions import db
+
+class StripeEvent(db.Model):
+    """
+    Raw Stripe webhook event, stored as received
+
+    The webhook endpoint only verifies and stores events; the unique
+    event_id drops Stripe's redeliveries. utils.stripe_events applies
+    them to users in the background, in the order Stripe created them.
+    """
+    __tablename__ = 'stripe_event'
+
+    id = db.Column(db.Integer, primary_key=True)
+    event_id = db.Column(db.String(255), nullable=False, unique=True)
+    type = db.Column(db.String(100), nullable=False)
+    payload = db.Column(db.LargeBinary, nullable=False)  # request body as received
+
+    # Stripe customer the event is about, if any
+    customer = db.Column(db.String(255), nullable=True, index=True)
+
+    # When Stripe created the event, and when it was received and processed
+    created = db.Column(db.DateTime, nullable=False)
+    received_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    processed_at = db.Column(db.DateTime, nullable=True, index=True)
+
+    # Why processing failed. Events of customers not linked to a user yet
+    # are retried once the customer is linked, others are not retried.
+    error = db.Column(db.String(255), nullable=True)
+
+    def __repr__(self):
+        return f'<StripeEvent {self.event_id} {self.type}>'
@@ -1,7 +1,7 @@
 from datetime import datetime
 from typing import Optional
-from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
+from sqlalchemy import and_, delete, func, literal_column, select, update
 from ..extensions import db
 
 class User(UserMixin, db.Model):
@@ -13,24 +13,57 @@ class User(UserMixin, db.Model):
     password_hash = db.Column(db.String(255), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     confirmed_at = db.Column(db.DateTime, nullable=True)
+    # Registered through the sign-up form and never confirmed since: only
+    # these are deleted by purge_unconfirmed() (not the users an admin
+    # added or un-confirmed)
+    awaiting_confirmation = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
     
     # Enable/disable functionality
     is_active = db.Column(db.Boolean, default=True, nullable=False, index=True)
     
+    # Incremented when an admin changes, disables or deletes the user; the
+    # sessions of the user reload it then (utils.principal)
+    security_version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+
+    # Row version, incremented by every UPDATE; API ETags are derived from it
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1', onupdate=literal_column('version + 1'))
+
     # Plan relationship
     plan_id = db.Column(db.Integer, db.ForeignKey('plan.id'), nullable=True)
     plan = db.relationship('Plan', back_populates='users')
     plan_subscribed_at = db.Column(db.DateTime, nullable=True)
 
+    # Active API keys, kept up to date by count_api_keys() so that plan
+    # limits are checked without counting
+    api_key_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    # Stripe subscription, kept in sync from Stripe events (utils.stripe_events)
+    stripe_customer_id = db.Column(db.String(255), nullable=True, unique=True, index=True)
+    stripe_subscription_id = db.Column(db.String(255), nullable=True)
+    subscription_status = db.Column(db.String(32), nullable=True)  # active, trialing, past_due, canceled...
+    subscription_updated_at = db.Column(db.DateTime, nullable=True)  # creation time of the last applied event
+
+    # Finds the stale unconfirmed users for purge_unconfirmed() without a scan
+    __table_args__ = (db.Index('ix_user_awaiting_confirmation_created_at', 'awaiting_confirmation', 'created_at'),)
+
     # Relationships
     billing = db.relationship("BillingProfile", uselist=False, back_populates="user", cascade="all, delete-orphan")
     api_keys = db.relationship("APIKey", back_populates="user", cascade="all, delete-orphan", lazy='dynamic')
+    webhooks = db.relationship("WebhookEndpoint", back_populates="user", cascade="all, delete-orphan", lazy='dynamic')
 
     def set_password(self, password: str):
-        self.password_hash = generate_password_hash(password)
+        from ..utils.hashing import password_hasher
+        self.password_hash = password_hasher.hash(password)
 
     def check_password(self, password: str) -> bool:
-        return check_password_hash(self.password_hash, password)
+        from ..utils.hashing import password_hasher
+        return password_hasher.verify(self.password_hash, password)
+
+    @property
+    def password_needs_rehash(self) -> bool:
+        """Whether the password hash predates the current PASSWORD_HASH_METHOD"""
+        from ..utils.hashing import password_hasher
+        return password_hasher.needs_rehash(self.password_hash)
 
     @property
     def is_confirmed(self) -> bool:
@@ -38,6 +71,7 @@ class User(UserMixin, db.Model):
 
     def confirm(self):
         self.confirmed_at = datetime.utcnow()
+        self.awaiting_confirmation = False
     
     def get_id(self):
         """Required by Flask-Login"""
@@ -63,7 +97,82 @@ class User(UserMixin, db.Model):
         """Get plan name or 'Free'"""
         return self.plan.name if self.plan else 'Free'
     
-    @property
-    def active_api_keys_count(self):
-        """Count of active API keys"""
-        return self.api_keys.filter_by(is_active=True).count()
+    @classmethod
+    def count_api_keys(cls, user_id, delta):
+        """
+        Add delta to a user's count of active API keys, in SQL so that
+        concurrent changes add up. Neither the row version nor the change
+        feed follow the counter.
+        """
+        db.session.execute(
+            update(cls).where(cls.id == user_id)
+            .values(api_key_count=cls.api_key_count + delta, version=cls.version)
+        )
+    
+    @classmethod
+    def unconfirmed_before(cls, cutoff):
+        """
+        SQL condition for users who signed up before cutoff and never
+        confirmed: not admins, and without a plan, Stripe customer or API key
+        """
+        from .api_key import APIKey
+        return and_(
+            cls.awaiting_confirmation.is_(True), cls.confirmed_at.is_(None), cls.created_at < cutoff,
+            cls.role != 'admin', cls.plan_id.is_(None), cls.stripe_customer_id.is_(None),
+            ~select(APIKey.id).where(APIKey.user_id == cls.id).exists()
+        )
+    
+    @classmethod
+    def purge_unconfirmed(cls, cutoff, batch_size=500, progress=None):
+        """
+        Delete the users who signed up before cutoff and never confirmed
+        their email (unconfirmed_before()), with their rows in other tables, batch_size users per
+        transaction so that writers are never locked out for long.
+        progress(deleted) is called after each transaction. Returns the
+        number of deleted users.
+        """
+        from .api_key import APIKey
+        from .api_usage import APIKeyUsage
+        from .billing import BillingProfile
+        from .change_feed import USER, UserChange
+        from .idempotency import IdempotencyKey
+        from .plan import Plan
+        from .webhook import USER_DELETED, WebhookEndpoint, WebhookEvent
+        total = 0
+        while True:
+            rows = db.session.execute(
+                select(cls.id, cls.email, Plan.name.label('plan'))
+                .outerjoin(Plan, Plan.id == cls.plan_id)
+                .where(cls.unconfirmed_before(cutoff))
+                .order_by(cls.awaiting_confirmation, cls.created_at)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                return total
+            ids = [row.id for row in rows]
+            WebhookEvent.emit_many(USER_DELETED, (
+                (row.id, {'user': {'id': row.id, 'email': row.email, 'plan': row.plan or 'Free'}}) for row in rows
+            ))
+            # Bulk deletes bypass the ORM cascades and the change feed's flush events
+            key_ids = select(APIKey.id).where(APIKey.user_id.in_(ids))
+            unsynchronized = {'synchronize_session': False}
+            db.session.execute(delete(APIKeyUsage).where(APIKeyUsage.api_key_id.in_(key_ids)), execution_options=unsynchronized)
+            for model in (APIKey, BillingProfile, WebhookEndpoint, IdempotencyKey):
+                db.session.execute(delete(model).where(model.user_id.in_(ids)), execution_options=unsynchronized)
+            db.session.execute(delete(cls).where(cls.id.in_(ids)), execution_options=unsynchronized)
+            UserChange.record([(user_id, USER, 'delete') for user_id in ids])
+            db.session.commit()
+            total += len(rows)
+            if progress is not None:
+                progress(total)
+    
+    @classmethod
+    def recount_api_keys(cls, user_ids):
+        """Set the count of active API keys of the given users from their keys"""
+        from .api_key import APIKey
+        active = select(func.count(APIKey.id)).where(APIKey.user_id == cls.id, APIKey.is_active.is_(True))
+        db.session.execute(
+            update(cls).where(cls.id.in_(user_ids))
+            .values(api_key_count=active.scalar_subquery(), version=cls.version),
+            execution_options={'synchronize_session': False}
+        )
@@ -0,0 +1,161 @@
+from datetime import datetime, timedelta
+import json
+import secrets
+import uuid
+from sqlalchemy import delete, func, insert, or_, select
+from ..extensions import db
+
+# Event types
+USER_CREATED = 'user.created'
+USER_DELETED = 'user.deleted'
+PLAN_CHANGED = 'plan.changed'
+EVENTS = (USER_CREATED, USER_DELETED, PLAN_CHANGED)
+
+class WebhookEndpoint(db.Model):
+    """
+    A URL subscribed to events. An endpoint receives the events of its
+    owner; endpoints of admins receive the events of all users.
+    """
+    __tablename__ = 'webhook_endpoint'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False, index=True)
+    url = db.Column(db.String(2048), nullable=False)
+
+    # Signs the deliveries (see utils.webhooks)
+    secret = db.Column(db.String(64), nullable=False)
+
+    # Comma-separated event types, empty for all events
+    events = db.Column(db.String(255), nullable=False, default='')
+
+    is_active = db.Column(db.Boolean, default=True, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    # Relationship
+    user = db.relationship('User', back_populates='webhooks')
+
+    @staticmethod
+    def generate_secret():
+        return f"whsec_{secrets.token_hex(24)}"
+
+    @property
+    def events_list(self):
+        return self.events.split(',') if self.events else list(EVENTS)
+
+    def subscribes_to(self, event):
+        return not self.events or event in self.events.split(',')
+
+    def __repr__(self):
+        return f'<WebhookEndpoint {self.id} {self.url}>'
+
+
+class WebhookEvent(db.Model):
+    """
+    Outbox of webhook deliveries, one row per event and endpoint
+
+    Rows are added in the same transaction as the change they report, so
+    an event is queued if and only if the change is committed. The URL and
+    secret are copied from the endpoint: events about a deleted user are
+    still delivered after the user's endpoints are gone.
+
+    A row is due while next_attempt_at is set and in the past; it is
+    cleared once the event is delivered (delivered_at) or given up.
+    """
+    __tablename__ = 'webhook_event'
+
+    id = db.Column(db.Integer, primary_key=True)
+    endpoint_id = db.Column(db.Integer, nullable=False, index=True)
+    url = db.Column(db.String(2048), nullable=False)
+    secret = db.Column(db.String(64), nullable=False)
+
+    # Shared by the rows of one event, so receivers can drop duplicates
+    event_id = db.Column(db.String(32), nullable=False)
+    event = db.Column(db.String(32), nullable=False)
+    payload = db.Column(db.Text, nullable=False)  # JSON of the event data
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=True, index=True)
+    delivered_at = db.Column(db.DateTime, nullable=True, index=True)
+    last_error = db.Column(db.String(255), nullable=True)
+
+    @classmethod
+    def emit(cls, event, user_id, data):
+        """Queue an event about a user in the current transaction"""
+        return cls.emit_many(event, [(user_id, data)])
+
+    @classmethod
+    def emit_many(cls, event, items):
+        """
+        Queue an event about each user in the current transaction, for
+        the active endpoints of the user and of admins
+        items are (user_id, data) pairs; data is the JSON-serializable
+        event payload. Returns the number of queued deliveries.
+        """
+        from .user import User
+        items = list(items)
+        if not items:
+            return 0
+
+        user_ids = {user_id for user_id, _ in items}
+        admin_ids = select(User.id).where(User.role == 'admin').scalar_subquery()
+        endpoints = db.session.execute(
+            select(WebhookEndpoint.id, WebhookEndpoint.user_id, WebhookEndpoint.url,
+                   WebhookEndpoint.secret, WebhookEndpoint.events, User.role)
+            .join(User, User.id == WebhookEndpoint.user_id)
+            .where(WebhookEndpoint.is_active.is_(True),
+                   or_(WebhookEndpoint.user_id.in_(user_ids), WebhookEndpoint.user_id.in_(admin_ids)))
+        ).all()
+        endpoints = [endpoint for endpoint in endpoints if not endpoint.events or event in endpoint.events.split(',')]
+        if not endpoints:
+            return 0
+
+        now = datetime.utcnow()
+        rows = []
+        for user_id, data in items:
+            event_id = uuid.uuid4().hex
+            payload = json.dumps(data, separators=(',', ':'), default=str)
+            rows.extend(
+                {
+                    'endpoint_id': endpoint.id, 'url': endpoint.url, 'secret': endpoint.secret,
+                    'event_id': event_id, 'event': event, 'payload': payload,
+                    'created_at': now, 'next_attempt_at': now
+                }
+                for endpoint in endpoints
+                if endpoint.user_id == user_id or endpoint.role == 'admin'
+            )
+        if rows:
+            db.session.execute(insert(cls), rows)
+        return len(rows)
+
+    @classmethod
+    def backlog(cls):
+        """Number of pending deliveries and the age of the oldest, in seconds"""
+        pending, oldest = db.session.execute(
+            select(func.count(cls.id), func.min(cls.created_at)).where(cls.next_attempt_at.is_not(None))
+        ).one()
+        lag = (datetime.utcnow() - oldest).total_seconds() if oldest else 0.0
+        return {'pending': pending, 'oldest_pending_seconds': round(lag, 3)}
+
+    @classmethod
+    def prune(cls, days):
+        """
+        Delete delivered and given up deliveries older than the given
+        number of days; returns the number of deleted rows
+        """
+        cutoff = datetime.utcnow() - timedelta(days=days)
+        result = db.session.execute(
+            delete(cls).where(cls.next_attempt_at.is_(None), cls.created_at < cutoff)
+        )
+        db.session.commit()
+        return result.rowcount
+
+    def __repr__(self):
+        return f'<WebhookEvent {self.id} {self.event} -> {self.url}>'
+
+
+def user_event_data(user, **extra):
+    """Payload of an event about a user"""
+    data = {'user': {'id': user.id, 'email': user.email, 'plan': user.plan_name}}
+    data.update(extra)
+    return data
@@ -14,7 +14,10 @@ def roles_required(*roles):
         def wrapper(*args, **kwargs):
             if not current_user.is_authenticated:
                 abort(401)
-            if getattr(current_user, "role", "user") not in roles:
+            # Roles from the database, not the session snapshot, so that a
+            # demoted or disabled user loses access at once
+            user = getattr(current_user, "user", current_user)
+            if not user.is_active or getattr(user, "role", "user") not in roles:
                 abort(403)
             return fn(*args, **kwargs)
         return wrapper
@@ -1,8 +1,127 @@
 from functools import wraps
-from flask import request, jsonify, g
-from ..models import User, APIKey
+from flask import request, jsonify, g, make_response
+from sqlalchemy.orm import joinedload
+from ..extensions import db
+from ..models import User, Plan, APIKey
+from .api_key_cache import api_key_cache
+from .ratelimit import rate_limiter, rate_limit_headers
 
-def require_api_key(f):
+# Relations of the user an endpoint can ask to have loaded with the key
+USER_RELATIONS = {
+    'plan': User.plan,
+    'billing': User.billing
+}
+
+def _error(error, message, status=401):
+    response = jsonify({'error': error, 'message': message})
+    response.status_code = status
+    return response
+
+def _load_options(include, user_columns=None):
+    """
+    Loader options fetching key, user and requested relations in one query
+    With user_columns, only those columns of the user are loaded.
+    """
+    # The plan is always loaded: ETags and plan names read it
+    relations = {'plan'} | set(include)
+    user_loader = joinedload(APIKey.user)
+    relation_loaders = {name: joinedload(USER_RELATIONS[name]) for name in sorted(relations)}
+    if user_columns:
+        # The pipeline itself reads is_active and the plan id (rate limits
+        # come from the entitlement table), conditional requests the versions
+        columns = {'is_active', 'plan_id', 'version'} | set(user_columns)
+        user_loader = user_loader.load_only(*(getattr(User, name) for name in sorted(columns)))
+        if 'plan' not in include:
+            relation_loaders['plan'] = relation_loaders['plan'].load_only(Plan.name, Plan.version)
+    return [
+        user_loader.options(*relation_loaders.values())
+    ]
+
+def _endpoint_label():
+    """Endpoint name used for usage metering, e.g. 'GET /api/v1/me'"""
+    rule = request.url_rule.rule if request.url_rule else request.path
+    return f"{request.method} {rule}"
+
+def _authenticate(include=(), user_columns=None, cost=1):
+    """
+    API key pipeline shared by require_api_key and optional_api_key
+
+    Parses the Authorization header, verifies the key (from the cache or
+    with one indexed lookup), checks key, expiry and account state, loads
+    key + user (optionally only user_columns) + requested relations in a
+    single query and applies the rate limits (charging cost requests).
+
+    Returns (api_key, limit, None) on success and (None, limit, error
+    response) otherwise; the error is None if no credentials were sent.
+    """
+    auth_header = request.headers.get('Authorization', '')
+    if not auth_header:
+        return None, None, None
+
+    # Extract key from "Bearer sk_live_..." format
+    parts = auth_header.split()
+    if len(parts) != 2 or parts[0].lower() != 'bearer':
+        return None, None, _error('Invalid authorization format', 'Use: Authorization: Bearer sk_live_...')
+
+    api_key_value = parts[1]
+
+    # Validate key format
+    if not api_key_value.startswith('sk_live_'):
+        return None, None, _error('Invalid API key format', 'API keys must start with sk_live_')
+
+    options = _load_options(include, user_columns)
+    digest = APIKey.digest_key(api_key_value)
+    state = api_key_cache.get(digest)
+    api_key = None
+    if state is None:
+        # Cache miss: verify and load in one go (legacy keys are migrated on the fly)
+        api_key = APIKey.find_by_key(api_key_value, digest=digest, options=options)
+        if api_key is not None:
+            state = api_key_cache.put(digest, api_key)
+
+    if not state:
+        return None, None, _error('Invalid API key', 'The provided API key is invalid')
+
+    # Check if key is active
+    if not state.key_active:
+        return None, None, _error('API key disabled', 'This API key has been disabled')
+
+    # Check if key has expired
+    if state.is_expired:
+        return None, None, _error('API key expired', 'This API key has expired')
+
+    # Check if user is active
+    if not state.user_active:
+        return None, None, _error('Account disabled', 'Your account has been disabled', 403)
+
+    if api_key is None:
+        # Cache hit: a single joined read by primary key
+        api_key = db.session.get(APIKey, state.key_id, options=options)
+        if api_key is None:
+            api_key_cache.invalidate_key(state.key_id)
+            return None, None, _error('Invalid API key', 'The provided API key is invalid')
+
+    # Apply the plan's rate limits before doing any work for the request
+    limit = rate_limiter.check(api_key.id, api_key.user_id, api_key.user.plan_id, cost)
+    if limit and not limit.allowed:
+        return None, limit, _error(
+            'Rate limit exceeded',
+            f'Too many requests. Retry in {limit.retry_after} seconds.',
+            429
+        )
+
+    # Update last used timestamp and usage counters
+    api_key.mark_used(_endpoint_label())
+
+    return api_key, limit, None
+
+def _call_view(f, limit, *args, **kwargs):
+    response = make_response(f(*args, **kwargs))
+    if limit:
+        response.headers.update(rate_limit_headers(limit))
+    return response
+
+def require_api_key(f=None, *, include=(), fields=None, cost=None):
     """
     Decorator to require API key authentication
     Usage:
@@ -11,113 +130,78 @@ def require_api_key(f):
         def protected_route():
             # g.current_user is available here
             return jsonify({'user': g.current_user.email})
+
+    Endpoints declare the user relations they read so they are loaded
+    together with the key, e.g. @require_api_key(include=('billing',)).
+    Endpoints rendering the user with a Fieldset pass it as fields: the
+    ?fields=/?include= selection then decides which user columns and
+    relations are loaded, and is available as g.fields.
+    Endpoints counting as several requests pass cost, a function returning
+    the number to charge to the rate limits.
+
+    Sub-requests of POST /api/v1/batch run with the identity of the batch,
+    which was authenticated and charged once for all of them.
     """
+    if f is None:
+        return lambda view: require_api_key(view, include=include, fields=fields, cost=cost)
+
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        # Get API key from header
-        auth_header = request.headers.get('Authorization', '')
-        
-        if not auth_header:
-            return jsonify({
-                'error': 'Missing API key',
-                'message': 'Include your API key in the Authorization header: Bearer sk_live_...'
-            }), 401
-        
-        # Extract key from "Bearer sk_live_..." format
-        parts = auth_header.split()
-        if len(parts) != 2 or parts[0].lower() != 'bearer':
-            return jsonify({
-                'error': 'Invalid authorization format',
-                'message': 'Use: Authorization: Bearer sk_live_...'
-            }), 401
-        
-        api_key_value = parts[1]
-        
-        # Validate key format
-        if not api_key_value.startswith('sk_live_'):
-            return jsonify({
-                'error': 'Invalid API key format',
-                'message': 'API keys must start with sk_live_'
-            }), 401
-        
-        # Get key prefix for lookup
-        key_prefix = api_key_value[:12]
-        
-        # Find all keys with this prefix
-        potential_keys = APIKey.query.filter_by(key_prefix=key_prefix).all()
-        
-        # Verify the key
-        valid_key = None
-        for key in potential_keys:
-            if APIKey.verify_key(key.key_hash, api_key_value):
-                valid_key = key
-                break
-        
-        if not valid_key:
-            return jsonify({
-                'error': 'Invalid API key',
-                'message': 'The provided API key is invalid'
-            }), 401
-        
-        # Check if key is active
-        if not valid_key.is_active:
-            return jsonify({
-                'error': 'API key disabled',
-                'message': 'This API key has been disabled'
-            }), 401
-        
-        # Check if key has expired
-        if valid_key.is_expired:
-            return jsonify({
-                'error': 'API key expired',
-                'message': 'This API key has expired'
-            }), 401
-        
-        # Check if user is active
-        if not valid_key.user.is_active:
-            return jsonify({
-                'error': 'Account disabled',
-                'message': 'Your account has been disabled'
-            }), 403
-        
-        # Update last used timestamp
-        valid_key.mark_used()
-        
+        relations, user_columns = include, None
+        if fields is not None:
+            try:
+                g.fields = fields.select(request.args)
+            except ValueError as e:
+                return _error('Invalid parameter', str(e), 400)
+            relations = tuple(include) + g.fields.include
+            user_columns = g.fields.columns
+
+        if g.get('api_batch'):
+            g.api_key.mark_used(_endpoint_label())
+            return f(*args, **kwargs)
+
+        api_key, limit, error = _authenticate(relations, user_columns, cost() if cost else 1)
+
+        if api_key is None:
+            if error is None:
+                error = _error(
+                    'Missing API key',
+                    'Include your API key in the Authorization header: Bearer sk_live_...'
+                )
+            if limit:
+                error.headers.update(rate_limit_headers(limit))
+            return error
+
         # Store user in g for use in route
-        g.current_user = valid_key.user
-        g.api_key = valid_key
-        
-        return f(*args, **kwargs)
-    
+        g.current_user = api_key.user
+        g.api_key = api_key
+
+        return _call_view(f, limit, *args, **kwargs)
+
     return decorated_function
 
-def optional_api_key(f):
+def optional_api_key(f=None, *, include=()):
     """
     Decorator that allows both API key and regular authentication
     """
+    if f is None:
+        return lambda view: optional_api_key(view, include=include)
+
     @wraps(f)
     def decorated_function(*args, **kwargs):
+        if g.get('api_batch'):
+            g.api_key.mark_used(_endpoint_label())
+            return f(*args, **kwargs)
+
         # Try API key first
-        auth_header = request.headers.get('Authorization', '')
-        
-        if auth_header:
-            # Has authorization header, try API key
-            parts = auth_header.split()
-            if len(parts) == 2 and parts[0].lower() == 'bearer':
-                api_key_value = parts[1]
-                key_prefix = api_key_value[:12]
-                
-                potential_keys = APIKey.query.filter_by(key_prefix=key_prefix).all()
-                
-                for key in potential_keys:
-                    if APIKey.verify_key(key.key_hash, api_key_value):
-                        if key.is_active and not key.is_expired and key.user.is_active:
-                            key.mark_used()
-                            g.current_user = key.user
-                            g.api_key = key
-                            return f(*args, **kwargs)
-        
+        api_key, limit, _ = _authenticate(include)
+
+        if api_key is not None:
+            g.current_user = api_key.user
+            g.api_key = api_key
+            return _call_view(f, limit, *args, **kwargs)
+
         # If no valid API key, continue (may have session auth)
         return f(*args, **kwargs)
-    
+
     return decorated_function
@@ -0,0 +1,105 @@
+from collections import OrderedDict, namedtuple
+from datetime import datetime
+from threading import Lock
+import time
+
+
+class CachedKey(namedtuple('CachedKey', 'key_id user_id key_active user_active expires_at')):
+    """Verification result for one API key"""
+    __slots__ = ()
+
+    @property
+    def is_expired(self):
+        """Check if key has expired (mirrors APIKey.is_expired)"""
+        return self.expires_at is not None and datetime.utcnow() > self.expires_at
+
+
+class APIKeyCache:
+    """
+    Bounded LRU/TTL cache of verified API keys (per process)
+
+    Entries are dropped explicitly when a key or its owner changes, and
+    otherwise expire after API_KEY_CACHE_TTL seconds, which bounds how long
+    other worker processes keep serving a stale entry.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # digest -> (CachedKey, stored_at)
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def init_app(self, app):
+        self.maxsize = app.config.get('API_KEY_CACHE_SIZE', self.maxsize)
+        self.ttl = app.config.get('API_KEY_CACHE_TTL', self.ttl)
+        app.extensions['api_key_cache'] = self
+
+    def get(self, digest):
+        """Return the cached state for a key digest, or None"""
+        if self.maxsize <= 0:
+            return None
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None or time.monotonic() - entry[1] > self.ttl:
+                if entry is not None:
+                    del self._entries[digest]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(digest)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, digest, api_key):
+        """Cache the state of a verified key and return it"""
+        state = CachedKey(
+            key_id=api_key.id,
+            user_id=api_key.user_id,
+            key_active=api_key.is_active,
+            user_active=api_key.user.is_active,
+            expires_at=api_key.expires_at
+        )
+        if self.maxsize <= 0:
+            return state
+        with self._lock:
+            self._entries[digest] = (state, time.monotonic())
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return state
+
+    def invalidate_key(self, key_id):
+        """Drop the entry for one API key"""
+        self._invalidate(lambda state: state.key_id == key_id)
+
+    def invalidate_user(self, user_id):
+        """Drop the entries for every key of a user"""
+        self._invalidate(lambda state: state.user_id == user_id)
+
+    def _invalidate(self, match):
+        with self._lock:
+            for digest in [d for d, (state, _) in self._entries.items() if match(state)]:
+                del self._entries[digest]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Counters for sizing the cache"""
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else None
+        }
+
+
+api_key_cache = APIKeyCache()
@@ -0,0 +1,21 @@
+import hashlib
+from flask import request, current_app, make_response
+
+
+def make_etag(*parts):
+    """Strong ETag for a representation, from the row versions it is built from"""
+    return hashlib.blake2b(repr(parts).encode(), digest_size=16).hexdigest()
+
+
+def conditional(etag, build):
+    """
+    Answer a conditional GET
+    Returns 304 Not Modified if If-None-Match has the current etag, so
+    nothing is serialized; otherwise the response of build() with the ETag.
+    """
+    if request.if_none_match.contains_weak(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = make_response(build())
+    response.set_etag(etag)
+    return response
@@ -0,0 +1,25 @@
+import base64
+import binascii
+
+
+def encode_cursor(kind, value):
+    """Opaque pagination cursor for an integer position, e.g. a last seen id"""
+    raw = f"{kind}:{value}".encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode()
+
+
+def decode_cursor(kind, cursor):
+    """
+    Integer position of a cursor made by encode_cursor, None if no cursor
+    Raises ValueError for malformed cursors or cursors of another kind.
+    """
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+    except (binascii.Error, UnicodeDecodeError):
+        raise ValueError("Malformed cursor")
+    cursor_kind, _, value = raw.partition(':')
+    if cursor_kind != kind or not value.isdigit():
+        raise ValueError("Malformed cursor")
+    return int(value)
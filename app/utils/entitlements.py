@@ -0,0 +1,161 @@
+from collections import namedtuple
+from functools import wraps
+from threading import Lock
+from flask import abort, current_app, g
+from flask_login import current_user
+from sqlalchemy import select
+from ..extensions import db
+from ..models import Plan
+from .shared_store import create_store
+
+# Features a plan can include, checked with @feature_required
+FEATURES = ('webhooks', 'batch')
+
+# What a plan allows; max_api_keys None means unlimited
+Entitlements = namedtuple('Entitlements', 'plan_id max_api_keys key_rate_limit user_rate_limit features')
+
+# Quotas checked with @quota_required: entitlement -> user counter
+QUOTAS = {
+    'max_api_keys': 'api_key_count'
+}
+
+
+class EntitlementTable:
+    """
+    Entitlements of every plan, compiled into a dict keyed by plan id
+
+    Checks are dict lookups: the table is read from the plan table once
+    and again only after a plan changed. Changes are announced through the
+    shared store, so every worker on the host recompiles on its next check.
+    Users without a plan get the defaults of the configuration
+    (API_KEYS_DEFAULT_MAX, RATELIMIT_DEFAULT_*, PLAN_DEFAULT_FEATURES),
+    which also fill in what a plan leaves empty. Plans lift the limit of
+    API keys with Plan.UNLIMITED.
+    """
+
+    GENERATION = 'entitlements:generation'
+
+    def __init__(self):
+        self.store = None
+        self.compiles = 0
+        self._table = None
+        self._generation = None
+        self._lock = Lock()
+
+    def init_app(self, app):
+        self.store = create_store(app)
+        self._table = None
+        app.extensions['entitlements'] = self
+
+    def for_plan(self, plan_id):
+        table = self._current()
+        return table.get(plan_id) or table[None]
+
+    def for_user(self, user):
+        return self.for_plan(user.plan_id)
+
+    def has_feature(self, user, feature):
+        return feature in self.for_user(user).features
+
+    def within_quota(self, user, quota, extra=1):
+        """Whether the user's counter for a quota can grow by extra"""
+        limit = getattr(self.for_user(user), quota)
+        return limit is None or getattr(user, QUOTAS[quota]) + extra <= limit
+
+    def invalidate(self):
+        """Have every worker recompile the table (call after committing plan changes)"""
+        # The time of the change, not a counter, so a store slot that was
+        # reused in between cannot bring back an old generation
+        self.store.update(self.GENERATION, lambda state, now: ((now, 0.0, 0.0), None))
+
+    def _current(self):
+        state = self.store.get(self.GENERATION)
+        generation = state[0] if state else None
+        table = self._table
+        if table is None or generation != self._generation:
+            with self._lock:
+                if self._table is None or generation != self._generation:
+                    self._table = self._compile()
+                    self._generation = generation
+                table = self._table
+        return table
+
+    def _compile(self):
+        config = current_app.config
+        default = Entitlements(
+            plan_id=None,
+            max_api_keys=config['API_KEYS_DEFAULT_MAX'],
+            key_rate_limit=config['RATELIMIT_DEFAULT_KEY'],
+            user_rate_limit=config['RATELIMIT_DEFAULT_USER'],
+            features=_parse_features(config['PLAN_DEFAULT_FEATURES'])
+        )
+        table = {None: default}
+        plans = db.session.execute(select(
+            Plan.id, Plan.max_api_keys, Plan.api_rate_limit, Plan.api_user_rate_limit, Plan.features
+        ))
+        for plan in plans:
+            if plan.max_api_keys is None:
+                max_api_keys = default.max_api_keys
+            else:
+                max_api_keys = None if plan.max_api_keys == Plan.UNLIMITED else plan.max_api_keys
+            table[plan.id] = Entitlements(
+                plan_id=plan.id,
+                max_api_keys=max_api_keys,
+                key_rate_limit=plan.api_rate_limit or default.key_rate_limit,
+                user_rate_limit=plan.api_user_rate_limit or default.user_rate_limit,
+                features=default.features if plan.features is None else _parse_features(plan.features)
+            )
+        self.compiles += 1
+        return table
+
+    def stats(self):
+        return {
+            'plans': len(self._table) - 1 if self._table else None,
+            'compiles': self.compiles
+        }
+
+
+def _parse_features(value):
+    return frozenset(name.strip() for name in value.split(',') if name.strip())
+
+
+def _request_user():
+    """The API key's owner in the api blueprint, the logged in user elsewhere"""
+    user = g.get('current_user')
+    return user if user is not None else current_user
+
+
+def feature_required(feature):
+    """
+    Decorator restricting a view to users whose plan includes a feature
+    Goes after @require_api_key / @login_required, which load the user.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if not entitlements.has_feature(_request_user(), feature):
+                abort(403, f'Your plan does not include {feature}')
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
+
+
+def quota_required(quota, denied=None):
+    """
+    Decorator running a view only while the user is below a quota of
+    their plan, e.g. @quota_required('max_api_keys'). Otherwise the
+    response of denied() is returned, or 403.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if not entitlements.within_quota(_request_user(), quota):
+                if denied is not None:
+                    return denied()
+                abort(403, 'Your plan does not allow more of these')
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
+
+
+entitlements = EntitlementTable()
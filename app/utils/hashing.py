@@ -0,0 +1,155 @@
+import os
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from werkzeug.exceptions import ServiceUnavailable
+from werkzeug.security import generate_password_hash, check_password_hash
+
+DEFAULT_METHOD = 'scrypt:32768:8:1'
+
+
+class HashingBusy(ServiceUnavailable):
+    """More password hashes are waiting than PASSWORD_HASH_QUEUE allows"""
+
+    description = 'Too many sign-ins in progress. Please try again in a moment.'
+
+
+class PasswordHasher:
+    """
+    Hashes and verifies passwords on a bounded pool of threads (per process)
+
+    hashlib releases the GIL while running scrypt/pbkdf2, so a thread pool
+    spreads the work over all cores without forking the worker or pickling
+    passwords, and the request threads waiting for it leave the interpreter
+    to the other requests. PASSWORD_HASH_WORKERS sets the pool size
+    (0 = CPU count). At most PASSWORD_HASH_QUEUE hashes wait for a free
+    thread; beyond that requests are turned away with a 503 instead of
+    piling up behind a burst of sign-ins.
+
+    New hashes use PASSWORD_HASH_METHOD (see `flask passwords calibrate`);
+    needs_rehash() tells which stored hashes use other parameters.
+    """
+
+    def __init__(self, workers=0, method=DEFAULT_METHOD, queue=16):
+        self.workers = workers
+        self.method = method
+        self.queue = queue
+        self._lock = Lock()
+        self._executor = None
+        self._executor_pid = None
+        self._method_id = None
+        self.pending = 0
+        self.hashed = 0
+        self.verified = 0
+        self.rejected = 0
+
+    def init_app(self, app):
+        self.workers = app.config.get('PASSWORD_HASH_WORKERS', self.workers)
+        self.method = app.config.get('PASSWORD_HASH_METHOD', self.method)
+        self.queue = app.config.get('PASSWORD_HASH_QUEUE', self.queue)
+        self._method_id = None
+        app.extensions['password_hasher'] = self
+
+    @property
+    def size(self):
+        return self.workers or os.cpu_count() or 1
+
+    def hash(self, password):
+        self.hashed += 1
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        self.verified += 1
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """Whether a stored hash was made with other parameters than PASSWORD_HASH_METHOD"""
+        if self._method_id is None:
+            # werkzeug fills in defaults ("scrypt" -> "scrypt:32768:8:1"):
+            # take the method as it ends up in a hash
+            self._method_id = generate_password_hash('', self.method).split('$', 1)[0]
+        return password_hash.split('$', 1)[0] != self._method_id
+
+    def hash_many(self, passwords):
+        """Hashes of the passwords, in the same order"""
+        passwords = list(passwords)
+        self.hashed += len(passwords)
+        if self.size <= 1 or len(passwords) < 2:
+            return [generate_password_hash(password, self.method) for password in passwords]
+        # Keep at most one hash per thread queued, so that sign-ins arriving
+        # meanwhile wait for one round of the batch rather than all of it
+        executor = self._get_executor()
+        futures = []
+        hashes = []
+        for password in passwords:
+            if len(futures) - len(hashes) >= self.size:
+                hashes.append(futures[len(hashes)].result())
+            futures.append(executor.submit(generate_password_hash, password, self.method))
+        hashes.extend(future.result() for future in futures[len(hashes):])
+        return hashes
+
+    def stats(self):
+        return {
+            'workers': self.size,
+            'queue': self.queue,
+            'method': self.method,
+            'pending': self.pending,
+            'hashed': self.hashed,
+            'verified': self.verified,
+            'rejected': self.rejected
+        }
+
+    def _run(self, fn, *args):
+        with self._lock:
+            if self.pending >= self.size + self.queue:
+                self.rejected += 1
+                raise HashingBusy(retry_after=1)
+            self.pending += 1
+        try:
+            return self._get_executor().submit(fn, *args).result()
+        finally:
+            with self._lock:
+                self.pending -= 1
+
+    def _get_executor(self):
+        # Pool threads do not survive a fork, so each worker creates its own
+        with self._lock:
+            if self._executor_pid != os.getpid():
+                self._executor = ThreadPoolExecutor(self.size, thread_name_prefix='password-hash')
+                self._executor_pid = os.getpid()
+            return self._executor
+
+
+def _time_method(method, rounds=3):
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        generate_password_hash('calibration', method)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def calibrate(target, algorithm='scrypt', max_memory=128 * 2**20):
+    """
+    Strongest hash method taking at most target seconds on this host, with
+    the time it takes: scrypt doubles N (r=8, p=1, at most max_memory bytes
+    per hash), pbkdf2 scales its iterations
+    """
+    if algorithm == 'pbkdf2':
+        sample = 100_000
+        iterations = int(sample * target / _time_method(f'pbkdf2:sha256:{sample}'))
+        method = f'pbkdf2:sha256:{max(iterations // 10_000, 1) * 10_000}'
+        return method, _time_method(method)
+    n = 2**14
+    best = (f'scrypt:{n}:8:1', _time_method(f'scrypt:{n}:8:1'))
+    while 128 * (n * 2) * 8 <= max_memory:
+        n *= 2
+        seconds = _time_method(f'scrypt:{n}:8:1')
+        if seconds > target:
+            break
+        best = (f'scrypt:{n}:8:1', seconds)
+    return best
+
+
+password_hasher = PasswordHasher()
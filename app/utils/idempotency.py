@@ -0,0 +1,153 @@
+import hashlib
+import json
+import time
+from datetime import datetime, timedelta
+from functools import wraps
+from flask import request, jsonify, g, current_app, make_response
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from ..extensions import db
+from ..models import IdempotencyKey
+
+table = IdempotencyKey.__table__
+
+# Response headers not saved with the response: set from the saved
+# mimetype and body, or per request (rate limits are added to replays by
+# require_api_key as of the retry)
+UNSAVED_HEADERS = {'content-type', 'content-length', 'set-cookie',
+                   'ratelimit-limit', 'ratelimit-remaining', 'ratelimit-reset', 'retry-after'}
+
+
+def _error(error, message, status):
+    response = jsonify({'error': error, 'message': message})
+    response.status_code = status
+    return response
+
+
+def _fingerprint():
+    digest = hashlib.sha256()
+    for part in (request.method.encode(), request.full_path.encode(), request.get_data()):
+        digest.update(part)
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def _claim(user_id, key, fingerprint):
+    """
+    Insert the in-flight row for a key, or return the existing one
+    Rows are written on their own connection and committed right away,
+    so other workers see them while the request is still running.
+    Returns None once the key is ours, otherwise the existing row.
+    """
+    config = current_app.config
+    now = datetime.utcnow()
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(insert(table).values(user_id=user_id, key=key, fingerprint=fingerprint, created_at=now))
+        return None
+    except IntegrityError:
+        pass
+
+    with db.engine.begin() as conn:
+        row = conn.execute(select(table).where(table.c.user_id == user_id, table.c.key == key)).first()
+        if row is None:
+            # Released in the meantime
+            return _claim(user_id, key, fingerprint)
+
+        # Take over expired responses and requests abandoned by a crashed worker
+        expired = row.created_at < now - timedelta(hours=config['IDEMPOTENCY_TTL'])
+        abandoned = row.status_code is None and row.created_at < now - timedelta(seconds=config['IDEMPOTENCY_LOCK_TIMEOUT'])
+        if expired or abandoned:
+            taken = conn.execute(
+                update(table)
+                .where(table.c.user_id == user_id, table.c.key == key, table.c.created_at == row.created_at)
+                .values(fingerprint=fingerprint, status_code=None, mimetype=None, body=None, headers=None, created_at=now)
+            ).rowcount
+            if taken:
+                return None
+        return row
+
+
+def _release(user_id, key):
+    with db.engine.begin() as conn:
+        conn.execute(delete(table).where(table.c.user_id == user_id, table.c.key == key))
+
+
+def _save(user_id, key, response):
+    with db.engine.begin() as conn:
+        conn.execute(
+            update(table)
+            .where(table.c.user_id == user_id, table.c.key == key)
+            .values(status_code=response.status_code, mimetype=response.mimetype, body=response.get_data(),
+                    headers=json.dumps([
+                        [name, value] for name, value in response.headers.items()
+                        if name.lower() not in UNSAVED_HEADERS
+                    ]))
+        )
+
+
+def _replay(row):
+    response = current_app.response_class(row.body, status=row.status_code, mimetype=row.mimetype)
+    for name, value in json.loads(row.headers or '[]'):
+        response.headers.add(name, value)
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(f):
+    """
+    Decorator making a mutating API endpoint safe to retry
+    Must come after @require_api_key.
+
+    A request with an Idempotency-Key header runs once per user and key:
+    its response (status, body and headers) is saved and replayed to
+    retries for IDEMPOTENCY_TTL hours. A retry arriving while the first request still runs waits up to
+    IDEMPOTENCY_WAIT seconds for its response instead of running again.
+    Server errors are not saved, so the request can be retried.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        key = request.headers.get('Idempotency-Key')
+        if key is None:
+            return f(*args, **kwargs)
+        if not key or len(key) > 255:
+            return _error('Invalid Idempotency-Key', 'Use a unique string of at most 255 characters', 400)
+
+        user_id = g.current_user.id
+        fingerprint = _fingerprint()
+        deadline = time.monotonic() + current_app.config['IDEMPOTENCY_WAIT']
+        delay = 0.05
+        while True:
+            row = _claim(user_id, key, fingerprint)
+            if row is None:
+                break
+            if row.fingerprint != fingerprint:
+                return _error('Idempotency-Key reused', 'This key was used for a different request', 422)
+            if row.status_code is not None:
+                return _replay(row)
+            # A concurrent request with this key is running: wait for its response
+            if time.monotonic() >= deadline:
+                return _error('Request in progress', 'A request with this Idempotency-Key is still running', 409)
+            time.sleep(delay)
+            delay = min(delay * 1.5, 0.5)
+
+        try:
+            response = make_response(f(*args, **kwargs))
+        except Exception:
+            _release(user_id, key)
+            raise
+        if response.status_code >= 500:
+            _release(user_id, key)
+        else:
+            _save(user_id, key, response)
+        return response
+
+    return decorated_function
+
+
+def prune_idempotency_keys():
+    """Delete saved responses older than IDEMPOTENCY_TTL; returns the number deleted"""
+    cutoff = datetime.utcnow() - timedelta(hours=current_app.config['IDEMPOTENCY_TTL'])
+    result = db.session.execute(delete(IdempotencyKey).where(IdempotencyKey.created_at < cutoff))
+    db.session.commit()
+    return result.rowcount
@@ -0,0 +1,154 @@
+import time
+from flask import abort, current_app, g, session
+from flask_login import logout_user, user_logged_in, user_logged_out
+from sqlalchemy import inspect
+from ..extensions import db
+from ..models import User
+from .shared_store import create_store
+
+# User attributes kept in the session, in snapshot order after them:
+# the user's security_version and when the snapshot was taken
+SNAPSHOT_FIELDS = ('id', 'role', 'language', 'email', 'is_active')
+SESSION_KEY = '_principal'
+
+
+class SessionPrincipal:
+    """
+    current_user of page views, served from the snapshot in the session
+
+    Reads of the snapshot fields need no query. Anything else (plan, API
+    keys, set_password...) and every assignment load the User on first
+    use, after which all reads and writes go to it. If the user has been
+    deleted or disabled meanwhile, the session is logged out and the
+    request redirected to the login page.
+    """
+
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, snapshot):
+        object.__setattr__(self, '_snapshot', snapshot)
+        object.__setattr__(self, '_user', None)
+
+    @property
+    def user(self):
+        """The User row, loaded on first use"""
+        if self._user is None:
+            user = db.session.get(User, self._snapshot[0])
+            if user is None or not user.is_active:
+                # Deleted or disabled without the invalidation reaching us
+                logout_user()
+                abort(current_app.login_manager.unauthorized())
+            object.__setattr__(self, '_user', user)
+        return self._user
+
+    @property
+    def security_version(self):
+        return self._user.security_version if self._user is not None else self._snapshot[len(SNAPSHOT_FIELDS)]
+
+    def get_id(self):
+        return str(self.id)
+
+    def __getattr__(self, name):
+        if self._user is None and name in SNAPSHOT_FIELDS:
+            return self._snapshot[SNAPSHOT_FIELDS.index(name)]
+        return getattr(self.user, name)
+
+    def __setattr__(self, name, value):
+        setattr(self.user, name, value)
+
+    def __repr__(self):
+        return f'<SessionPrincipal {self.id}>'
+
+
+class PrincipalManager:
+    """
+    Flask-Login user loading from a signed snapshot in the session
+
+    The snapshot is taken at login and whenever a request loaded and
+    changed its user. It is reloaded from the database when the user's
+    security_version, published in the shared store by invalidate(),
+    differs from the snapshot's, and at the latest SESSION_PRINCIPAL_MAX_AGE
+    seconds after it was taken (workers on other hosts, store evictions).
+    Disabled and deleted users are logged out on reload.
+    """
+
+    def __init__(self, max_age=300):
+        self.max_age = max_age
+        self.store = None
+        self.loads = 0
+        self.reloads = 0
+
+    def init_app(self, app, login_manager):
+        self.max_age = app.config.get('SESSION_PRINCIPAL_MAX_AGE', self.max_age)
+        self.store = create_store(app)
+        login_manager.user_loader(self.load)
+        user_logged_in.connect(self._logged_in, app)
+        user_logged_out.connect(self._logged_out, app)
+        app.after_request(self._save)
+        app.extensions['principals'] = self
+
+    def load(self, user_id):
+        """Flask-Login user_loader"""
+        user_id = int(user_id)
+        self.loads += 1
+        snapshot = session.get(SESSION_KEY)
+        if snapshot and snapshot[0] == user_id and self._current(snapshot):
+            principal = SessionPrincipal(snapshot)
+        else:
+            self.reloads += 1
+            user = db.session.get(User, user_id)
+            if user is None or not user.is_active:
+                session.pop(SESSION_KEY, None)
+                return None
+            principal = SessionPrincipal(_snapshot(user))
+            object.__setattr__(principal, '_user', user)
+            session[SESSION_KEY] = principal._snapshot
+        g._principal = principal
+        return principal
+
+    def invalidate(self, user_id, security_version=None):
+        """
+        Announce that a user changed (security_version after the commit)
+        or was deleted (no version); their sessions reload on the next request
+        """
+        version = -1.0 if security_version is None else float(security_version)
+        self.store.update(f'principal:{user_id}', lambda state, now: ((version, 0.0, 0.0), None))
+
+    def _current(self, snapshot):
+        version, taken_at = snapshot[len(SNAPSHOT_FIELDS):]
+        if time.time() - taken_at > self.max_age:
+            return False
+        state = self.store.get(f'principal:{snapshot[0]}')
+        return state is None or state[0] == version
+
+    def _save(self, response):
+        # Keep the snapshot in step with changes the request made to its own user
+        principal = g.get('_principal')
+        if principal is not None and principal._user is not None and SESSION_KEY in session:
+            # Refreshes the user if the request committed; deleted users are detached
+            if inspect(principal._user).persistent:
+                snapshot = _snapshot(principal._user, session[SESSION_KEY][-1])
+                if snapshot != session[SESSION_KEY]:
+                    session[SESSION_KEY] = snapshot
+        return response
+
+    def _logged_in(self, app, user):
+        session[SESSION_KEY] = _snapshot(user)
+
+    def _logged_out(self, app, user):
+        session.pop(SESSION_KEY, None)
+
+    def stats(self):
+        return {
+            'loads': self.loads,
+            'reloads': self.reloads,
+            'max_age': self.max_age
+        }
+
+
+def _snapshot(user, taken_at=None):
+    return [*(getattr(user, name) for name in SNAPSHOT_FIELDS), user.security_version, taken_at or time.time()]
+
+
+principals = PrincipalManager()
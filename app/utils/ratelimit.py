@@ -0,0 +1,94 @@
+import math
+from collections import namedtuple
+from .entitlements import entitlements
+from .shared_store import create_store
+
+# Outcome of one rate limit check; reset and retry_after are in seconds
+RateLimit = namedtuple('RateLimit', 'allowed limit remaining reset retry_after')
+
+
+class RateLimiter:
+    """
+    Token buckets per API key and per user, shared by the workers on a host
+
+    Bucket sizes are the rate limits of the caller's plan in the
+    entitlement table (requests per minute, refilled continuously); users
+    without a plan or plans without limits use RATELIMIT_DEFAULT_KEY /
+    RATELIMIT_DEFAULT_USER.
+    """
+
+    PERIOD = 60  # seconds
+
+    def __init__(self):
+        self.enabled = True
+        self.store = None
+        self.checked = 0
+        self.limited = 0
+
+    def init_app(self, app):
+        self.enabled = app.config.get('RATELIMIT_ENABLED', True)
+        self.store = create_store(app)
+        app.extensions['rate_limiter'] = self
+
+    def hit(self, bucket, limit, cost=1):
+        """Take cost tokens from a bucket holding limit tokens per PERIOD"""
+        rate = limit / self.PERIOD
+
+        def take(state, now):
+            tokens = limit if state is None else min(limit, state[0] + (now - state[1]) * rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            result = RateLimit(
+                allowed=allowed,
+                limit=limit,
+                remaining=int(tokens),
+                reset=math.ceil((limit - tokens) / rate),
+                retry_after=0 if allowed else math.ceil((cost - tokens) / rate)
+            )
+            return (tokens, now, 0.0), result
+
+        return self.store.update(bucket, take)
+
+    def check(self, key_id, user_id, plan_id, cost=1):
+        """Charge a request to the key and user buckets; None when disabled"""
+        if not self.enabled:
+            return None
+        plan = entitlements.for_plan(plan_id)
+        key_limit, user_limit = plan.key_rate_limit, plan.user_rate_limit
+        self.checked += 1
+        result = self.hit(f'ratelimit:key:{key_id}', key_limit, cost)
+        if result.allowed:
+            user_result = self.hit(f'ratelimit:user:{user_id}', user_limit, cost)
+            if not user_result.allowed:
+                # The request is rejected: give the key its tokens back
+                self.hit(f'ratelimit:key:{key_id}', key_limit, -cost)
+            # Report whichever bucket is closer to running out
+            if not user_result.allowed or user_result.remaining < result.remaining:
+                result = user_result
+        if not result.allowed:
+            self.limited += 1
+        return result
+
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'backend': type(self.store).__name__,
+            'checked': self.checked,
+            'limited': self.limited
+        }
+
+
+def rate_limit_headers(result):
+    """RateLimit-* headers (IETF draft) plus Retry-After when limited"""
+    headers = {
+        'RateLimit-Limit': str(result.limit),
+        'RateLimit-Remaining': str(result.remaining),
+        'RateLimit-Reset': str(result.reset)
+    }
+    if not result.allowed:
+        headers['Retry-After'] = str(result.retry_after)
+    return headers
+
+
+rate_limiter = RateLimiter()
@@ -1,10 +1,22 @@
+import hashlib
+import time
+from datetime import datetime, timedelta, timezone
 from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
 from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from ..extensions import db
+from ..models import ConsumedToken
+from .shared_store import create_store
 
 def _serializer():
+    # One serializer per app, secret and salt instead of one per call
     secret = current_app.config["SECRET_KEY"]
     salt = current_app.config.get("SECURITY_TOKEN_SALT", "change-me")
-    return URLSafeTimedSerializer(secret_key=secret, salt=salt)
+    serializers = current_app.extensions.setdefault("token_serializers", {})
+    serializer = serializers.get((secret, salt))
+    if serializer is None:
+        serializer = serializers[secret, salt] = URLSafeTimedSerializer(secret_key=secret, salt=salt)
+    return serializer
 
 def generate_token(data: dict) -> str:
     return _serializer().dumps(data)
@@ -17,3 +29,96 @@ def verify_token(token: str, max_age: int = 3600):
         return False, "expired"
     except BadSignature:
         return False, "invalid"
+
+
+class ConsumedTokens:
+    """
+    Single use of confirmation and reset tokens
+
+    A used token is recorded in the consumed_token table until it expires,
+    and in the shared store, which answers replays on this host without a
+    query. Tokens missing from the store (used through another host,
+    evicted) are looked up by primary key. Expired rows are purged by the
+    first token use after TOKEN_PURGE_INTERVAL seconds in each worker.
+    """
+
+    def __init__(self, purge_interval=3600):
+        self.purge_interval = purge_interval
+        self.store = None
+        self._purged_at = 0.0
+        self.consumed = 0
+        self.replays = 0
+        self.store_hits = 0
+        self.purged = 0
+
+    def init_app(self, app):
+        self.purge_interval = app.config.get("TOKEN_PURGE_INTERVAL", self.purge_interval)
+        self.store = create_store(app)
+        app.extensions["consumed_tokens"] = self
+
+    def is_consumed(self, token):
+        """Whether the token has been used (check before loading anything for it)"""
+        digest = _digest(token)
+        state = self.store.get(f"token:{digest}")
+        if state is not None and state[0] > time.time():
+            self.store_hits += 1
+            self.replays += 1
+            return True
+        row = db.session.get(ConsumedToken, digest)
+        if row is None or row.expires_at <= datetime.utcnow():
+            return False
+        self._remember(digest, row.expires_at.replace(tzinfo=timezone.utc).timestamp())
+        self.replays += 1
+        return True
+
+    def consume(self, token, purpose, max_age):
+        """
+        Record the use of a token valid for max_age seconds; False if it was
+        used already. The row is flushed, the caller commits it along with
+        the changes the token allowed and then calls remember().
+        """
+        if time.time() - self._purged_at > self.purge_interval:
+            self.purge()
+        digest = _digest(token)
+        db.session.add(ConsumedToken(digest=digest, purpose=purpose, expires_at=datetime.utcnow() + timedelta(seconds=max_age)))
+        try:
+            db.session.flush()
+        except IntegrityError:
+            # Used by a concurrent request
+            db.session.rollback()
+            self.replays += 1
+            return False
+        return True
+
+    def remember(self, token, max_age):
+        """
+        Answer replays of a consumed token from the shared store; only once
+        its row is committed, so that a failed request leaves it usable
+        """
+        self.consumed += 1
+        self._remember(_digest(token), time.time() + max_age)
+
+    def purge(self):
+        """Delete the records of expired tokens; returns how many"""
+        self._purged_at = time.time()
+        deleted = ConsumedToken.purge(datetime.utcnow())
+        self.purged += deleted
+        return deleted
+
+    def stats(self):
+        return {
+            "consumed": self.consumed,
+            "replays": self.replays,
+            "store_hits": self.store_hits,
+            "purged": self.purged
+        }
+
+    def _remember(self, digest, expires_at):
+        self.store.update(f"token:{digest}", lambda state, now: ((expires_at, 0.0, 0.0), None))
+
+
+def _digest(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+consumed_tokens = ConsumedTokens()
@@ -0,0 +1,157 @@
+import hashlib
+import mmap
+import os
+import struct
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from threading import Lock
+
+try:
+    import fcntl
+except ImportError:  # Windows: only the in-process store is available
+    fcntl = None
+
+# Slot layout: key fingerprint, last update time, three values
+SLOT = struct.Struct('<Qdddd')
+SLOT_HEAD = struct.Struct('<Qd')
+PROBES = 8
+
+
+@lru_cache(maxsize=65536)
+def _fingerprint(key):
+    fingerprint = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'little')
+    return fingerprint or 1  # 0 marks an empty slot
+
+
+class MemoryStore:
+    """In-process store with the same interface as MmapStore (single worker, tests)"""
+
+    def __init__(self, slots=65536):
+        self.slots = slots
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def update(self, key, fn, now=None):
+        """
+        Atomically read-modify-write the state of a key
+        fn(state, now) receives a tuple of three floats (or None for a new
+        key) and returns (new state, result); update() returns the result.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            state, result = fn(self._entries.get(key), now)
+            self._entries[key] = state
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.slots:
+                self._entries.popitem(last=False)
+        return result
+
+    def get(self, key):
+        with self._lock:
+            return self._entries.get(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class MmapStore:
+    """
+    Fixed-size hash table in a memory-mapped file, shared by all worker
+    processes on a host. Each slot holds a key fingerprint and three floats;
+    updates are serialized with an flock on the file. When all probed slots
+    are taken, the least recently updated one is reused.
+    """
+
+    def __init__(self, path, slots=65536):
+        self.path = path
+        self.slots = slots
+        self._lock = Lock()
+        self._pid = None
+        self._file = None
+        self._map = None
+
+    def _open(self):
+        # flock is per open file description, so each process opens its own
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        size = self.slots * SLOT.size
+        handle = open(self.path, 'a+b')
+        if os.fstat(handle.fileno()).st_size < size:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                handle.truncate(size)
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+        self._file = handle
+        self._map = mmap.mmap(handle.fileno(), size)
+        self._pid = os.getpid()
+
+    def _find(self, fingerprint):
+        """Offset of the slot for a fingerprint (existing, empty or oldest)"""
+        buf = self._map
+        start = fingerprint % self.slots
+        victim, victim_time = None, None
+        for probe in range(PROBES):
+            offset = ((start + probe) % self.slots) * SLOT.size
+            slot_fingerprint, updated = SLOT_HEAD.unpack_from(buf, offset)
+            if slot_fingerprint == fingerprint:
+                return offset, True
+            if slot_fingerprint == 0:
+                return offset, False
+            if victim is None or updated < victim_time:
+                victim, victim_time = offset, updated
+        return victim, False
+
+    def update(self, key, fn, now=None):
+        """Atomically read-modify-write the state of a key (see MemoryStore.update)"""
+        now = time.time() if now is None else now
+        fingerprint = _fingerprint(key)
+        with self._lock:
+            if self._pid != os.getpid():
+                self._open()
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+            try:
+                offset, found = self._find(fingerprint)
+                state = SLOT.unpack_from(self._map, offset)[2:] if found else None
+                state, result = fn(state, now)
+                SLOT.pack_into(self._map, offset, fingerprint, now, *state)
+            finally:
+                fcntl.flock(self._file, fcntl.LOCK_UN)
+        return result
+
+    def get(self, key):
+        fingerprint = _fingerprint(key)
+        with self._lock:
+            if self._pid != os.getpid():
+                self._open()
+            offset, found = self._find(fingerprint)
+            return SLOT.unpack_from(self._map, offset)[2:] if found else None
+
+    def clear(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._open()
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+            try:
+                self._map[:] = bytes(len(self._map))
+            finally:
+                fcntl.flock(self._file, fcntl.LOCK_UN)
+
+
+def create_store(app):
+    """
+    The app's store for state shared between workers, configured by
+    SHARED_STATE_PATH: a file path, or ':memory:' for a per-process store.
+    Defaults to a file in the instance folder.
+    """
+    if 'shared_store' not in app.extensions:
+        path = app.config.get('SHARED_STATE_PATH') or os.path.join(app.instance_path, 'shared_state.bin')
+        slots = app.config.get('SHARED_STATE_SLOTS', 65536)
+        if path == ':memory:' or fcntl is None:
+            app.extensions['shared_store'] = MemoryStore(slots)
+        else:
+            app.extensions['shared_store'] = MmapStore(path, slots)
+    return app.extensions['shared_store']
@@ -0,0 +1,226 @@
+import hashlib
+import hmac
+import time
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
+from ..extensions import db
+from ..models import Plan, StripeEvent, User, WebhookEvent
+from ..models.webhook import PLAN_CHANGED, user_event_data
+
+CHECKOUT_COMPLETED = 'checkout.session.completed'
+SUBSCRIPTION_EVENTS = {
+    'customer.subscription.created',
+    'customer.subscription.updated',
+    'customer.subscription.deleted',
+}
+
+# Subscription statuses in which the user keeps the subscribed plan
+ENTITLED_STATUSES = {'active', 'trialing', 'past_due'}
+
+# Error of events waiting for their customer to be linked to a user
+UNKNOWN_CUSTOMER = 'Unknown customer'
+
+
+class SignatureError(ValueError):
+    pass
+
+
+def sign(payload, secret, timestamp=None):
+    """Stripe-Signature header for a payload (for fixtures and local senders)"""
+    timestamp = int(time.time()) if timestamp is None else timestamp
+    mac = hmac.new(secret.encode(), b'%d.' % timestamp + payload, hashlib.sha256).hexdigest()
+    return f't={timestamp},v1={mac}'
+
+
+def verify_signature(payload, header, secret, tolerance=300):
+    """
+    Check a Stripe-Signature header (t=<timestamp>,v1=<signature>,...)
+    against the raw request body; raises SignatureError
+    Several v1 signatures are sent while a secret is being rolled.
+    """
+    timestamp, signatures = None, []
+    for item in header.split(','):
+        name, _, value = item.strip().partition('=')
+        if name == 't':
+            timestamp = value
+        elif name == 'v1':
+            signatures.append(value)
+    if not timestamp or not timestamp.isdigit() or not signatures:
+        raise SignatureError('Malformed Stripe-Signature header')
+
+    expected = hmac.new(secret.encode(), timestamp.encode() + b'.' + payload, hashlib.sha256).hexdigest()
+    if not any(hmac.compare_digest(expected, signature) for signature in signatures):
+        raise SignatureError('No valid signature found')
+    if tolerance and abs(time.time() - int(timestamp)) > tolerance:
+        raise SignatureError('Timestamp outside the tolerance zone')
+
+
+def receive(payload, header):
+    """
+    Verify and store a webhook request body
+    Returns False for an event that was already received. Raises
+    SignatureError, or ValueError for a body that is not a Stripe event.
+    """
+    config = current_app.config
+    verify_signature(payload, header, config['STRIPE_WEBHOOK_SECRET'], config['STRIPE_WEBHOOK_TOLERANCE'])
+    try:
+        event = current_app.json.loads(payload)
+        event_id, event_type = event['id'], event['type']
+        created = datetime.utcfromtimestamp(event['created'])
+        customer = event['data']['object'].get('customer')
+    except (KeyError, TypeError, AttributeError, OverflowError) as e:
+        raise ValueError('Not a Stripe event') from e
+
+    try:
+        db.session.execute(insert(StripeEvent).values(
+            event_id=event_id, type=event_type, payload=payload,
+            customer=customer if isinstance(customer, str) else None, created=created, received_at=datetime.utcnow()
+        ))
+        db.session.commit()
+    except IntegrityError:
+        # Stripe redelivers events until they are acknowledged
+        db.session.rollback()
+        return False
+    return True
+
+
+def process_events(batch_size=500):
+    """
+    Apply one batch of pending events to users; returns the number of
+    events processed
+
+    Events are applied in the order Stripe created them, with the users,
+    plans and event updates of the whole batch read and written at once.
+    A user's subscription is found by Stripe customer id; customers are
+    linked to users by checkout.session.completed (client_reference_id)
+    or by a user_id in the subscription's metadata. Stripe does not keep
+    events in order, so events of a customer that is not linked yet are
+    parked and applied again with the checkout that links it. Subscription
+    events older than the last one applied to the user are skipped.
+    """
+    columns = (StripeEvent.id, StripeEvent.type, StripeEvent.customer, StripeEvent.payload, StripeEvent.created)
+    rows = db.session.execute(
+        select(*columns)
+        .where(StripeEvent.processed_at.is_(None))
+        .order_by(StripeEvent.created, StripeEvent.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    ).all()
+    if not rows:
+        db.session.commit()
+        return 0
+    processed = len(rows)
+
+    # Parked events of the customers this batch links
+    linking = {row.customer for row in rows if row.type == CHECKOUT_COMPLETED and row.customer}
+    if linking:
+        rows += db.session.execute(
+            select(*columns)
+            .where(StripeEvent.customer.in_(linking), StripeEvent.error == UNKNOWN_CUSTOMER)
+        ).all()
+        rows.sort(key=lambda row: (row.created, row.id))
+
+    errors = {}
+    events = []  # (row, event object) of the events to apply
+    for row in rows:
+        if row.type != CHECKOUT_COMPLETED and row.type not in SUBSCRIPTION_EVENTS:
+            continue
+        try:
+            events.append((row, current_app.json.loads(row.payload)['data']['object']))
+        except (ValueError, KeyError, TypeError):
+            errors[row.id] = 'Malformed event payload'
+
+    # Everything the batch refers to, one query per table
+    customers, user_ids, prices = set(), set(), set()
+    for row, obj in events:
+        customers.add(obj.get('customer'))
+        user_ids.add(_user_id(obj.get('client_reference_id') if row.type == CHECKOUT_COMPLETED
+                              else (obj.get('metadata') or {}).get('user_id')))
+        if row.type in SUBSCRIPTION_EVENTS:
+            prices.add(_price_id(obj))
+    customers.discard(None)
+    user_ids.discard(None)
+    prices.discard(None)
+
+    users = db.session.scalars(
+        select(User).options(joinedload(User.plan)).where(or_(User.stripe_customer_id.in_(customers), User.id.in_(user_ids)))
+    ).all() if customers or user_ids else []
+    users_by_id = {user.id: user for user in users}
+    users_by_customer = {user.stripe_customer_id: user for user in users if user.stripe_customer_id}
+    plans = {
+        plan.stripe_price_id: plan
+        for plan in db.session.scalars(select(Plan).where(Plan.stripe_price_id.in_(prices)))
+    } if prices else {}
+
+    previous_plans = {}  # user id -> plan name before the batch
+    # Link customers first: checkout events may arrive after the
+    # subscription events they belong to
+    for row, obj in sorted(events, key=lambda event: event[0].type != CHECKOUT_COMPLETED):
+        customer = obj.get('customer')
+        if row.type == CHECKOUT_COMPLETED:
+            user = users_by_id.get(_user_id(obj.get('client_reference_id')))
+            if user is None or not customer:
+                errors[row.id] = 'Unknown user'
+                continue
+            user.stripe_customer_id = customer
+            if obj.get('subscription'):
+                user.stripe_subscription_id = obj['subscription']
+            users_by_customer[customer] = user
+            continue
+
+        user = users_by_customer.get(customer)
+        if user is None:
+            user = users_by_id.get(_user_id((obj.get('metadata') or {}).get('user_id')))
+            if user is None or not customer:
+                errors[row.id] = UNKNOWN_CUSTOMER
+                continue
+            user.stripe_customer_id = customer
+            users_by_customer[customer] = user
+        if user.subscription_updated_at and row.created < user.subscription_updated_at:
+            continue  # superseded by a newer event
+
+        status = 'canceled' if row.type == 'customer.subscription.deleted' else obj.get('status')
+        plan = None
+        if status in ENTITLED_STATUSES:
+            plan = plans.get(_price_id(obj))
+            if plan is None:
+                errors[row.id] = 'Unknown price'
+                continue
+        user.stripe_subscription_id = obj.get('id')
+        user.subscription_status = status
+        user.subscription_updated_at = row.created
+        if user.plan is not plan:
+            previous_plans.setdefault(user.id, user.plan_name)
+            user.plan = plan
+            user.plan_subscribed_at = row.created if plan else None
+
+    WebhookEvent.emit_many(PLAN_CHANGED, (
+        (user_id, user_event_data(users_by_id[user_id], previous_plan=previous))
+        for user_id, previous in previous_plans.items()
+        if users_by_id[user_id].plan_name != previous
+    ))
+
+    now = datetime.utcnow()
+    db.session.execute(update(StripeEvent), [
+        {'id': row.id, 'processed_at': now, 'error': errors.get(row.id)}
+        for row in rows
+    ])
+    db.session.commit()
+    return processed
+
+
+def _user_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _price_id(subscription):
+    items = (subscription.get('items') or {}).get('data') or []
+    if items:
+        return (items[0].get('price') or {}).get('id')
+    return (subscription.get('plan') or {}).get('id')
@@ -0,0 +1,160 @@
+import math
+import time
+from collections import namedtuple
+from .shared_store import create_store
+
+# A limit of requests per window (seconds)
+Rule = namedtuple('Rule', 'limit window')
+
+# Throttled endpoints and the config keys of their rules, per client IP
+# and per email address
+RULES = {
+    'login': ('THROTTLE_LOGIN_IP', 'THROTTLE_LOGIN_EMAIL'),
+    'forgot': ('THROTTLE_FORGOT_IP', 'THROTTLE_FORGOT_EMAIL'),
+    'resend': ('THROTTLE_RESEND_IP', 'THROTTLE_RESEND_EMAIL'),
+}
+SCOPES = ('ip', 'email')
+
+
+def parse_rule(value):
+    """Rule from "requests/seconds", e.g. "10/900"""
+    limit, window = value.split('/')
+    return Rule(int(limit), int(window))
+
+
+def _slide(state, now, window):
+    """Window start, previous and current window counts as of now"""
+    start = now - now % window
+    if state is None or start - state[0] >= 2 * window:
+        return start, 0.0, 0.0
+    if start - state[0] >= window:
+        return start, state[2], 0.0
+    return state
+
+
+def _estimate(start, previous, current, now, window):
+    # Sliding window: the previous window counts for the part still covered
+    return previous * (1 - (now - start) / window) + current
+
+
+def _retry_after(start, previous, current, now, limit, window):
+    if current < limit and previous:
+        # When the previous window's share has dropped below the headroom
+        until = start + window * (1 - (limit - current) / previous)
+    else:
+        until = start + window
+    return max(1, math.ceil(until - now))
+
+
+class Throttle:
+    """
+    Sliding-window throttles of the credential endpoints, shared by the
+    workers on a host
+
+    Each endpoint has a rule per client IP and per email address
+    (THROTTLE_* settings). Views call attempt() before any password
+    hashing, token or mail work, which counts every attempt for the IP and
+    every reset or confirmation request for the email, and hit() for
+    failed sign-ins, which count for the email. Counts are kept per window
+    in the shared store and the previous window is weighted by how much of
+    it the sliding window still covers.
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.store = None
+        self.rules = {}
+        self.checked = {}
+        self.throttled = {}
+
+    def init_app(self, app):
+        self.enabled = app.config.get('THROTTLE_ENABLED', True)
+        self.store = create_store(app)
+        self.rules = {
+            (name, scope): parse_rule(app.config[key])
+            for name, keys in RULES.items()
+            for scope, key in zip(SCOPES, keys)
+        }
+        self.checked = dict.fromkeys(RULES, 0)
+        self.throttled = {f'{name}:{scope}': 0 for name, scope in self.rules}
+        app.extensions['throttle'] = self
+
+    def attempt(self, name, ip=None, email=None, count=SCOPES):
+        """
+        Seconds until an attempt would be allowed, or 0 if it is. The rules
+        of the scopes in count are checked and counted in one store update
+        each, so that a burst of concurrent attempts cannot all pass before
+        any is counted; the others are only checked.
+        """
+        if not self.enabled:
+            return 0
+        self.checked[name] += 1
+        counted = []
+        for scope, value in zip(SCOPES, (ip, email)):
+            if not value:
+                continue
+            limit, window = self.rules[name, scope]
+            increment = 1 if scope in count else 0
+
+            def take(state, now):
+                start, previous, current = _slide(state, now, window)
+                if _estimate(start, previous, current, now, window) < limit:
+                    return (start, previous, current + increment), 0
+                return (start, previous, current), _retry_after(start, previous, current, now, limit, window)
+
+            retry_after = self.store.update(self._key(name, scope, value), take)
+            if retry_after:
+                self.throttled[f'{name}:{scope}'] += 1
+                # Only attempts that get through count
+                for scope, value in counted:
+                    self._add(name, scope, value, -1)
+                return retry_after
+            if increment:
+                counted.append((scope, value))
+        return 0
+
+    def hit(self, name, ip=None, email=None):
+        """Count an attempt against the rules of the given IP and/or email"""
+        if not self.enabled:
+            return
+        for scope, value in zip(SCOPES, (ip, email)):
+            if value:
+                self._add(name, scope, value, 1)
+
+    def state(self, name, scope, value):
+        """Current count and limit of one rule and subject"""
+        limit, window = self.rules[name, scope]
+        state = self.store.get(self._key(name, scope, value))
+        if state is None:
+            return 0.0, limit
+        now = time.time()
+        return _estimate(*_slide(state, now, window), now, window), limit
+
+    def reset(self, name, scope, value):
+        """Forget the attempts of a subject (e.g. to unlock an account)"""
+        self.store.update(self._key(name, scope, value), lambda state, now: ((0.0, 0.0, 0.0), None))
+
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'backend': type(self.store).__name__,
+            'rules': {f'{name}:{scope}': f'{rule.limit}/{rule.window}' for (name, scope), rule in self.rules.items()},
+            'checked': self.checked,
+            'throttled': self.throttled
+        }
+
+    def _add(self, name, scope, value, delta):
+        window = self.rules[name, scope].window
+
+        def add(state, now):
+            start, previous, current = _slide(state, now, window)
+            return (start, previous, max(current + delta, 0.0)), None
+
+        self.store.update(self._key(name, scope, value), add)
+
+    @staticmethod
+    def _key(name, scope, value):
+        return f'throttle:{name}:{scope}:{value}'
+
+
+throttle = Throttle()
@@ -0,0 +1,194 @@
+import atexit
+import logging
+import os
+import time
+from datetime import datetime
+from threading import Lock, Thread
+from sqlalchemy import bindparam, delete, select, tuple_, update
+from ..extensions import db
+from ..models import APIKey, APIKeyUsage
+from ..models.api_usage import MINUTE, HOUR, DAY
+
+logger = logging.getLogger(__name__)
+
+
+class UsageRecorder:
+    """
+    Write-behind buffer for API key usage (per process)
+
+    Requests only record into memory; a background thread writes the
+    buffered last_used_at values as one bulk UPDATE, and the per-endpoint
+    request counts as minute buckets, every API_KEY_USAGE_FLUSH_INTERVAL
+    seconds and once more at shutdown. An interval of 0 writes
+    synchronously on every request.
+
+    Once an hour the flush also downsamples old buckets: minute buckets
+    older than API_USAGE_MINUTE_RETENTION hours become hour buckets, and
+    hour buckets older than API_USAGE_HOUR_RETENTION days become day buckets.
+    """
+
+    def __init__(self, interval=30, minute_retention=48, hour_retention=90):
+        self.interval = interval
+        self.minute_retention = minute_retention  # hours
+        self.hour_retention = hour_retention  # days
+        self._app = None
+        self._lock = Lock()
+        self._pending = {}  # api key id -> last used datetime
+        self._counts = {}  # (api key id, endpoint, minute bucket) -> requests
+        self._thread_pid = None
+        self._downsampled_at = None  # monotonic time of the last downsampling
+
+    def init_app(self, app):
+        self.interval = app.config.get('API_KEY_USAGE_FLUSH_INTERVAL', self.interval)
+        self.minute_retention = app.config.get('API_USAGE_MINUTE_RETENTION', self.minute_retention)
+        self.hour_retention = app.config.get('API_USAGE_HOUR_RETENTION', self.hour_retention)
+        if self._app is None:
+            atexit.register(self.flush)
+        self._app = app
+        app.extensions['usage_recorder'] = self
+
+    def record(self, key_id, endpoint=None):
+        """Note that an API key was used just now, optionally for an endpoint"""
+        with self._lock:
+            self._pending[key_id] = datetime.utcnow()
+            if endpoint:
+                counter = (key_id, endpoint[:64], APIKeyUsage.bucket(time.time()))
+                self._counts[counter] = self._counts.get(counter, 0) + 1
+        if self.interval <= 0:
+            self.flush()
+        else:
+            self._ensure_flusher()
+
+    def discard(self, key_id):
+        """Forget buffered usage, e.g. after the key was regenerated"""
+        with self._lock:
+            self._pending.pop(key_id, None)
+
+    def last_used_at(self, api_key):
+        """Last use of a key, including usage not yet flushed by this process"""
+        with self._lock:
+            pending = self._pending.get(api_key.id)
+        return pending or api_key.last_used_at
+
+    def flush(self):
+        """Write buffered usage to the database; returns the number of keys"""
+        with self._lock:
+            used, self._pending = self._pending, {}
+            counts, self._counts = self._counts, {}
+        if not used or self._app is None:
+            return 0
+
+        # A fresh app context gets its own session, apart from any request
+        with self._app.app_context():
+            try:
+                self._write_last_used(used)
+                self._write_counts(counts)
+                if self._downsampled_at is None or time.monotonic() - self._downsampled_at >= HOUR:
+                    self._downsample()
+                    self._downsampled_at = time.monotonic()
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                logger.exception("Failed to flush API key usage for %d keys", len(used))
+                return 0
+        return len(used)
+
+    def _write_last_used(self, used):
+        table = APIKey.__table__
+        stmt = (
+            update(table)
+            .where(table.c.id == bindparam('key_id'))
+            # Usage is not a change of the key: keep its version (and ETags)
+            .values(last_used_at=bindparam('used_at'), version=table.c.version)
+        )
+        db.session.execute(stmt, [{'key_id': key_id, 'used_at': used_at} for key_id, used_at in used.items()])
+
+    def _write_counts(self, counts):
+        if not counts:
+            return
+        # Keys deleted since the request was counted would violate the foreign key
+        key_ids = {key_id for key_id, _, _ in counts}
+        existing = set(db.session.scalars(select(APIKey.id).where(APIKey.id.in_(key_ids))))
+        rows = [
+            {'api_key_id': key_id, 'endpoint': endpoint, 'resolution': MINUTE, 'bucket_start': bucket, 'count': count}
+            for (key_id, endpoint, bucket), count in counts.items()
+            if key_id in existing
+        ]
+        _upsert_counts(rows)
+
+    def _downsample(self):
+        now = time.time()
+        tiers = (
+            (MINUTE, HOUR, self.minute_retention * HOUR),
+            (HOUR, DAY, self.hour_retention * DAY),
+        )
+        table = APIKeyUsage.__table__
+        for resolution, coarser, retention in tiers:
+            cutoff = APIKeyUsage.bucket(now - retention, coarser)
+            old_rows = _take_rows(table, table.c.resolution == resolution, table.c.bucket_start < cutoff)
+            rolled_up = {}
+            for key_id, endpoint, bucket_start, count in old_rows:
+                bucket = (key_id, endpoint, APIKeyUsage.bucket(bucket_start, coarser))
+                rolled_up[bucket] = rolled_up.get(bucket, 0) + count
+            _upsert_counts([
+                {'api_key_id': key_id, 'endpoint': endpoint, 'resolution': coarser, 'bucket_start': bucket, 'count': count}
+                for (key_id, endpoint, bucket), count in rolled_up.items()
+            ])
+
+    def _ensure_flusher(self):
+        # Threads do not survive a fork, so each worker starts its own
+        if self._thread_pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread_pid == os.getpid():
+                return
+            self._thread_pid = os.getpid()
+        Thread(target=self._run, name='api-usage-flusher', daemon=True).start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.flush()
+
+
+def _take_rows(table, *conditions):
+    """
+    Delete usage rows and return their keys and counts, so that concurrent
+    workers never roll up the same rows twice
+    """
+    columns = (table.c.api_key_id, table.c.endpoint, table.c.resolution, table.c.bucket_start, table.c.count)
+    if db.session.get_bind().dialect.name not in ('mysql', 'mariadb'):
+        rows = db.session.execute(delete(table).where(*conditions).returning(*columns)).all()
+        return [(key_id, endpoint, bucket_start, count) for key_id, endpoint, _, bucket_start, count in rows]
+    # No DELETE ... RETURNING: lock the rows, then delete them by primary key
+    rows = db.session.execute(select(*columns).where(*conditions).with_for_update()).all()
+    for start in range(0, len(rows), 500):
+        chunk = rows[start:start + 500]
+        db.session.execute(delete(table).where(tuple_(*columns[:4]).in_([tuple(row[:4]) for row in chunk])))
+    return [(key_id, endpoint, bucket_start, count) for key_id, endpoint, _, bucket_start, count in rows]
+
+
+def _upsert_counts(rows):
+    """Add counts to existing buckets, creating missing ones"""
+    if not rows:
+        return
+    table = APIKeyUsage.__table__
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('mysql', 'mariadb'):
+        from sqlalchemy.dialects.mysql import insert
+        stmt = insert(table)
+        stmt = stmt.on_duplicate_key_update(count=table.c.count + stmt.inserted['count'])
+    else:
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.api_key_id, table.c.endpoint, table.c.resolution, table.c.bucket_start],
+            set_={'count': table.c.count + stmt.excluded['count']}
+        )
+    db.session.execute(stmt, rows)
+
+
+usage_recorder = UsageRecorder()
@@ -0,0 +1,344 @@
+import hashlib
+import hmac
+import ipaddress
+import json
+import logging
+import random
+import socket
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+import urllib3
+from sqlalchemy import select, update
+from ..extensions import db
+from ..models import WebhookEvent
+
+logger = logging.getLogger(__name__)
+
+SIGNATURE_HEADER = 'Webhook-Signature'
+
+
+def sign(secret, timestamp, body):
+    """Signature header value of a delivery: t=<unix time>,v1=<hex HMAC-SHA256>"""
+    mac = hmac.new(secret.encode(), b'%d.' % timestamp + body, hashlib.sha256).hexdigest()
+    return f't={timestamp},v1={mac}'
+
+
+def verify(secret, header, body, tolerance=300):
+    """Check a signature header against the body (for receivers)"""
+    try:
+        parts = dict(part.split('=', 1) for part in header.split(','))
+        timestamp = int(parts['t'])
+    except (KeyError, ValueError):
+        return False
+    if abs(time.time() - timestamp) > tolerance:
+        return False
+    return hmac.compare_digest(sign(secret, timestamp, body), header)
+
+
+def private_address_error(url):
+    """
+    Why deliveries to url must not be made, or None: its host has to
+    resolve, and only to public addresses (not loopback, private,
+    link-local, reserved...), so that endpoints cannot reach internal hosts
+    """
+    return public_address(url)[0]
+
+
+def public_address(url):
+    """
+    (None, address) with an address url's host resolves to, if it resolves
+    to public addresses only, else (error, None); see private_address_error()
+    """
+    try:
+        parts = urlsplit(url)
+        host, port = parts.hostname, parts.port
+    except ValueError:
+        return 'Malformed URL', None
+    if not host:
+        return 'URL has no host', None
+    try:
+        addresses = socket.getaddrinfo(host, port or (443 if parts.scheme == 'https' else 80),
+                                       proto=socket.IPPROTO_TCP)
+    except (socket.gaierror, UnicodeError):
+        return f'Cannot resolve {host}', None
+    for address in addresses:
+        ip = ipaddress.ip_address(address[4][0].split('%', 1)[0])
+        if ip.version == 6 and ip.ipv4_mapped is not None:
+            ip = ip.ipv4_mapped
+        if not ip.is_global or ip.is_multicast:
+            return f'{host} resolves to a non-public address ({ip})', None
+    return None, str(ipaddress.ip_address(addresses[0][4][0].split('%', 1)[0]))
+
+
+class WebhookDispatcher:
+    """
+    Delivers the webhook outbox (see models.WebhookEvent)
+
+    Every round claims up to workers * batch_size due deliveries, groups
+    them by endpoint and POSTs each group of up to batch_size events as
+    one signed request: {"events": [...]}. Requests run on a thread pool
+    sharing one urllib3 PoolManager, so connections to an endpoint are
+    kept alive across requests and rounds.
+
+    Claimed rows are leased (next_attempt_at moves past the request
+    timeout), so another dispatcher skips them, and a crashed one's rows
+    become due again. A failed request is retried with exponential backoff
+    until max_attempts, then given up.
+
+    Unless allow_private is set, an endpoint's host is resolved again
+    before each request and deliveries to non-public addresses fail, as
+    DNS answers may have changed since the endpoint was registered. The
+    request then connects to the address that was checked (with the
+    endpoint's host name for the Host header and TLS), so that the name
+    cannot resolve elsewhere in between, and kept-alive connections are
+    pooled by address.
+    """
+
+    def __init__(self, workers=8, batch_size=100, timeout=10.0, max_attempts=10,
+                 backoff=30.0, max_backoff=6 * 3600.0, allow_private=False):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.backoff = backoff  # seconds before the first retry
+        self.max_backoff = max_backoff
+        self.allow_private = allow_private
+        # A kept-alive connection may have been closed by the endpoint in
+        # the meantime: retry once on a new one. Deliveries are at least
+        # once anyway, receivers drop duplicates by event id.
+        self.http = urllib3.PoolManager(
+            num_pools=max(workers * 4, 10), maxsize=workers,
+            retries=urllib3.Retry(total=1, status=0, redirect=0, allowed_methods=None),
+            timeout=urllib3.Timeout(total=timeout)
+        )
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix='webhook')
+        self.started = time.monotonic()
+        self.stats = {'requests': 0, 'delivered': 0, 'failed': 0, 'given_up': 0,
+                      'lag_total': 0.0, 'lag_max': 0.0}
+
+    @classmethod
+    def from_config(cls, config, **overrides):
+        options = {
+            'workers': config['WEBHOOK_WORKERS'],
+            'batch_size': config['WEBHOOK_BATCH_SIZE'],
+            'timeout': config['WEBHOOK_TIMEOUT'],
+            'max_attempts': config['WEBHOOK_MAX_ATTEMPTS'],
+            'backoff': config['WEBHOOK_BACKOFF'],
+            'allow_private': config['WEBHOOK_ALLOW_PRIVATE'],
+        }
+        options.update((name, value) for name, value in overrides.items() if value is not None)
+        return cls(**options)
+
+    def run(self, once=False, poll_interval=1.0, report=None):
+        """
+        Deliver until stopped (or until nothing is due, with once), calling
+        report(stats) after every round that delivered something
+        """
+        while True:
+            handled = self.deliver_due()
+            if handled and report:
+                report(self.summary())
+            if not handled:
+                if once:
+                    return
+                time.sleep(poll_interval)
+
+    def deliver_due(self):
+        """One round; returns the number of deliveries attempted"""
+        rows = self._claim(self.workers * self.batch_size)
+        if not rows:
+            return 0
+
+        groups = defaultdict(list)
+        for row in rows:
+            groups[row.url, row.secret].append(row)
+        batches = [
+            (url, secret, group[start:start + self.batch_size])
+            for (url, secret), group in groups.items()
+            for start in range(0, len(group), self.batch_size)
+        ]
+
+        delivered, retries = [], []
+        for (_, _, batch), error in zip(batches, self._executor.map(self._post, batches)):
+            self.stats['requests'] += 1
+            if error is None:
+                delivered.extend(batch)
+            else:
+                retries.extend((row, error) for row in batch)
+
+        now = datetime.utcnow()
+
+        updates = [
+            {'id': row.id, 'attempts': row.attempts + 1, 'delivered_at': now,
+             'next_attempt_at': None, 'last_error': None}
+            for row in delivered
+        ]
+        for row, error in retries:
+            attempts = row.attempts + 1
+            given_up = attempts >= self.max_attempts
+            updates.append({
+                'id': row.id, 'attempts': attempts, 'last_error': error[:255],
+                'next_attempt_at': None if given_up else now + timedelta(seconds=self._backoff(attempts)),
+            })
+            self.stats['given_up' if given_up else 'failed'] += 1
+            if given_up:
+                logger.warning("Giving up webhook delivery %d to %s: %s", row.id, row.url, error)
+        db.session.execute(update(WebhookEvent), updates)
+        db.session.commit()
+
+        for row in delivered:
+            lag = (now - row.created_at).total_seconds()
+            self.stats['lag_total'] += lag
+            self.stats['lag_max'] = max(self.stats['lag_max'], lag)
+        self.stats['delivered'] += len(delivered)
+        return len(rows)
+
+    def summary(self):
+        """Delivery counts, throughput (events/s) and lag (seconds from event to delivery)"""
+        stats = self.stats
+        elapsed = time.monotonic() - self.started
+        return {
+            'requests': stats['requests'],
+            'delivered': stats['delivered'],
+            'failed': stats['failed'],
+            'given_up': stats['given_up'],
+            'throughput': stats['delivered'] / elapsed if elapsed else 0.0,
+            'lag_mean': stats['lag_total'] / stats['delivered'] if stats['delivered'] else 0.0,
+            'lag_max': stats['lag_max'],
+        }
+
+    def close(self):
+        self._executor.shutdown()
+        self.http.clear()
+
+    def _claim(self, limit):
+        now = datetime.utcnow()
+        table = WebhookEvent.__table__
+        rows = db.session.execute(
+            select(table.c.id, table.c.url, table.c.secret, table.c.event_id, table.c.event,
+                   table.c.payload, table.c.created_at, table.c.attempts)
+            .where(table.c.next_attempt_at <= now)
+            .order_by(table.c.next_attempt_at, table.c.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        ).all()
+        if rows:
+            # Lease the rows until the requests have surely timed out
+            lease = now + timedelta(seconds=self.timeout * 2 + 30)
+            db.session.execute(
+                update(table).where(table.c.id.in_([row.id for row in rows])).values(next_attempt_at=lease)
+            )
+        db.session.commit()
+        return rows
+
+    def _post(self, batch):
+        """POST one batch of events; returns None on success or the error"""
+        url, secret, rows = batch
+        address = None
+        if not self.allow_private:
+            error, address = public_address(url)
+            if error is not None:
+                return error
+        # The payloads are stored as JSON, so the body is assembled as text
+        body = '{"events":[%s]}' % ','.join(
+            '{"id":%s,"type":%s,"created_at":"%s","data":%s}'
+            % (json.dumps(row.event_id), json.dumps(row.event), row.created_at.isoformat(), row.payload)
+            for row in rows
+        )
+        body = body.encode()
+        headers = {
+            'Content-Type': 'application/json',
+            SIGNATURE_HEADER: sign(secret, int(time.time()), body),
+        }
+        try:
+            if address is None:
+                response = self.http.request('POST', url, body=body, headers=headers)
+            else:
+                response = self._request_at(address, url, body, headers)
+        except urllib3.exceptions.HTTPError as e:
+            return f'{type(e).__name__}: {e}'
+        except ValueError as e:
+            # Malformed URL
+            return str(e)
+        if 200 <= response.status < 300:
+            return None
+        return f'HTTP {response.status}'
+
+    def _request_at(self, address, url, body, headers):
+        """POST to url on a connection to address (one of its host's)"""
+        parts = urlsplit(url)
+        https = parts.scheme == 'https'
+        pool = self.http.connection_from_host(
+            address, parts.port or (443 if https else 80), parts.scheme,
+            pool_kwargs={'server_hostname': parts.hostname, 'assert_hostname': parts.hostname} if https else None
+        )
+        path = (parts.path or '/') + (f'?{parts.query}' if parts.query else '')
+        return pool.urlopen('POST', path, body=body, headers={**headers, 'Host': parts.netloc.rpartition('@')[2]},
+                            redirect=False)
+
+    def _backoff(self, attempts):
+        delay = min(self.backoff * 2 ** (attempts - 1), self.max_backoff)
+        # Jitter spreads the retries of endpoints that failed together
+        return delay * random.uniform(0.5, 1.0)
+
+
+class WebhookReceiver(ThreadingHTTPServer):
+    """
+    Local stand-in for a webhook consumer, for testing deliveries
+
+    Accepts POSTed batches on any path over keep-alive connections,
+    optionally checks their signatures and fails a share of them with 503.
+    Counts connections, requests and events.
+    """
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, address, secret=None, fail_rate=0.0, delay=0.0):
+        super().__init__(address, _ReceiverHandler)
+        self.secret = secret
+        self.fail_rate = fail_rate
+        self.delay = delay  # seconds per request
+        self.lock = threading.Lock()
+        self.stats = {'connections': 0, 'requests': 0, 'events': 0, 'rejected': 0}
+
+    def count(self, **counts):
+        with self.lock:
+            for name, value in counts.items():
+                self.stats[name] += value
+
+
+class _ReceiverHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive
+
+    def setup(self):
+        super().setup()
+        self.server.count(connections=1)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        server = self.server
+        if server.delay:
+            time.sleep(server.delay)
+        if server.secret and not verify(server.secret, self.headers.get(SIGNATURE_HEADER, ''), body):
+            server.count(requests=1, rejected=1)
+            return self._reply(400)
+        if server.fail_rate and random.random() < server.fail_rate:
+            server.count(requests=1, rejected=1)
+            return self._reply(503)
+        server.count(requests=1, events=len(json.loads(body)['events']))
+        self._reply(204)
+
+    def _reply(self, status):
+        self.send_response(status)
+        if self.close_connection:
+            self.send_header('Connection', 'close')
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
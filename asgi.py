@@ -0,0 +1,2 @@
+from app.aio import create_asgi_app
+application = create_asgi_app()
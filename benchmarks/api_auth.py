@@ -0,0 +1,74 @@
+"""
+Benchmark per-request API key authentication cost
+Run with: python -m benchmarks.api_auth
+
+Compares the legacy scheme (password hash per candidate key) with the
+keyed digest lookup and the v2 key id lookup, both through the key
+resolver and a full request, and the rejection of an expired legacy key.
+"""
+
+import secrets
+from datetime import datetime, timedelta
+from app.extensions import db
+from app.models import APIKey
+from .common import make_app, make_user, timed, report
+
+LEGACY_KEYS = 20
+ITERATIONS = 200
+
+
+def resolve(raw_key):
+    # Start from an empty identity map, like a new request would
+    db.session.expunge_all()
+    return APIKey.find_by_key(raw_key)
+
+
+def main():
+    app = make_app()
+    client = app.test_client()
+
+    print(f"API key authentication ({ITERATIONS} iterations, {LEGACY_KEYS} legacy keys)")
+
+    with app.app_context():
+        user = make_user("bench@example.com")
+
+        # Legacy keys, as created before the digest scheme existed
+        legacy_raw = []
+        for _ in range(LEGACY_KEYS):
+            raw_key = "sk_live_" + secrets.token_urlsafe(32)
+            db.session.add(APIKey(user_id=user.id, key_hash=APIKey.hash_key(raw_key), key_prefix=raw_key[:12]))
+            legacy_raw.append(raw_key)
+        db.session.commit()
+
+        # An expired legacy key, rejected by the lookup query before any hashing
+        expired_raw = "sk_live_" + secrets.token_urlsafe(32)
+        db.session.add(APIKey(
+            user_id=user.id, key_hash=APIKey.hash_key(expired_raw), key_prefix=expired_raw[:12],
+            expires_at=datetime.utcnow() - timedelta(days=1)
+        ))
+
+        api_key = APIKey(user_id=user.id, name="bench")
+        raw_key = api_key.issue_key()
+        db.session.commit()
+
+        # Before: every request pays a full password hash verification
+        legacy_hash = APIKey.hash_key(legacy_raw[0])
+        report("legacy verify_key (per candidate)", timed(lambda: APIKey.verify_key(legacy_hash, legacy_raw[0]), 20))
+
+        # First use of each legacy key verifies it once and migrates it
+        remaining = iter(legacy_raw)
+        report("legacy find_by_key (first use, migrates)", timed(lambda: resolve(next(remaining)), LEGACY_KEYS))
+
+        # After: one indexed lookup (legacy format) or primary key read (v2) and one compare
+        migrated_key = legacy_raw[0]
+        report("digest find_by_key (migrated legacy key)", timed(lambda: resolve(migrated_key), ITERATIONS))
+        report("v2 find_by_key", timed(lambda: resolve(raw_key), ITERATIONS))
+        report("legacy find_by_key (expired key)", timed(lambda: resolve(expired_raw), ITERATIONS))
+        report("digest find_by_key (unknown key)", timed(lambda: resolve("sk_live_" + secrets.token_urlsafe(32)), ITERATIONS))
+
+    headers = {"Authorization": f"Bearer {raw_key}"}
+    report("GET /api/v1/me (v2 key)", timed(lambda: client.get("/api/v1/me", headers=headers), ITERATIONS))
+
+
+if __name__ == "__main__":
+    main()
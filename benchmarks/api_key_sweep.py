@@ -0,0 +1,85 @@
+"""
+Benchmark the API key expiry sweep
+Run with: python -m benchmarks.api_key_sweep
+
+Seeds keys of which a share has expired (some long ago) and times
+APIKey.deactivate_expired and APIKey.purge_expired at several batch
+sizes, against disabling the same keys one ORM object at a time.
+"""
+
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import insert, select, update
+from app.extensions import db
+from app.models import APIKey, User
+from .common import make_app, make_user
+
+USERS = 1000
+KEYS_PER_USER = 20
+EXPIRED = 0.25  # share of keys past their expiry
+PURGEABLE = 0.1  # share expired longer than the purge period
+PURGE_DAYS = 90
+BATCH_SIZES = (100, 1000, 10000)
+
+
+def seed():
+    """Replace all keys with a fresh set; returns the number of keys"""
+    now = datetime.utcnow()
+    db.session.execute(APIKey.__table__.delete())
+    user_ids = db.session.scalars(select(User.id)).all()
+    rows = []
+    for i in range(len(user_ids) * KEYS_PER_USER):
+        share = (i % 100) / 100
+        if share < PURGEABLE:
+            expires_at = now - timedelta(days=PURGE_DAYS + 1)
+        elif share < EXPIRED:
+            expires_at = now - timedelta(days=1)
+        else:
+            expires_at = now + timedelta(days=30)
+        rows.append({
+            "user_id": user_ids[i % len(user_ids)], "key_prefix": "sk_live_", "key_digest": f"{i:064x}",
+            "expires_at": expires_at, "is_active": True, "created_at": now
+        })
+    db.session.execute(insert(APIKey), rows)
+    db.session.execute(update(User).values(api_key_count=KEYS_PER_USER))
+    db.session.commit()
+    return len(rows)
+
+
+def per_row():
+    """The naive sweep: load every expired key and disable it in Python"""
+    for api_key in APIKey.query.filter(APIKey.is_active.is_(True), APIKey.expires_at <= datetime.utcnow()):
+        api_key.is_active = False
+        User.count_api_keys(api_key.user_id, -1)
+    db.session.commit()
+
+
+def main():
+    app = make_app()
+    with app.app_context():
+        make_user("bench@example.com")
+        db.session.execute(insert(User), [
+            {"email": f"user{i}@example.com", "password_hash": "x", "created_at": datetime.utcnow()} for i in range(USERS - 1)
+        ])
+        db.session.commit()
+
+        total = seed()
+        print(f"API key sweep ({total} keys, {EXPIRED:.0%} expired, {PURGEABLE:.0%} older than {PURGE_DAYS} days)")
+
+        start = time.perf_counter()
+        per_row()
+        print(f"  {'per-row ORM updates':<32} {time.perf_counter() - start:>8.2f} s")
+
+        for batch_size in BATCH_SIZES:
+            seed()
+            start = time.perf_counter()
+            disabled = APIKey.deactivate_expired(batch_size)
+            middle = time.perf_counter()
+            deleted = APIKey.purge_expired(PURGE_DAYS, batch_size)
+            end = time.perf_counter()
+            print(f"  {f'batches of {batch_size}':<32} {middle - start:>8.2f} s to disable {disabled}, "
+                  f"{end - middle:.2f} s to delete {deleted}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Report SQL queries per authenticated API request
+Run with: python -m benchmarks.api_queries
+
+Each endpoint is called twice with the same key: once on a cold API key
+cache (verification) and once warm, then the dashboard endpoints once
+more as a single batch request. Exits non-zero if a request issues more
+queries than its budget.
+"""
+
+import sys
+from app.config import TestingConfig
+from app.extensions import db
+from app.models import APIKey, BillingProfile, Plan
+from app.utils.api_key_cache import api_key_cache
+from app.utils.entitlements import entitlements
+from .common import make_app, make_user, count_queries
+
+# Maximum queries per request (warm cache)
+BUDGETS = {
+    "/api/v1/me": 1,
+    "/api/v1/profile": 1,
+    "/api/v1/api-keys": 2,
+    "/api/v1/stats": 2,
+    "/api/v1/users": 2,
+}
+
+# Calls of a dashboard, batched through POST /api/v1/batch
+DASHBOARD = ["/api/v1/me", "/api/v1/profile", "/api/v1/api-keys", "/api/v1/stats"]
+BATCH_BUDGET = 4
+
+
+class QueryCountConfig(TestingConfig):
+    # Keep the write-behind usage flush out of the measured requests
+    API_KEY_USAGE_FLUSH_INTERVAL = 3600
+
+
+def main():
+    app = make_app(QueryCountConfig)
+    client = app.test_client()
+
+    with app.app_context():
+        plan = Plan(name="Pro", price=19.99, option1="API Access")
+        db.session.add(plan)
+        user = make_user("bench@example.com", plan=plan, role="admin")
+        db.session.add(BillingProfile(user=user, full_name="Bench", country="DE"))
+        api_key = APIKey(user_id=user.id, name="bench")
+        raw_key = api_key.issue_key()
+        db.session.commit()
+        # Compiled once per process, not per request
+        entitlements.for_plan(plan.id)
+
+    headers = {"Authorization": f"Bearer {raw_key}"}
+    over_budget = False
+    print("Queries per request (cold cache / warm cache)")
+    for path, budget in BUDGETS.items():
+        counts = []
+        for _ in range(2):
+            if not counts:
+                api_key_cache.clear()
+            with count_queries(app) as statements:
+                response = client.get(path, headers=headers)
+            assert response.status_code == 200, (path, response.status_code)
+            counts.append(len(statements))
+        if "-v" in sys.argv:
+            print("\n".join(statements))
+        over_budget |= counts[1] > budget
+        print(f"  {path:<24} {counts[0]} / {counts[1]}  (budget {budget})")
+
+    # The same four calls as one batch: authentication happens once
+    batch = {"requests": [{"path": path} for path in DASHBOARD]}
+    with count_queries(app) as statements:
+        response = client.post("/api/v1/batch", json=batch, headers=headers)
+    assert response.status_code == 200, response.status_code
+    assert all(item["status"] == 200 for item in response.get_json()["responses"])
+    if "-v" in sys.argv:
+        print("\n".join(statements))
+    separate = sum(BUDGETS[path] for path in DASHBOARD)
+    over_budget |= len(statements) > BATCH_BUDGET
+    print(f"  {'POST /api/v1/batch':<24} {len(statements)}      (budget {BATCH_BUDGET}, {separate} as separate requests)")
+
+    sys.exit(1 if over_budget else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""
+Benchmark the sync (WSGI) and async (ASGI) deployments under concurrency
+Run with: python -m benchmarks.asgi
+
+Starts the app under gunicorn with threaded sync workers (wsgi.py) and
+under uvicorn (asgi.py) with the same number of worker processes, on
+the same SQLite database file, and keeps a number of keep-alive
+connections busy against API endpoints. Reports throughput, latency
+percentiles and the resident memory of the server processes.
+
+Both servers get the same number of workers, not the same memory: an
+async worker loads the asyncio engine and its driver on top of the Flask
+app and is larger. Throughput per MiB is reported alongside to compare
+the two at equal resident memory.
+"""
+
+import asyncio
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from sqlalchemy import insert
+from app.config import ProductionConfig
+from app.extensions import db
+from app.models import APIKey, User
+from .common import FAST_PASSWORD_HASH, make_app, make_user
+
+ROOT = Path(__file__).resolve().parent.parent
+WORKERS = 2
+THREADS = 4  # per sync worker
+USERS = 2000
+DURATION = 5  # seconds per run
+CONCURRENCY = (8, 64, 256)
+PATHS = ("/api/v1/me", "/api/v1/users?limit=100")
+SECRET_KEY = "benchmark-secret"
+
+SERVERS = {
+    "sync (gunicorn gthread)": [
+        sys.executable, "-m", "gunicorn", "-k", "gthread", "-w", str(WORKERS), "--threads", str(THREADS),
+        "--backlog", "2048", "--log-level", "warning", "-b", "127.0.0.1:{port}", "wsgi:application",
+    ],
+    "async (uvicorn)": [
+        sys.executable, "-m", "uvicorn", "--workers", str(WORKERS), "--backlog", "2048", "--no-access-log",
+        "--log-level", "warning", "--port", "{port}", "asgi:application",
+    ],
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def seed(database):
+    """Create the schema, users and an admin API key; returns the key"""
+    class Config(ProductionConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{database}"
+        SECRET_KEY = SECRET_KEY
+
+    app = make_app(Config)
+    with app.app_context():
+        admin = make_user("admin@example.com", role="admin")
+        db.session.execute(insert(User), [
+            {"email": f"user{i}@example.com", "password_hash": FAST_PASSWORD_HASH} for i in range(USERS)
+        ])
+        api_key = APIKey(user_id=admin.id, name="bench")
+        raw_key = api_key.issue_key()
+        db.session.commit()
+    return raw_key
+
+
+def rss_kib(pid):
+    """Resident memory of a process and its children"""
+    total = 0
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                total += int(line.split()[1])
+    children = Path(f"/proc/{pid}/task/{pid}/children").read_text().split()
+    return total + sum(rss_kib(int(child)) for child in children)
+
+
+async def client(port, path, headers, deadline, latencies, errors):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    request = f"GET {path} HTTP/1.1\r\nHost: localhost\r\n{headers}\r\n".encode()
+    try:
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            writer.write(request)
+            status = await reader.readline()
+            length = 0
+            while (line := await reader.readline()) not in (b"\r\n", b""):
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":")[1])
+            await reader.readexactly(length)
+            if status.split()[1] != b"200":
+                errors.append(status)
+            latencies.append(time.perf_counter() - start)
+    finally:
+        writer.close()
+
+
+async def load(port, path, headers, concurrency):
+    latencies, errors = [], []
+    deadline = time.perf_counter() + DURATION
+    await asyncio.gather(*(
+        client(port, path, headers, deadline, latencies, errors) for _ in range(concurrency)
+    ))
+    return latencies, errors
+
+
+def wait_ready(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1) as sock:
+                sock.sendall(b"GET /api/v1/ping HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n")
+                if sock.recv(64).startswith(b"HTTP/1.1 200"):
+                    return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+
+def main():
+    workdir = tempfile.mkdtemp()
+    database = os.path.join(workdir, "bench.sqlite3")
+    raw_key = seed(database)
+    headers = f"Authorization: Bearer {raw_key}\r\n"
+    env = {
+        **os.environ,
+        "FLASK_CONFIG": "ProductionConfig",
+        "DATABASE_URL": f"sqlite:///{database}",
+        "SECRET_KEY": SECRET_KEY,
+        "SHARED_STATE_PATH": os.path.join(workdir, "shared_state.bin"),
+        "RATELIMIT_ENABLED": "false",
+    }
+
+    print(f"{WORKERS} worker processes each ({THREADS} threads per sync worker), {DURATION}s per run, {os.cpu_count()} CPUs")
+    try:
+        for label, command in SERVERS.items():
+            port = free_port()
+            server = subprocess.Popen(
+                [part.format(port=port) for part in command], cwd=ROOT, env=env,
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+            )
+            try:
+                wait_ready(port)
+                print(label)
+                results = []
+                for path in PATHS:
+                    for concurrency in CONCURRENCY:
+                        latencies, errors = asyncio.run(load(port, path, headers, concurrency))
+                        latencies.sort()
+                        p50 = latencies[len(latencies) // 2] * 1000
+                        p99 = latencies[int(len(latencies) * 0.99)] * 1000
+                        results.append((path, concurrency, len(latencies) / DURATION, p50, p99, len(errors)))
+                memory = rss_kib(server.pid) / 1024
+                for path, concurrency, throughput, p50, p99, error_count in results:
+                    print(f"  {path:<26} {concurrency:>4} conns {throughput:>8.0f} req/s  "
+                          f"{throughput / memory:>5.2f} req/s/MiB  p50 {p50:>7.1f} ms  p99 {p99:>7.1f} ms  "
+                          f"errors {error_count}")
+                print(f"  resident memory {memory:.0f} MiB")
+            finally:
+                server.terminate()
+                server.wait()
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Shared helpers for the benchmark scripts
+Run a benchmark from the repository root, e.g.: python -m benchmarks.api_auth
+"""
+
+import time
+from contextlib import contextmanager
+from sqlalchemy import event
+from werkzeug.security import generate_password_hash
+from app import create_app
+from app.config import TestingConfig
+from app.extensions import db
+from app.models import User
+
+# Seeding users with the production hash parameters would dominate setup time
+FAST_PASSWORD_HASH = generate_password_hash("benchmark", method="pbkdf2:sha256:1")
+
+
+def make_app(config_class=TestingConfig):
+    """Create an app on an in-memory database with all tables created"""
+    app = create_app(config_class)
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def make_user(email, **kwargs):
+    """Create a confirmed user (requires an app context)"""
+    user = User(email=email, password_hash=FAST_PASSWORD_HASH, **kwargs)
+    user.confirm()
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+def timed(fn, iterations):
+    """Return the mean wall time of fn() in seconds"""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations
+
+
+def report(label, seconds):
+    print(f"  {label:<48} {seconds * 1e6:>12.1f} µs")
+
+
+@contextmanager
+def count_queries(app, with_parameters=False):
+    """
+    Collect the SQL statements executed inside the block into a list
+    (as (statement, parameters) pairs with with_parameters)
+    """
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters) if with_parameters else statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
@@ -0,0 +1,80 @@
+"""
+Benchmark sparse fieldsets on a large user table
+Run with: python -m benchmarks.fieldsets
+
+Pages through GET /api/v1/users with the default fields, with
+?fields=id,email and with ?include=plan,billing, and reports per page
+the time, the columns and bytes read from the database and the bytes
+of the response.
+"""
+
+from sqlalchemy import insert
+from app.extensions import db
+from app.models import APIKey, BillingProfile, Plan, User
+from .common import FAST_PASSWORD_HASH, make_app, make_user, count_queries, timed, report
+
+USERS = 20000
+PAGE_SIZE = 1000
+ITERATIONS = 10
+
+QUERIES = {
+    "default fields": "",
+    "fields=id,email": "&fields=id,email",
+    "all fields + include=plan,billing": "&fields=id,email,role,language,plan,is_active,is_confirmed,created_at&include=plan,billing",
+}
+
+
+def bytes_read(app, statements):
+    """Columns and bytes of the values fetched by the listing's queries"""
+    columns = values = 0
+    with app.app_context():
+        for statement, parameters in statements:
+            # Skip writes and the API key authentication
+            if not statement.lstrip().startswith("SELECT") or "FROM api_key" in statement:
+                continue
+            result = db.session.connection().exec_driver_sql(statement, parameters)
+            columns += len(result.keys())
+            for row in result:
+                values += sum(len(str(value)) for value in row if value is not None)
+    return columns, values
+
+
+def main():
+    app = make_app()
+    client = app.test_client()
+
+    with app.app_context():
+        plan = Plan(name="Pro", price=19.99, option1="API Access")
+        db.session.add(plan)
+        admin = make_user("admin@example.com", role="admin")
+        api_key = APIKey(user_id=admin.id, name="bench")
+        raw_key = api_key.issue_key()
+        db.session.commit()
+        db.session.execute(insert(User), [
+            {"email": f"user{i}@example.com", "password_hash": FAST_PASSWORD_HASH, "plan_id": plan.id if i % 3 == 0 else None}
+            for i in range(USERS)
+        ])
+        db.session.execute(insert(BillingProfile), [
+            {"user_id": user_id, "full_name": f"User {user_id}", "company": "Example Inc.", "country": "DE"}
+            for user_id in range(2, USERS + 2, 2)
+        ])
+        db.session.commit()
+
+    headers = {"Authorization": f"Bearer {raw_key}"}
+    print(f"GET /api/v1/users, {USERS} users, pages of {PAGE_SIZE}, mean of {ITERATIONS} requests")
+    for label, query in QUERIES.items():
+        path = f"/api/v1/users?limit={PAGE_SIZE}{query}"
+        response = client.get(path, headers=headers)
+        assert response.status_code == 200, (path, response.status_code)
+
+        with count_queries(app, with_parameters=True) as statements:
+            client.get(path, headers=headers)
+        columns, read = bytes_read(app, statements)
+
+        seconds = timed(lambda: client.get(path, headers=headers), ITERATIONS)
+        report(label, seconds)
+        print(f"  {'':<48} {columns} columns, {read / 1024:,.0f} KiB read from the database, {len(response.data) / 1024:,.0f} KiB sent")
+
+
+if __name__ == "__main__":
+    main()
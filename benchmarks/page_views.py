@@ -0,0 +1,46 @@
+"""
+Report SQL queries per logged in page view
+Run with: python -m benchmarks.page_views
+
+The first view after login loads the user and snapshots it into the
+session; later views render the header from the snapshot. Pages that use
+more of the user than the snapshot holds load it on demand.
+"""
+
+from app.config import TestingConfig
+from .common import make_app, make_user, count_queries, timed
+
+PAGES = ["/about", "/product", "/profile", "/account/", "/account/api-keys"]
+ITERATIONS = 200
+
+
+class PageViewConfig(TestingConfig):
+    WTF_CSRF_ENABLED = False
+
+
+def main():
+    app = make_app(PageViewConfig)
+    client = app.test_client()
+
+    with app.app_context():
+        user_id = make_user("bench@example.com").id
+    with client.session_transaction() as session:
+        session["_user_id"] = str(user_id)
+        session["_fresh"] = True
+
+    print("Queries per page view (first view / later views), mean time of later views")
+    for path in PAGES:
+        counts = []
+        for _ in range(2):
+            with count_queries(app) as statements:
+                client.get(path)
+            counts.append(len(statements))
+        seconds = timed(lambda: client.get(path), ITERATIONS)
+        print(f"  {path:<24} {counts[0]} / {counts[1]}  {seconds * 1e6:>10.1f} µs")
+        # Start the next page from a fresh snapshot
+        with client.session_transaction() as session:
+            session.pop("_principal", None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Benchmark page latency during a burst of password checks
+Run with: python -m benchmarks.password_hashing
+
+A burst of sign-ins is simulated by BURST threads verifying a password at
+once, either inline in each thread (as views did before) or through the
+password hasher's bounded pool, while another thread keeps requesting a
+page. Reports the page's latency during the burst, how long the burst
+took and how many checks were turned away with a 503.
+"""
+
+import statistics
+import threading
+import time
+from werkzeug.security import check_password_hash, generate_password_hash
+from app.utils.hashing import HashingBusy, password_hasher
+from .common import make_app
+
+BURST = 48
+PAGE = "/about"
+
+
+def run_burst(client, verify, password_hash):
+    rejected = []
+    done = threading.Event()
+
+    def sign_in():
+        try:
+            verify(password_hash, "correct horse")
+        except HashingBusy:
+            rejected.append(1)
+
+    client.get(PAGE)
+    latencies = []
+    threads = [threading.Thread(target=sign_in) for _ in range(BURST)]
+
+    def page_views():
+        while not done.is_set():
+            start = time.perf_counter()
+            client.get(PAGE)
+            latencies.append(time.perf_counter() - start)
+
+    viewer = threading.Thread(target=page_views)
+    start = time.perf_counter()
+    viewer.start()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    burst = time.perf_counter() - start
+    done.set()
+    viewer.join()
+    return latencies, burst, len(rejected)
+
+
+def main():
+    app = make_app()
+    client = app.test_client()
+    password_hash = generate_password_hash("correct horse", password_hasher.method)
+
+    print(f"{PAGE} during {BURST} concurrent password checks ({password_hasher.method}, "
+          f"{password_hasher.size} hashing threads, queue {password_hasher.queue})")
+    for label, verify in (("inline", check_password_hash), ("pool", password_hasher.verify)):
+        latencies, burst, rejected = run_burst(client, verify, password_hash)
+        latencies.sort()
+        p95 = latencies[int(len(latencies) * 0.95)]
+        print(f"  {label:<8} page mean {statistics.mean(latencies) * 1e3:>7.1f} ms  p95 {p95 * 1e3:>7.1f} ms  "
+              f"burst {burst:>5.2f} s  rejected {rejected}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Benchmark the API rate limiter overhead
+Run with: python -m benchmarks.ratelimit
+
+Measures one token bucket check on the in-process and the memory-mapped
+store, and checks that workers sharing the mmap store never hand out
+more tokens than a bucket holds.
+"""
+
+import os
+import tempfile
+from multiprocessing import Pool
+from app.utils.ratelimit import RateLimiter
+from app.utils.shared_store import MemoryStore, MmapStore
+from .common import timed, report
+
+ITERATIONS = 100000
+WORKERS = 4
+LIMIT = 1000
+
+
+def make_limiter(store):
+    limiter = RateLimiter()
+    limiter.store = store
+    return limiter
+
+
+def drain(path):
+    # Each worker opens the store itself, as a gunicorn worker would
+    limiter = make_limiter(MmapStore(path))
+    return sum(limiter.hit("ratelimit:key:shared", LIMIT).allowed for _ in range(LIMIT))
+
+
+def main():
+    print(f"Rate limiter ({ITERATIONS} checks)")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "shared_state.bin")
+        for label, store in (("memory store", MemoryStore()), ("mmap store", MmapStore(path))):
+            limiter = make_limiter(store)
+            keys = iter(range(ITERATIONS * 2))
+            report(f"hit() {label}, same bucket", timed(lambda: limiter.hit("ratelimit:key:1", 10 ** 9), ITERATIONS))
+            report(f"hit() {label}, distinct buckets", timed(lambda: limiter.hit(f"ratelimit:key:{next(keys)}", 60), ITERATIONS))
+
+        path = os.path.join(directory, "contended.bin")
+        with Pool(WORKERS) as pool:
+            allowed = sum(pool.map(drain, [path] * WORKERS))
+        print(f"  {WORKERS} processes x {LIMIT} requests on a {LIMIT}-token bucket: {allowed} allowed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Benchmark serializing large lists for the API
+Run with: python -m benchmarks.serializers
+
+Compares hand-built dicts encoded by the stdlib provider (the API before
+compiled serializers) with the compiled serializers and the app's JSON
+provider, for users and API keys.
+"""
+
+import json
+from datetime import datetime
+from flask.json.provider import DefaultJSONProvider
+from app.blueprints.api.serializers import user_serializer, api_key_serializer
+from app.models import User, APIKey
+from app.utils import json_provider
+from .common import make_app, timed, report
+
+ROWS = 10000
+ITERATIONS = 5
+
+
+def hand_built_user(user):
+    return {
+        "id": user.id,
+        "email": user.email,
+        "role": user.role,
+        "language": user.language,
+        "is_active": user.is_active,
+        "is_confirmed": user.is_confirmed,
+        "created_at": user.created_at.isoformat()
+    }
+
+
+def hand_built_api_key(key):
+    return {
+        "id": key.id,
+        "name": key.name,
+        "key_prefix": key.key_prefix,
+        "masked_key": key.masked_key,
+        "is_active": key.is_active,
+        "created_at": key.created_at.isoformat(),
+        "last_used_at": key.last_used_minute.isoformat() if key.last_used_minute else None
+    }
+
+
+def main():
+    app = make_app()
+    now = datetime.utcnow()
+    users = [
+        User(id=i, email=f"user{i}@example.com", role="user", language="en",
+             is_active=True, confirmed_at=now, created_at=now)
+        for i in range(ROWS)
+    ]
+    keys = [
+        APIKey(id=i, user_id=i, name=f"key {i}", key_prefix=f"sk_live_{i}_abcd",
+               is_active=True, created_at=now, last_used_at=now if i % 2 else None)
+        for i in range(ROWS)
+    ]
+
+    stdlib = DefaultJSONProvider(app)
+    fast = app.json
+    encoder = "orjson" if json_provider.orjson is not None else "stdlib fallback"
+
+    print(f"Serializing {ROWS} rows, mean of {ITERATIONS} runs (fast provider: {encoder})")
+    with app.app_context():
+        for label, objs, hand_built, serializer in (
+            ("users", users, hand_built_user, user_serializer),
+            ("API keys", keys, hand_built_api_key, api_key_serializer),
+        ):
+            assert json.loads(stdlib.dumps([hand_built(o) for o in objs[:10]])) == \
+                json.loads(fast.dumps(serializer.many(objs[:10])))
+
+            before = timed(lambda: stdlib.dumps({"items": [hand_built(o) for o in objs]}), ITERATIONS)
+            after = timed(lambda: fast.dumps({"items": serializer.many(objs)}), ITERATIONS)
+            build = timed(lambda: serializer.many(objs), ITERATIONS)
+            report(f"{label}: hand-built dicts + stdlib json", before)
+            report(f"{label}: compiled serializer only", build)
+            report(f"{label}: compiled serializer + fast provider", after)
+            print(f"  {label}: {ROWS / after:,.0f} rows/s ({before / after:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
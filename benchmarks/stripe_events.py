@@ -0,0 +1,173 @@
+"""
+Benchmark Stripe webhook ingestion and event processing
+Run with: python -m benchmarks.stripe_events
+
+Builds a burst of events from the recorded payloads in
+fixtures/stripe (no network): per user a subscription created before
+its checkout completes, an invoice, a renewal failure and, for every
+third user, the cancellation. Reports the time to acknowledge an event,
+new and redelivered, and the processing throughput in batches compared
+to one event at a time.
+
+Before that, checks with the same fixtures that deliveries with a bad,
+expired or malformed signature are refused, and that a subscription
+update Stripe created before an already applied event is ignored.
+"""
+
+import json
+import time
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+from sqlalchemy import func, insert, select, update
+from app.extensions import db
+from app.models import Plan, StripeEvent, User
+from app.utils.stripe_events import process_events, sign
+from .common import FAST_PASSWORD_HASH, make_app, count_queries, timed, report
+
+USERS = 500
+SECRET = "whsec_benchmark"
+FIXTURES = Path(__file__).parent / "fixtures" / "stripe"
+PRICE_ID = "price_1QhWz82eZvKYlo2CpRo0Xy1b"
+
+
+@lru_cache()
+def load_fixture(name):
+    return json.loads((FIXTURES / f"{name}.json").read_text())
+
+
+def burst(user_ids):
+    """Event payloads for the users, in the order Stripe might send them"""
+    payloads = []
+    for n, user_id in enumerate(user_ids):
+        names = [
+            "customer.subscription.created", "checkout.session.completed", "invoice.paid",
+            "customer.subscription.updated", "customer.subscription.deleted",
+        ]
+        if n % 3:
+            names.remove("customer.subscription.deleted")
+        payloads.extend(customize(name, user_id) for name in names)
+    return payloads
+
+
+def customize(name, user_id):
+    """Fixture event of a type, for the user and their subscription"""
+    event = json.loads(json.dumps(load_fixture(name)))
+    event["id"] = f"evt_{name}_{user_id}"
+    obj = event["data"]["object"]
+    obj["customer"] = f"cus_{user_id}"
+    if name == "checkout.session.completed":
+        obj["client_reference_id"] = str(user_id)
+        obj["subscription"] = f"sub_{user_id}"
+    elif name.startswith("customer.subscription"):
+        obj["id"] = f"sub_{user_id}"
+    return json.dumps(event).encode()
+
+
+def check_fixtures():
+    """Signature checks and out-of-order events, on a database of their own"""
+    app = make_app()
+    app.config["STRIPE_WEBHOOK_SECRET"] = SECRET
+    client = app.test_client()
+    with app.app_context():
+        db.session.add(Plan(name="Pro", price=19.99, stripe_price_id=PRICE_ID))
+        user = User(email="fixtures@example.com", password_hash=FAST_PASSWORD_HASH)
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+
+    def post(payload, signature):
+        return client.post("/api/stripe/webhook", data=payload, headers={
+            "Content-Type": "application/json", "Stripe-Signature": signature
+        })
+
+    # Refused before anything is stored
+    payload = customize("customer.subscription.updated", user_id)
+    for label, signature in (
+        ("wrong secret", sign(payload, "whsec_other")),
+        ("expired timestamp", sign(payload, SECRET, timestamp=int(time.time()) - 3600)),
+        ("malformed header", "v1=abc"),
+        ("tampered body", sign(payload.replace(b"past_due", b"active"), SECRET)),
+    ):
+        response = post(payload, signature)
+        assert response.status_code == 400, (label, response.status_code)
+    with app.app_context():
+        assert db.session.scalar(select(func.count()).select_from(StripeEvent)) == 0
+
+    # The cancellation (created later) is applied first; the older update
+    # that arrives afterwards must not bring the subscription back
+    for name in ("checkout.session.completed", "customer.subscription.deleted"):
+        payload = customize(name, user_id)
+        assert post(payload, sign(payload, SECRET)).status_code == 200
+    with app.app_context():
+        process_events(10)
+    payload = customize("customer.subscription.updated", user_id)
+    assert post(payload, sign(payload, SECRET)).status_code == 200
+    with app.app_context():
+        process_events(10)
+        user = db.session.get(User, user_id)
+        deleted_at = load_fixture("customer.subscription.deleted")["created"]
+        assert user.subscription_status == "canceled" and user.plan_id is None, user.subscription_status
+        assert user.subscription_updated_at == datetime.utcfromtimestamp(deleted_at)
+        stale = db.session.scalar(select(StripeEvent).where(StripeEvent.type == "customer.subscription.updated"))
+        assert stale.processed_at is not None and stale.error is None
+    print("Fixture checks: bad signatures refused, stale subscription update ignored")
+
+
+def main():
+    check_fixtures()
+
+    app = make_app()
+    app.config["STRIPE_WEBHOOK_SECRET"] = SECRET
+    client = app.test_client()
+
+    with app.app_context():
+        db.session.add(Plan(name="Pro", price=19.99, stripe_price_id=PRICE_ID))
+        db.session.execute(insert(User), [
+            {"email": f"user{i}@example.com", "password_hash": FAST_PASSWORD_HASH} for i in range(USERS)
+        ])
+        db.session.commit()
+        user_ids = db.session.scalars(select(User.id)).all()
+
+    payloads = burst(user_ids)
+
+    def post(payload):
+        response = client.post("/api/stripe/webhook", data=payload, headers={
+            "Content-Type": "application/json", "Stripe-Signature": sign(payload, SECRET)
+        })
+        assert response.status_code == 200, response.get_data(as_text=True)
+
+    print(f"POST /api/stripe/webhook, {len(payloads)} events for {USERS} users")
+    start = time.perf_counter()
+    for payload in payloads:
+        post(payload)
+    report("acknowledge a new event", (time.perf_counter() - start) / len(payloads))
+    report("acknowledge a redelivered event", timed(lambda: post(payloads[0]), 500))
+
+    print(f"Processing {len(payloads)} pending events")
+    for batch_size in (1, app.config["STRIPE_EVENTS_BATCH_SIZE"]):
+        with app.app_context():
+            db.session.execute(update(StripeEvent).values(processed_at=None, error=None))
+            db.session.execute(update(User).values(
+                stripe_customer_id=None, stripe_subscription_id=None, subscription_status=None,
+                subscription_updated_at=None, plan_id=None
+            ))
+            db.session.commit()
+
+        with app.app_context(), count_queries(app) as statements:
+            start = time.perf_counter()
+            while process_events(batch_size):
+                pass
+            elapsed = time.perf_counter() - start
+
+        with app.app_context():
+            errors = db.session.scalar(select(func.count()).where(StripeEvent.error.is_not(None)))
+            on_plan = db.session.scalar(select(func.count()).where(User.plan_id.is_not(None)))
+            canceled = db.session.scalar(select(func.count()).where(User.subscription_status == "canceled"))
+        assert errors == 0 and canceled == len(user_ids[::3]) and on_plan == USERS - canceled, (errors, on_plan, canceled)
+        print(f"  batches of {batch_size:<5} {len(payloads) / elapsed:>9.0f} events/s  "
+              f"{len(statements) / len(payloads):>6.2f} queries/event")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Benchmark confirmation/reset token handling
+Run with: python -m benchmarks.tokens
+
+Compares building a serializer per call with the cached one, and times
+the rejection of a replayed reset link: from the shared store, and by
+primary key when the store does not know the token.
+"""
+
+from itsdangerous import URLSafeTimedSerializer
+from app.extensions import db
+from app.utils.security import consumed_tokens, generate_token, verify_token
+from .common import make_app, make_user, count_queries, timed, report
+
+ITERATIONS = 2000
+
+
+def main():
+    app = make_app()
+    client = app.test_client()
+
+    print(f"Tokens ({ITERATIONS} iterations)")
+    with app.test_request_context():
+        user = make_user("bench@example.com")
+        token = generate_token({"uid": user.id, "purpose": "reset"})
+        secret, salt = app.config["SECRET_KEY"], app.config["SECURITY_TOKEN_SALT"]
+
+        report("verify, new serializer per call",
+               timed(lambda: URLSafeTimedSerializer(secret, salt=salt).loads(token, max_age=7200), ITERATIONS))
+        report("verify_token (cached serializer)", timed(lambda: verify_token(token, 7200), ITERATIONS))
+
+        consumed_tokens.consume(token, "reset", 7200)
+        db.session.commit()
+        consumed_tokens.remember(token, 7200)
+
+    path = f"/auth/reset/{token}"
+    with count_queries(app) as statements:
+        client.get(path)
+    report(f"replayed reset link, store ({len(statements)} queries)", timed(lambda: client.get(path), ITERATIONS // 4))
+
+    def from_table():
+        consumed_tokens.store.clear()
+        client.get(path)
+
+    consumed_tokens.store.clear()
+    with count_queries(app) as statements:
+        client.get(path)
+    report(f"replayed reset link, table ({len(statements)} queries)", timed(from_table, ITERATIONS // 4))
+
+
+if __name__ == "__main__":
+    main()
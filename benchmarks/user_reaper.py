@@ -0,0 +1,63 @@
+"""
+Benchmark the purge of stale unconfirmed users
+Run with: python -m benchmarks.user_reaper
+
+Seeds USERS unconfirmed users (a tenth of them with a billing profile)
+next to confirmed ones and deletes them with User.purge_unconfirmed,
+reporting throughput and the longest transaction, which is how long other
+writers may have to wait for the SQLite write lock.
+"""
+
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import insert, select, text
+from app.extensions import db
+from app.models import BillingProfile, User
+from .common import FAST_PASSWORD_HASH, make_app
+
+USERS = 50000
+BATCH_SIZES = (100, 500, 2000)
+
+
+def seed():
+    registered = datetime.utcnow() - timedelta(days=60)
+    db.session.execute(insert(User), [
+        {"email": f"user{i}@example.com", "password_hash": FAST_PASSWORD_HASH, "created_at": registered,
+         "confirmed_at": registered if i % 4 == 0 else None, "awaiting_confirmation": i % 4 != 0}
+        for i in range(USERS * 4 // 3)
+    ])
+    ids = db.session.scalars(select(User.id).where(User.confirmed_at.is_(None))).all()
+    db.session.execute(insert(BillingProfile), [{"user_id": user_id} for user_id in ids[::10]])
+    db.session.commit()
+    return len(ids)
+
+
+def main():
+    print(f"Purge of {USERS} stale unconfirmed users")
+    for batch_size in BATCH_SIZES:
+        app = make_app()
+        with app.app_context():
+            pending = seed()
+            statement = select(User.id).where(User.unconfirmed_before(datetime.utcnow())).limit(1)
+            plan = db.session.execute(text(
+                "EXPLAIN QUERY PLAN " + str(statement.compile(db.engine, compile_kwargs={"literal_binds": True}))
+            )).all()
+            transactions = []
+            last = [time.perf_counter()]
+
+            def progress(deleted):
+                now = time.perf_counter()
+                transactions.append(now - last[0])
+                last[0] = now
+
+            start = time.perf_counter()
+            deleted = User.purge_unconfirmed(datetime.utcnow() - timedelta(days=30), batch_size, progress)
+            elapsed = time.perf_counter() - start
+            assert deleted == pending and User.query.count() == USERS * 4 // 3 - pending
+            print(f"  batch {batch_size:>5}  {elapsed:>6.2f} s  {deleted / elapsed:>8.0f} users/s  "
+                  f"longest transaction {max(transactions) * 1e3:>7.1f} ms")
+    print(f"  lookup: {plan[0][-1]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Benchmark webhook delivery against the local stand-in receiver
+Run with: python -m benchmarks.webhooks
+
+Queues user.created events for several admin endpoints and drains the
+outbox with the delivery worker: one event per request on a fresh
+connection, one event per request over keep-alive connections, and
+batches of events over keep-alive connections. The receiver takes a few
+milliseconds per request, like a remote endpoint would. Reports
+throughput, lag from event to delivery and connections opened.
+"""
+
+import threading
+import time
+from datetime import datetime
+import urllib3
+from sqlalchemy import update
+from app.extensions import db
+from app.models import WebhookEndpoint, WebhookEvent
+from app.models.webhook import USER_CREATED
+from app.utils.webhooks import WebhookDispatcher, WebhookReceiver
+from .common import make_app, make_user
+
+ENDPOINTS = 10
+EVENTS = 500  # per endpoint
+WORKERS = 8
+RECEIVER_DELAY = 0.002  # seconds per request
+
+SCENARIOS = {
+    "1 event/request, new connections": {"batch_size": 1, "keep_alive": False},
+    "1 event/request, keep-alive": {"batch_size": 1, "keep_alive": True},
+    "100 events/request, keep-alive": {"batch_size": 100, "keep_alive": True},
+}
+
+
+class ClosingPoolManager(urllib3.PoolManager):
+    """Opens a new connection for every request"""
+
+    def request(self, method, url, headers=None, **kwargs):
+        return super().request(method, url, headers={**(headers or {}), "Connection": "close"}, **kwargs)
+
+
+def main():
+    app = make_app()
+    receiver = WebhookReceiver(("127.0.0.1", 0), delay=RECEIVER_DELAY)
+    threading.Thread(target=receiver.serve_forever, daemon=True).start()
+    base_url = "http://127.0.0.1:%d" % receiver.server_address[1]
+
+    with app.app_context():
+        admin = make_user("admin@example.com", role="admin")
+        for n in range(ENDPOINTS):
+            db.session.add(WebhookEndpoint(user_id=admin.id, url=f"{base_url}/hook/{n}", secret=WebhookEndpoint.generate_secret()))
+        db.session.commit()
+        WebhookEvent.emit_many(USER_CREATED, (
+            (1000 + i, {"user": {"id": 1000 + i, "email": f"user{i}@example.com", "plan": "Free"}})
+            for i in range(EVENTS)
+        ))
+        db.session.commit()
+
+    total = ENDPOINTS * EVENTS
+    print(f"{total} deliveries ({EVENTS} events x {ENDPOINTS} endpoints), {WORKERS} workers, "
+          f"receiver delay {RECEIVER_DELAY * 1000:.0f} ms")
+    for label, options in SCENARIOS.items():
+        with app.app_context():
+            now = datetime.utcnow()
+            db.session.execute(update(WebhookEvent).values(
+                created_at=now, next_attempt_at=now, delivered_at=None, attempts=0
+            ))
+            db.session.commit()
+
+            dispatcher = WebhookDispatcher(workers=WORKERS, batch_size=options["batch_size"], allow_private=True)
+            if not options["keep_alive"]:
+                dispatcher.http = ClosingPoolManager(maxsize=WORKERS, retries=dispatcher.http.connection_pool_kw['retries'])
+            for name in receiver.stats:
+                receiver.stats[name] = 0
+
+            start = time.perf_counter()
+            dispatcher.run(once=True)
+            elapsed = time.perf_counter() - start
+            stats = dispatcher.summary()
+            dispatcher.close()
+
+        assert stats["delivered"] == total == receiver.stats["events"], (stats, receiver.stats)
+        print(f"  {label:<36} {total / elapsed:>9.0f} events/s  lag mean {stats['lag_mean']:>6.2f}s "
+              f"max {stats['lag_max']:>6.2f}s  {receiver.stats['requests']:>5} requests "
+              f"{receiver.stats['connections']:>5} connections")
+
+    receiver.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -28,6 +28,9 @@ def create_default_plans():
             price=0.00,
             currency="USD",
             billing_period="monthly",
+            api_rate_limit=60,
+            api_user_rate_limit=120,
+            max_api_keys=1,
             is_active=True,
             is_featured=False,
             sort_order=0
@@ -45,6 +48,9 @@ def create_default_plans():
             price=19.99,
             currency="USD",
             billing_period="monthly",
+            api_rate_limit=600,
+            api_user_rate_limit=1200,
+            max_api_keys=5,
             stripe_price_id="",  # Add your Stripe Price ID here
             stripe_product_id="",  # Add your Stripe Product ID here
             is_active=True,
@@ -64,6 +70,9 @@ def create_default_plans():
             price=99.99,
             currency="USD",
             billing_period="monthly",
+            api_rate_limit=6000,
+            api_user_rate_limit=12000,
+            max_api_keys=Plan.UNLIMITED,
             stripe_price_id="",  # Add your Stripe Price ID here
             stripe_product_id="",  # Add your Stripe Product ID here
             is_active=True,
@@ -0,0 +1,32 @@
+"""Add API key usage rollup table
+
+Revision ID: 5f0a9c7e3b21
+Revises: d2e8f3a61c57
+Create Date: 2026-10-18 11:27:54.630812
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5f0a9c7e3b21'
+down_revision = 'd2e8f3a61c57'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('api_key_usage',
+    sa.Column('api_key_id', sa.Integer(), nullable=False),
+    sa.Column('endpoint', sa.String(length=64), nullable=False),
+    sa.Column('resolution', sa.Integer(), nullable=False),
+    sa.Column('bucket_start', sa.Integer(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['api_key_id'], ['api_key.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('api_key_id', 'endpoint', 'resolution', 'bucket_start')
+    )
+
+
+def downgrade():
+    op.drop_table('api_key_usage')
@@ -0,0 +1,28 @@
+"""Add API rate limits to plans
+
+Revision ID: 8a3d6b1f4e92
+Revises: 5f0a9c7e3b21
+Create Date: 2026-10-18 12:41:07.905316
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8a3d6b1f4e92'
+down_revision = '5f0a9c7e3b21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('plan', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('api_rate_limit', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('api_user_rate_limit', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('plan', schema=None) as batch_op:
+        batch_op.drop_column('api_user_rate_limit')
+        batch_op.drop_column('api_rate_limit')
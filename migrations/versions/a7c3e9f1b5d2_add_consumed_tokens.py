@@ -0,0 +1,34 @@
+"""Add consumed confirmation and reset tokens
+
+Revision ID: a7c3e9f1b5d2
+Revises: f1d7b2e8c4a6
+Create Date: 2026-10-18 21:32:06.514287
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c3e9f1b5d2'
+down_revision = 'f1d7b2e8c4a6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('consumed_token',
+    sa.Column('digest', sa.String(length=64), nullable=False),
+    sa.Column('purpose', sa.String(length=16), nullable=False),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('digest')
+    )
+    with op.batch_alter_table('consumed_token', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_consumed_token_expires_at'), ['expires_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('consumed_token', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_consumed_token_expires_at'))
+
+    op.drop_table('consumed_token')
@@ -0,0 +1,57 @@
+"""Add Stripe events and users' Stripe subscriptions
+
+Revision ID: b2d5f8a1c639
+Revises: a9e7c3d1b5f4
+Create Date: 2026-10-18 18:02:17.519604
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b2d5f8a1c639'
+down_revision = 'a9e7c3d1b5f4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('stripe_event',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('event_id', sa.String(length=255), nullable=False),
+    sa.Column('type', sa.String(length=100), nullable=False),
+    sa.Column('payload', sa.LargeBinary(), nullable=False),
+    sa.Column('customer', sa.String(length=255), nullable=True),
+    sa.Column('created', sa.DateTime(), nullable=False),
+    sa.Column('received_at', sa.DateTime(), nullable=False),
+    sa.Column('processed_at', sa.DateTime(), nullable=True),
+    sa.Column('error', sa.String(length=255), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('event_id')
+    )
+    with op.batch_alter_table('stripe_event', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_stripe_event_customer'), ['customer'], unique=False)
+        batch_op.create_index(batch_op.f('ix_stripe_event_processed_at'), ['processed_at'], unique=False)
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('stripe_customer_id', sa.String(length=255), nullable=True))
+        batch_op.add_column(sa.Column('stripe_subscription_id', sa.String(length=255), nullable=True))
+        batch_op.add_column(sa.Column('subscription_status', sa.String(length=32), nullable=True))
+        batch_op.add_column(sa.Column('subscription_updated_at', sa.DateTime(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_user_stripe_customer_id'), ['stripe_customer_id'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_user_stripe_customer_id'))
+        batch_op.drop_column('subscription_updated_at')
+        batch_op.drop_column('subscription_status')
+        batch_op.drop_column('stripe_subscription_id')
+        batch_op.drop_column('stripe_customer_id')
+
+    with op.batch_alter_table('stripe_event', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_stripe_event_processed_at'))
+        batch_op.drop_index(batch_op.f('ix_stripe_event_customer'))
+
+    op.drop_table('stripe_event')
@@ -0,0 +1,37 @@
+"""Add keyed digest column to API keys
+
+Revision ID: b7c41d2e9a10
+Revises: 325636559126
+Create Date: 2026-10-18 09:12:40.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7c41d2e9a10'
+down_revision = '325636559126'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing rows keep key_hash and get their digest on first use
+    with op.batch_alter_table('api_key', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('key_digest', sa.String(length=64), nullable=True))
+        batch_op.create_index(batch_op.f('ix_api_key_key_digest'), ['key_digest'], unique=True)
+        batch_op.alter_column('key_hash',
+               existing_type=sa.String(length=255),
+               nullable=True)
+
+
+def downgrade():
+    # Keys that were migrated to the digest scheme cannot be restored
+    op.execute("DELETE FROM api_key WHERE key_hash IS NULL")
+    with op.batch_alter_table('api_key', schema=None) as batch_op:
+        batch_op.alter_column('key_hash',
+               existing_type=sa.String(length=255),
+               nullable=False)
+        batch_op.drop_index(batch_op.f('ix_api_key_key_digest'))
+        batch_op.drop_column('key_digest')
@@ -0,0 +1,26 @@
+"""Index users by confirmation and registration time
+
+Revision ID: b9e4d2a6c8f3
+Revises: a7c3e9f1b5d2
+Create Date: 2026-10-18 22:08:51.370642
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b9e4d2a6c8f3'
+down_revision = 'a7c3e9f1b5d2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.create_index('ix_user_confirmed_at_created_at', ['confirmed_at', 'created_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_index('ix_user_confirmed_at_created_at')
@@ -0,0 +1,30 @@
+"""Add row version counters for API ETags
+
+Revision ID: c3f9a2e7d514
+Revises: 8a3d6b1f4e92
+Create Date: 2026-10-18 14:05:12.481930
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3f9a2e7d514'
+down_revision = '8a3d6b1f4e92'
+branch_labels = None
+depends_on = None
+
+TABLES = ('user', 'plan', 'billing_profile', 'api_key')
+
+
+def upgrade():
+    for table in TABLES:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade():
+    for table in reversed(TABLES):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_column('version')
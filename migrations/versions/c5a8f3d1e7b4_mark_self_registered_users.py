@@ -0,0 +1,51 @@
+"""Mark users awaiting the confirmation of their sign-up
+
+Revision ID: c5a8f3d1e7b4
+Revises: b9e4d2a6c8f3
+Create Date: 2026-10-19 09:14:27.530914
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5a8f3d1e7b4'
+down_revision = 'b9e4d2a6c8f3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('awaiting_confirmation', sa.Boolean(), server_default=sa.false(), nullable=False))
+        batch_op.drop_index('ix_user_confirmed_at_created_at')
+        batch_op.create_index('ix_user_awaiting_confirmation_created_at', ['awaiting_confirmation', 'created_at'], unique=False)
+
+    # Users with API keys are kept; look them up without a scan
+    with op.batch_alter_table('api_key', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_api_key_user_id'), ['user_id'], unique=False)
+
+    # Whether existing unconfirmed users signed up or were added by an
+    # admin is not recorded: only mark those without a plan, Stripe
+    # customer or API key
+    user = sa.table(
+        'user', sa.column('id', sa.Integer), sa.column('role', sa.String), sa.column('confirmed_at', sa.DateTime),
+        sa.column('plan_id', sa.Integer), sa.column('stripe_customer_id', sa.String),
+        sa.column('awaiting_confirmation', sa.Boolean)
+    )
+    api_key = sa.table('api_key', sa.column('user_id', sa.Integer))
+    op.execute(user.update().where(
+        user.c.confirmed_at.is_(None), user.c.role != 'admin', user.c.plan_id.is_(None),
+        user.c.stripe_customer_id.is_(None), ~sa.exists().where(api_key.c.user_id == user.c.id)
+    ).values(awaiting_confirmation=True))
+
+
+def downgrade():
+    with op.batch_alter_table('api_key', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_api_key_user_id'))
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_index('ix_user_awaiting_confirmation_created_at')
+        batch_op.create_index('ix_user_confirmed_at_created_at', ['confirmed_at', 'created_at'], unique=False)
+        batch_op.drop_column('awaiting_confirmation')
@@ -0,0 +1,34 @@
+"""Widen and index API key prefix for v2 keys
+
+Revision ID: d2e8f3a61c57
+Revises: b7c41d2e9a10
+Create Date: 2026-10-18 10:03:11.452981
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2e8f3a61c57'
+down_revision = 'b7c41d2e9a10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('api_key', schema=None) as batch_op:
+        batch_op.alter_column('key_prefix',
+               existing_type=sa.String(length=8),
+               type_=sa.String(length=32),
+               existing_nullable=False)
+        batch_op.create_index(batch_op.f('ix_api_key_key_prefix'), ['key_prefix'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('api_key', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_api_key_key_prefix'))
+        batch_op.alter_column('key_prefix',
+               existing_type=sa.String(length=32),
+               type_=sa.String(length=8),
+               existing_nullable=False)
@@ -0,0 +1,26 @@
+"""Save the headers of idempotent responses
+
+Revision ID: d6b9e4f2a8c1
+Revises: c5a8f3d1e7b4
+Create Date: 2026-10-19 10:02:45.218306
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd6b9e4f2a8c1'
+down_revision = 'c5a8f3d1e7b4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('idempotency_key', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('headers', sa.Text(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('idempotency_key', schema=None) as batch_op:
+        batch_op.drop_column('headers')
@@ -0,0 +1,47 @@
+"""Add plan entitlements and users' API key counts
+
+Revision ID: d8c1e5a7f2b9
+Revises: b2d5f8a1c639
+Create Date: 2026-10-18 19:24:41.206318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd8c1e5a7f2b9'
+down_revision = 'b2d5f8a1c639'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('plan', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('max_api_keys', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('features', sa.String(length=255), nullable=True))
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('api_key_count', sa.Integer(), server_default='0', nullable=False))
+
+    # The limits that were hard-coded by plan name: Pro 5 keys, Enterprise
+    # unlimited, any other plan 1
+    plan = sa.table('plan', sa.column('name', sa.String), sa.column('max_api_keys', sa.Integer))
+    op.execute(plan.update().values(max_api_keys=sa.case((plan.c.name == 'Pro', 5), (plan.c.name == 'Enterprise', None), else_=1)))
+
+    user = sa.table('user', sa.column('id', sa.Integer), sa.column('api_key_count', sa.Integer))
+    api_key = sa.table('api_key', sa.column('user_id', sa.Integer), sa.column('is_active', sa.Boolean))
+    op.execute(user.update().values(api_key_count=(
+        sa.select(sa.func.count())
+        .where(api_key.c.user_id == user.c.id, api_key.c.is_active.is_(True))
+        .scalar_subquery()
+    )))
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('api_key_count')
+
+    with op.batch_alter_table('plan', schema=None) as batch_op:
+        batch_op.drop_column('features')
+        batch_op.drop_column('max_api_keys')
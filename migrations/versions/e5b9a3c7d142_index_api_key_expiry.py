@@ -0,0 +1,26 @@
+"""Index API keys by expiry
+
+Revision ID: e5b9a3c7d142
+Revises: d8c1e5a7f2b9
+Create Date: 2026-10-18 20:11:03.842157
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5b9a3c7d142'
+down_revision = 'd8c1e5a7f2b9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('api_key', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_api_key_expires_at'), ['expires_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('api_key', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_api_key_expires_at'))
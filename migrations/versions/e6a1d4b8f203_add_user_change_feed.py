@@ -0,0 +1,38 @@
+"""Add user change feed
+
+Revision ID: e6a1d4b8f203
+Revises: c3f9a2e7d514
+Create Date: 2026-10-18 15:22:47.306118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e6a1d4b8f203'
+down_revision = 'c3f9a2e7d514'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('user_change',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('kind', sa.String(length=16), nullable=False),
+    sa.Column('op', sa.String(length=8), nullable=False),
+    sa.Column('changed_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('user_change', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_user_change_changed_at'), ['changed_at'], unique=False)
+        batch_op.create_index(batch_op.f('ix_user_change_user_id'), ['user_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('user_change', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_user_change_user_id'))
+        batch_op.drop_index(batch_op.f('ix_user_change_changed_at'))
+
+    op.drop_table('user_change')
@@ -0,0 +1,31 @@
+"""Mark plans without an API key limit explicitly
+
+Revision ID: e7c2a5b9d3f6
+Revises: d6b9e4f2a8c1
+Create Date: 2026-10-19 10:41:13.864052
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7c2a5b9d3f6'
+down_revision = 'd6b9e4f2a8c1'
+branch_labels = None
+depends_on = None
+
+# Plan.UNLIMITED
+UNLIMITED = -1
+
+
+def upgrade():
+    # An empty max_api_keys now means API_KEYS_DEFAULT_MAX: Enterprise,
+    # unlimited so far, keeps no limit
+    plan = sa.table('plan', sa.column('name', sa.String), sa.column('max_api_keys', sa.Integer))
+    op.execute(plan.update().where(plan.c.name == 'Enterprise', plan.c.max_api_keys.is_(None)).values(max_api_keys=UNLIMITED))
+
+
+def downgrade():
+    plan = sa.table('plan', sa.column('max_api_keys', sa.Integer))
+    op.execute(plan.update().where(plan.c.max_api_keys == UNLIMITED).values(max_api_keys=None))
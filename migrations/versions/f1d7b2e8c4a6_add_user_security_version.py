@@ -0,0 +1,26 @@
+"""Add users' security version for session snapshots
+
+Revision ID: f1d7b2e8c4a6
+Revises: e5b9a3c7d142
+Create Date: 2026-10-18 20:47:29.113840
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1d7b2e8c4a6'
+down_revision = 'e5b9a3c7d142'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('security_version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('security_version')